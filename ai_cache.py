@@ -0,0 +1,154 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def normalize_text(text, strip_punctuation=False):
+    """Lowercases and collapses whitespace so trivially different inputs share a key."""
+    text = str(text or "").lower()
+    if strip_punctuation:
+        text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def make_key(*parts):
+    """Builds a stable cache key from any JSON-serializable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SqliteStore:
+    """On-disk tier shared by every cache pointing at the same file."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self.conn.commit()
+
+
+def _open_store(path):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = _SqliteStore(path)
+        return _stores[path]
+
+
+class ResultCache:
+    """
+    Two-tier LRU + TTL cache for AI results.
+    The memory tier is an OrderedDict bounded by `max_entries`; the optional
+    SQLite tier at `db_path` survives restarts and is bounded by `max_db_entries`.
+    Values must be JSON-serializable and are returned as fresh copies.
+    """
+
+    def __init__(self, name, max_entries=512, ttl=86400, db_path=None, max_db_entries=10000):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self._memory = OrderedDict()  # key -> (expires_at, json value)
+        self._lock = threading.Lock()
+        self._store = _open_store(db_path) if db_path else None
+        self._writes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return json.loads(entry[1])
+            if entry:
+                del self._memory[key]
+        if self._store:
+            with self._store.lock:
+                row = self._store.conn.execute(
+                    "SELECT value, expires_at FROM ai_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (self.name, key, now),
+                ).fetchone()
+                if row:
+                    self._store.conn.execute(
+                        "UPDATE ai_cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                        (now, self.name, key),
+                    )
+                    self._store.conn.commit()
+            if row:
+                with self._lock:
+                    self._put_memory(key, row[1], row[0])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                return json.loads(row[0])
+        with self._lock:
+            self._stats["misses"] += 1
+        return default
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        encoded = json.dumps(value)
+        with self._lock:
+            self._put_memory(key, expires_at, encoded)
+        if self._store:
+            with self._store.lock:
+                self._store.conn.execute(
+                    "INSERT OR REPLACE INTO ai_cache (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.name, key, encoded, expires_at, now),
+                )
+                self._writes += 1
+                # Trimming needs a COUNT, so only do it every few writes.
+                if self._writes % 64 == 0:
+                    self._trim_disk(now)
+                self._store.conn.commit()
+
+    def _put_memory(self, key, expires_at, encoded):
+        self._memory[key] = (expires_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _trim_disk(self, now):
+        conn = self._store.conn
+        conn.execute("DELETE FROM ai_cache WHERE namespace = ? AND expires_at <= ?", (self.name, now))
+        (count,) = conn.execute("SELECT COUNT(*) FROM ai_cache WHERE namespace = ?", (self.name,)).fetchone()
+        excess = count - self.max_db_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM ai_cache WHERE namespace = ? AND key IN ("
+                " SELECT key FROM ai_cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (self.name, self.name, excess),
+            )
+            with self._lock:
+                self._stats["evictions"] += excess
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._store:
+            with self._store.lock:
+                self._store.conn.execute("DELETE FROM ai_cache WHERE namespace = ?", (self.name,))
+                self._store.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
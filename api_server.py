@@ -0,0 +1,438 @@
+"""
+Async HTTP/WebSocket API for the booking conversation, alongside the Streamlit UI.
+
+Usage:
+    python api_server.py [--host 0.0.0.0] [--port 8080]
+    python api_server.py --issue-token patient@example.com
+
+Conversation:
+    POST /sessions                      start; returns {"session_id", "messages", "speak", "step"}
+    POST /sessions/{id}/turns           {"text": "..."} or raw audio (Content-Type audio/*)
+                                        ?audio=1 adds the spoken reply as base64 mp3 ("audio_b64")
+    GET  /sessions/{id}                 current step, details and messages
+    GET  /sessions/{id}/ws              WebSocket: send text frames (or binary audio), receive replies
+Appointments (database.py), only with API_APPOINTMENTS=on; each request needs
+"Authorization: Bearer <patient token>" and only reaches that patient's bookings:
+    GET    /appointments
+    POST   /appointments                {"email", "name", "mobile", "age", "gender", "symptoms",
+                                         "doctor", "date", "time"} -> book_if_free result
+    PATCH  /appointments/{id}           {"date", "time"} -> reschedule_if_free result (409 on a clash)
+    DELETE /appointments/{id}
+Slots:
+    GET    /slots?doctor=...&date_from=...&date_to=...&n=5
+Ops:
+    GET /health, GET /metrics (tracing.py, Prometheus text)
+
+One event loop serves every connection. The engine, Supabase, LLM, speech and SMTP
+clients are blocking, so each turn runs on a bounded thread pool (API_WORKERS) and
+the loop only awaits it; turns for the same session are serialized.
+"""
+import argparse
+import asyncio
+import base64
+import contextvars
+import functools
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from aiohttp import web, WSMsgType
+import booking_engine
+import tracing
+from slot_index import MAX_SEARCH_DAYS, time_to_minute
+
+# Idle conversations are dropped after this many seconds
+SESSION_TTL = float(os.environ.get("API_SESSION_TTL", 1800))
+API_WORKERS = int(os.environ.get("API_WORKERS", 64))
+# Most slots one /slots request returns
+MAX_SLOTS = 20
+# Patient data routes are off by default. Patient tokens are signed with API_TOKEN_SECRET
+# (issue_token, or --issue-token) by whatever verified the patient, e.g. an email link.
+API_APPOINTMENTS = os.environ.get("API_APPOINTMENTS", "off").lower() in ("1", "on", "true", "yes")
+API_TOKEN_SECRET = os.environ.get("API_TOKEN_SECRET")
+API_TOKEN_TTL = float(os.environ.get("API_TOKEN_TTL", 86400))
+
+
+def _normalize_email(email):
+    return str(email).strip().lower()
+
+
+def _sign(payload, secret):
+    return hmac.new(secret.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def issue_token(email, secret, ttl=API_TOKEN_TTL):
+    """A patient token for `email`, valid for `ttl` seconds."""
+    claims = f"{_normalize_email(email)}|{int(time.time() + ttl)}"
+    payload = base64.urlsafe_b64encode(claims.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{payload}.{_sign(payload, secret)}"
+
+
+def verify_token(token, secret):
+    """Returns the email a token was issued for, or None if it is malformed, forged or expired."""
+    try:
+        payload, signature = token.rsplit(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload, secret)):
+            return None
+        email, expires = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8").rsplit("|", 1)
+        return email if float(expires) > time.time() else None
+    except (ValueError, UnicodeError):
+        return None
+
+
+class Conversations:
+    """In-memory booking sessions, each with a lock so its turns run one at a time."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}  # id -> [Session, asyncio.Lock, last_used]
+
+    def create(self):
+        self.expire()
+        session_id = uuid.uuid4().hex
+        self._sessions[session_id] = [booking_engine.Session(), asyncio.Lock(), time.monotonic()]
+        return session_id
+
+    def get(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "Unknown or expired session"}), content_type="application/json")
+        entry[2] = time.monotonic()
+        return entry[0], entry[1]
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [k for k, v in self._sessions.items() if v[2] < cutoff and not v[1].locked()]:
+            del self._sessions[session_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def _session_view(session_id, session):
+    return {
+        "session_id": session_id,
+        "step": session.step,
+        "details": {k: v for k, v in session.details.items() if k != "docs"},
+        "messages": session.messages,
+    }
+
+
+def _bad_request(message):
+    return web.json_response({"error": message}, status=400)
+
+
+def _json_error(cls, message):
+    return cls(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def _slot_only(result):
+    """Drops the other patient's details from a conflict, keeping only the clashing slot."""
+    if result.get("status") == "conflict":
+        clash = result.get("conflict") or {}
+        result = {**result, "conflict": {k: clash.get(k) for k in ("doctor", "appointment_date", "appointment_time")}}
+    return result
+
+
+def _parse_date(value, name="date"):
+    """Returns the YYYY-MM-DD date; raises ValueError naming the field otherwise."""
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD") from None
+
+
+def _parse_time(value, name="time"):
+    """Checks an 'HH:MM AM/PM' time; raises ValueError naming the field otherwise."""
+    try:
+        time_to_minute(value)
+    except ValueError:
+        raise ValueError(f"{name} must be HH:MM AM/PM") from None
+    return value
+
+
+class BookingAPI:
+    def __init__(self, services=None, db=None, tts=None, transcribe=None, executor=None,
+                 appointments=None, token_secret=None):
+        """
+        services: booking_engine.Services (default: booking_engine.default_services()).
+        db: module with the appointment functions (default: services.db).
+        tts: object with get_audio_b64(text) (default: a tts_cache.TTSCache).
+        transcribe(audio_bytes) -> text or None (default: voice_utils.transcribe_audio).
+        appointments: serve the /appointments routes (default: API_APPOINTMENTS);
+        they need token_secret (default: API_TOKEN_SECRET) to check patient tokens.
+        """
+        self.appointments = API_APPOINTMENTS if appointments is None else appointments
+        self.token_secret = token_secret or API_TOKEN_SECRET
+        if self.appointments and not self.token_secret:
+            raise ValueError("API_TOKEN_SECRET is required to serve /appointments")
+        self.services = services or booking_engine.default_services()
+        self.db = db or self.services.db
+        self._tts = tts
+        self._transcribe = transcribe
+        self.executor = executor or ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+        self.conversations = Conversations()
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs a blocking call on the worker pool, keeping the caller's tracing context."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        return await loop.run_in_executor(self.executor, _in_context(call))
+
+    # --- Speech --------------------------------------------------------------
+
+    def tts(self):
+        if self._tts is None:
+            import tts_cache
+            self._tts = tts_cache.TTSCache(os.environ.get("TTS_CACHE_DIR", tts_cache.DEFAULT_DIR))
+        return self._tts
+
+    def transcribe(self, audio_bytes):
+        if self._transcribe is None:
+            import voice_utils
+            self._transcribe = voice_utils.transcribe_audio
+        return self._transcribe(audio_bytes)
+
+    def _speech(self, text):
+        try:
+            return self.tts().get_audio_b64(text, lang="en", tld="co.in")
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            return None
+
+    # --- Conversation --------------------------------------------------------
+
+    async def _turn(self, session_id, text=None, audio=None, with_audio=False):
+        session, lock = self.conversations.get(session_id)
+        async with lock:
+            with tracing.span("api.turn", session=session_id, audio=audio is not None):
+                if audio is not None:
+                    text = await self.run(self.transcribe, audio)
+                    if not text:
+                        return {"error": "Could not understand the audio", "transcript": None}
+                reply = await self.run(booking_engine.handle, session, text, self.services)
+                # Clients get the text to speak in the reply; don't keep it in the session
+                session.state.pop("to_speak", None)
+                result = {**reply.to_dict(), "step": session.step, "transcript": text if audio is not None else None}
+                if with_audio and reply.speak:
+                    result["audio_b64"] = await self.run(self._speech, reply.speak)
+                return result
+
+    async def start_session(self, request):
+        session_id = self.conversations.create()
+        session, _ = self.conversations.get(session_id)
+        booking_engine.start(session)
+        speak = session.state.pop("to_speak", None)
+        result = {**_session_view(session_id, session), "speak": speak}
+        if request.query.get("audio") and speak:
+            result["audio_b64"] = await self.run(self._speech, speak)
+        return web.json_response(result, status=201)
+
+    async def get_session(self, request):
+        session_id = request.match_info["id"]
+        session, _ = self.conversations.get(session_id)
+        return web.json_response(_session_view(session_id, session))
+
+    async def post_turn(self, request):
+        session_id = request.match_info["id"]
+        with_audio = bool(request.query.get("audio"))
+        if request.content_type.startswith("audio/") or request.content_type == "application/octet-stream":
+            result = await self._turn(session_id, audio=await request.read(), with_audio=with_audio)
+        else:
+            try:
+                text = (await request.json()).get("text")
+            except (ValueError, AttributeError):
+                text = None
+            if not isinstance(text, str) or not text:
+                return _bad_request('Send {"text": "..."} or an audio body')
+            result = await self._turn(session_id, text=text, with_audio=with_audio)
+        # Audio that couldn't be transcribed never reaches the engine, so there are no messages
+        return web.json_response(result, status=200 if "messages" in result else 422)
+
+    async def websocket(self, request):
+        session_id = request.match_info["id"]
+        self.conversations.get(session_id)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                # Either {"text": ..., "audio": true} or the plain text itself
+                try:
+                    payload = json.loads(msg.data) if msg.data.lstrip().startswith("{") else {"text": msg.data}
+                except ValueError:
+                    payload = {"text": msg.data}
+                text = payload.get("text")
+                if not isinstance(text, str) or not text:
+                    await ws.send_json({"error": 'Send {"text": "..."} or binary audio'})
+                    continue
+                turn = self._turn(session_id, text=text, with_audio=bool(payload.get("audio")))
+            elif msg.type == WSMsgType.BINARY:
+                turn = self._turn(session_id, audio=msg.data, with_audio=True)
+            else:
+                break
+            try:
+                result = await turn
+            except web.HTTPNotFound:
+                # The conversation expired while the socket was open
+                await ws.send_json({"error": "Unknown or expired session"})
+                await ws.close()
+                break
+            await ws.send_json(result)
+        return ws
+
+    # --- Appointments --------------------------------------------------------
+
+    def patient(self, request):
+        """The email the request's bearer token was issued for; 401 without a valid one."""
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        email = verify_token(token.strip(), self.token_secret) if scheme.lower() == "bearer" else None
+        if not email:
+            raise _json_error(web.HTTPUnauthorized, "A valid patient token is required")
+        return email
+
+    async def list_appointments(self, request):
+        email = self.patient(request)
+        if request.query.get("email") and _normalize_email(request.query["email"]) != email:
+            raise _json_error(web.HTTPForbidden, "Token is for a different patient")
+        rows = await self.run(self.db.get_appointments, email)
+        return web.json_response(rows, dumps=functools.partial(json.dumps, default=str))
+
+    async def book(self, request):
+        email = self.patient(request)
+        try:
+            body = await request.json()
+            args = [body[k] for k in ("email", "name", "mobile")] + [int(body["age"])] + \
+                   [body[k] for k in ("gender", "symptoms", "doctor", "date", "time")]
+            _parse_date(body["date"])
+            _parse_time(body["time"])
+        except (ValueError, KeyError, TypeError) as e:
+            return _bad_request(f"Missing or invalid field: {e}")
+        if _normalize_email(args[0]) != email:
+            raise _json_error(web.HTTPForbidden, "Token is for a different patient")
+        result = await self.run(self.db.book_if_free, *args)
+        if result is None:
+            return web.json_response({"error": "Could not book right now"}, status=503)
+        return web.json_response(_slot_only(result), status=201 if result["status"] == "booked" else 409,
+                                 dumps=functools.partial(json.dumps, default=str))
+
+    async def reschedule(self, request):
+        email = self.patient(request)
+        try:
+            body = await request.json()
+            date = _parse_date(body["date"]).strftime("%Y-%m-%d")
+            new_time = _parse_time(body["time"])
+        except (ValueError, KeyError, TypeError) as e:
+            return _bad_request(f"Missing or invalid field: {e}")
+        # Conflict-checked like a new booking, so a move can't double-book the slot
+        result = await self.run(self.db.reschedule_if_free, request.match_info["id"], date, new_time, email=email)
+        if result is None:
+            return web.json_response({"error": "Could not reschedule right now"}, status=503)
+        status = {"rescheduled": 200, "conflict": 409, "not_found": 404}[result["status"]]
+        return web.json_response(_slot_only(result), status=status, dumps=functools.partial(json.dumps, default=str))
+
+    async def cancel(self, request):
+        email = self.patient(request)
+        try:
+            row = await self.run(self.db.get_appointment, request.match_info["id"], "id, email")
+        except Exception:
+            return web.json_response({"error": "Could not cancel right now"}, status=503)
+        if row is None or _normalize_email(row["email"]) != email:
+            raise _json_error(web.HTTPNotFound, "No such appointment")
+        response = await self.run(self.db.cancel_appointment, request.match_info["id"])
+        if response is None:
+            return web.json_response({"error": "Could not cancel right now"}, status=503)
+        return web.json_response({"cancelled": len(response.data or [])})
+
+    async def slots(self, request):
+        q = request.query
+        if not (q.get("doctor") and q.get("date_from")):
+            return _bad_request("doctor and date_from are required")
+        try:
+            start = _parse_date(q["date_from"], "date_from")
+            end = _parse_date(q.get("date_to", q["date_from"]), "date_to")
+            n = min(max(int(q.get("n", 5)), 1), MAX_SLOTS)
+        except ValueError as e:
+            return _bad_request(str(e))
+        if not timedelta(0) <= end - start < timedelta(days=MAX_SEARCH_DAYS):
+            return _bad_request(f"date_to must be 0-{MAX_SEARCH_DAYS - 1} days after date_from")
+        try:
+            slots = await self.run(self.db.find_free_slots, q["doctor"], q["date_from"], end.strftime("%Y-%m-%d"), n=n)
+        except ValueError as e:
+            return _bad_request(str(e))
+        return web.json_response([{"date": d, "time": t} for d, t in slots])
+
+    # --- Ops -----------------------------------------------------------------
+
+    async def health(self, request):
+        monitor = getattr(self.db, "health", None)
+        ok, error = monitor.status() if monitor else (True, None)
+        return web.json_response({"ok": ok, "error": error, "sessions": len(self.conversations)}, status=200 if ok else 503)
+
+    async def metrics(self, request):
+        return web.Response(text=tracing.render_prometheus(), content_type="text/plain")
+
+    def routes(self):
+        routes = [
+            web.post("/sessions", self.start_session),
+            web.get("/sessions/{id}", self.get_session),
+            web.post("/sessions/{id}/turns", self.post_turn),
+            web.get("/sessions/{id}/ws", self.websocket),
+            web.get("/slots", self.slots),
+            web.get("/health", self.health),
+            web.get("/metrics", self.metrics),
+        ]
+        if self.appointments:
+            routes += [
+                web.get("/appointments", self.list_appointments),
+                web.post("/appointments", self.book),
+                web.patch("/appointments/{id}", self.reschedule),
+                web.delete("/appointments/{id}", self.cancel),
+            ]
+        return routes
+
+
+def _in_context(call):
+    """Binds `call` to a copy of the current contextvars, so spans nest across the pool."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(call)
+
+
+API = web.AppKey("api", BookingAPI)
+
+
+def create_app(api=None):
+    api = api or BookingAPI()
+    app = web.Application(client_max_size=10 * 1024 * 1024)  # audio uploads
+    app[API] = api
+    app.add_routes(api.routes())
+
+    async def shutdown(app):
+        api.executor.shutdown(wait=False)
+    app.on_shutdown.append(shutdown)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8080)))
+    parser.add_argument("--stand-ins", action="store_true", help="Serve against the local stand-ins (stand_ins.py)")
+    parser.add_argument("--issue-token", metavar="EMAIL", help="Print a patient token for EMAIL (needs API_TOKEN_SECRET) and exit")
+    args = parser.parse_args(argv)
+    if args.issue_token:
+        if not API_TOKEN_SECRET:
+            parser.error("API_TOKEN_SECRET is not set")
+        print(issue_token(args.issue_token, API_TOKEN_SECRET))
+        return
+    if args.stand_ins:
+        import stand_ins
+        stand_ins.install()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import time
+import date_parser
+from test_date_parser import CASES, NOW
+
+ROUNDS = 2000
+
+
+def main():
+    phrases = [text for text, _, _ in CASES]
+    answered = sum(1 for text in phrases if date_parser.parse_datetime_local(text, NOW))
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in phrases:
+            date_parser.parse_datetime_local(text, NOW)
+    elapsed = time.perf_counter() - start
+    calls = ROUNDS * len(phrases)
+    print(f"Phrases:            {len(phrases)}")
+    print(f"Answered locally:   {answered} ({answered / len(phrases):.0%}); the rest go to parse_datetime_ai")
+    print(f"Mean parse time:    {elapsed / calls * 1e6:.1f} µs")
+    print(f"Throughput:         {calls / elapsed:,.0f} parses/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares worker cold start for the doctor directory:
+  current   import pandas + kagglehub, download check, read_csv, groupby
+  snapshot  import doctor_snapshot, mmap the prebuilt file, first lookup
+Each path runs in a fresh interpreter so import costs are included.
+
+Usage: python bench_doctor_snapshot.py [doctors.csv]
+With a CSV path the current path reads that file instead of calling kagglehub.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import doctor_snapshot
+
+RUNS = 5
+
+CURRENT = """
+import os, pandas as pd
+csv_path = {csv!r}
+if not csv_path:
+    import kagglehub
+    path = kagglehub.dataset_download("niksaurabh/doctors-speciality")
+    csv_path = os.path.join(path, [f for f in os.listdir(path) if f.endswith('.csv')][0])
+df = pd.read_csv(csv_path)
+d = df.groupby('speciality')["Doctor's Name"].apply(list).to_dict()
+d.get("Cardiologist", ["General Doctor"])[:5]
+"""
+
+SNAPSHOT = """
+import doctor_snapshot
+d = doctor_snapshot.load_snapshot({snap!r})
+d.get("Cardiologist", ["General Doctor"])[:5]
+"""
+
+
+def _time(code):
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(time.perf_counter() - start)
+    return min(samples), sorted(samples)[len(samples) // 2]
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else doctor_snapshot.download_csv()
+    snap = os.path.join(tempfile.mkdtemp(), "doctors.snap")
+    doctor_snapshot.build(csv_path, snap)
+    baseline = _time("pass")
+    current = _time(CURRENT.format(csv=csv_path if len(sys.argv) > 1 else None))
+    snapshot = _time(SNAPSHOT.format(snap=snap))
+    print(f"\nInterpreter only:  best {baseline[0] * 1000:7.1f} ms  median {baseline[1] * 1000:7.1f} ms")
+    print(f"Current path:      best {current[0] * 1000:7.1f} ms  median {current[1] * 1000:7.1f} ms")
+    print(f"Snapshot path:     best {snapshot[0] * 1000:7.1f} ms  median {snapshot[1] * 1000:7.1f} ms")
+    print(f"Speedup (median, excluding interpreter start): "
+          f"{(current[1] - baseline[1]) / max(snapshot[1] - baseline[1], 1e-6):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Throughput of the headless booking engine (booking_engine.py), no Streamlit involved.
+
+Usage:
+    python bench_engine.py [--sessions 2000] [--stand-ins]
+
+By default every service is an in-process stub, so this measures the step machine
+itself. With --stand-ins the real database.py and symptom_analyzer.py run against
+the instant stand-ins from stand_ins.py (PostgREST query building, slot index,
+AI caches and nlu included).
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import booking_engine
+import nlu
+from loadtest import synthetic_conversation
+from slot_index import time_to_minute, minute_to_time, CONFLICT_MINUTES
+
+DOCTORS = {"Primary Care Doctor": ["Dr. Asha Rao", "Dr. Vikram Shah", "Dr. Meera Iyer"]}
+
+
+class StubDB:
+    """In-memory bookings with the database.py functions the engine and the API call."""
+
+    def __init__(self):
+        self.booked = {}  # (doctor, date) -> {minute: row}
+        self.rows = {}    # id -> row
+        self.next_id = 1
+
+    def _clash(self, doctor, date, time, ignore_id=None):
+        m = time_to_minute(time)
+        day = self.booked.get((doctor, date), {})
+        return next((row for minute, row in day.items() if abs(minute - m) < CONFLICT_MINUTES and row["id"] != ignore_id), None)
+
+    def check_availability(self, date, time, doctor):
+        return self._clash(doctor, date, time) is None
+
+    def find_free_slots(self, doctor, date_from, date_to, n=5):
+        slots, day = [], datetime.strptime(date_from, "%Y-%m-%d")
+        while len(slots) < n and day.strftime("%Y-%m-%d") <= date_to:
+            date = day.strftime("%Y-%m-%d")
+            for minute in range(9 * 60, 17 * 60, CONFLICT_MINUTES):
+                time = minute_to_time(minute)
+                if len(slots) < n and self.check_availability(date, time, doctor):
+                    slots.append((date, time))
+            day += timedelta(days=1)
+        return slots
+
+    def book_if_free(self, email, name, mobile, age, gender, symptoms, doctor, date, time):
+        clash = self._clash(doctor, date, time)
+        if clash:
+            return {"status": "conflict", "conflict": clash}
+        row = {"id": self.next_id, "email": email, "doctor": doctor, "appointment_date": date, "appointment_time": time}
+        self.next_id += 1
+        self.rows[row["id"]] = row
+        self.booked.setdefault((doctor, date), {})[time_to_minute(time)] = row
+        return {"status": "booked", "appointment": row}
+
+    def get_appointment(self, appointment_id, columns="*"):
+        return self.rows.get(int(appointment_id)) if str(appointment_id).isdigit() else None
+
+    def get_appointments(self, email, columns="*"):
+        return [row for row in self.rows.values() if row["email"] == email]
+
+    def reschedule_if_free(self, appointment_id, new_date, new_time, email=None):
+        time_to_minute(new_time)
+        row = self.get_appointment(appointment_id)
+        if row is None or (email is not None and row["email"].lower() != email.lower()):
+            return {"status": "not_found"}
+        clash = self._clash(row["doctor"], new_date, new_time, ignore_id=row["id"])
+        if clash:
+            return {"status": "conflict", "conflict": clash}
+        self._unbook(row)
+        row.update(appointment_date=new_date, appointment_time=new_time)
+        self.booked.setdefault((row["doctor"], new_date), {})[time_to_minute(new_time)] = row
+        return {"status": "rescheduled", "appointment": row}
+
+    def cancel_appointment(self, appointment_id):
+        row = self.rows.pop(int(appointment_id), None)
+        if row:
+            self._unbook(row)
+        return SimpleNamespace(data=[row] if row else [])
+
+    def _unbook(self, row):
+        self.booked[(row["doctor"], row["appointment_date"])].pop(time_to_minute(row["appointment_time"]), None)
+
+
+class StubAnalyzer:
+    """symptom_analyzer without an LLM: local extraction only and a fixed triage."""
+
+    def analyze_symptom(self, user_input):
+        return {"specialty": "Primary Care Doctor", "confidence": "High", "reasoning": "Stub triage.", "success": True}
+
+    def extract_entities(self, user_input):
+        return nlu.extract_local(user_input)[0]
+
+    def analyze_turn(self, user_input, current_context):
+        return {"entities": self.extract_entities(user_input), "triage": None, "datetime": None}
+
+    def parse_datetime_ai(self, user_input, current_context):
+        return None
+
+
+def stub_services(outbox=None):
+    """Services with every dependency stubbed; sent emails are appended to `outbox`."""
+    outbox = [] if outbox is None else outbox
+    return booking_engine.Services(
+        db=StubDB(),
+        analyzer=StubAnalyzer(),
+        doctors=lambda: DOCTORS,
+        send_email=lambda to, subject, body: outbox.append((to, subject)),
+    )
+
+
+def stand_in_services(outbox):
+    import stand_ins
+    stand_ins.install(doctors=DOCTORS)
+    return booking_engine.default_services(send_email=lambda to, subject, body: outbox.append((to, subject)))
+
+
+def run(sessions, make_services):
+    """
+    Plays `sessions` synthetic conversations, each with make_services();
+    returns (turns, seconds, completed).
+    """
+    turns = completed = 0
+    start = time.perf_counter()
+    for i in range(sessions):
+        services = make_services()
+        session = booking_engine.Session()
+        booking_engine.start(session)
+        for text in synthetic_conversation(i):
+            booking_engine.handle(session, text, services)
+            turns += 1
+        completed += session.step is None and any(m["content"].startswith("Booked") for m in session.messages)
+    return turns, time.perf_counter() - start, completed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--stand-ins", action="store_true", help="Use database.py/symptom_analyzer.py with stand_ins")
+    args = parser.parse_args(argv)
+
+    outbox = []
+    if args.stand_ins:
+        services = stand_in_services(outbox)
+        make_services = lambda: services
+    else:
+        # A fresh calendar per session, so every conversation can book its first pick
+        make_services = lambda: stub_services(outbox)
+    turns, seconds, completed = run(args.sessions, make_services)
+    print(f"Services:            {'stand-ins' if args.stand_ins else 'stubs'}")
+    print(f"Sessions:            {args.sessions} ({completed} booked, {len(outbox)} emails)")
+    print(f"Turns:               {turns} in {seconds:.2f} s")
+    print(f"Throughput:          {turns / seconds:,.0f} turns/s")
+    print(f"Per turn:            {seconds / turns * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
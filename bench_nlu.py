@@ -0,0 +1,55 @@
+import time
+import nlu
+
+# Replay corpus: (step the bot was on, what the patient said)
+CORPUS = [
+    ("name", "my name is Rajnish Kumar"),
+    ("name", "Priya Sharma"),
+    ("email", "my email is a b c at gmail dot com"),
+    ("email", "it's john dot smith at the rate yahoo dot co dot in"),
+    ("email", "rajnish123@gmail.com"),
+    ("email", "my mail id is priya underscore k at gmail dot com"),
+    ("mobile", "my number is 98765 43210"),
+    ("mobile", "nine eight seven six five four three two one zero"),
+    ("mobile", "+91 98765-43210"),
+    ("age", "I'm 34, male"),
+    ("age", "I am 29 years old"),
+    ("age", "45"),
+    ("gender", "female"),
+    ("gender", "I am a male"),
+    ("gender", "my gender is female and my age is 52"),
+    ("symptoms", "I have a bad headache and fever since two days"),
+    ("symptoms", "chest pain"),
+    ("name", "I'm Priya, 29, female, bad chest pain since yesterday, can I come tomorrow at 5pm"),
+    ("email", "my email is priya at gmail dot com and phone 9876543210"),
+    ("appointment_date", "tomorrow"),
+    ("appointment_date", "next monday please"),
+    ("appointment_time", "5 in the evening"),
+    ("age", "I am 60 and my mobile is 9123456780"),
+    ("gender", "male, 41 years old"),
+]
+
+
+def main():
+    llm_before = llm_after = 0
+    start = time.perf_counter()
+    for step, text in CORPUS:
+        if not nlu.is_complex_input(text, step):
+            continue
+        llm_before += 1
+        fields, residual = nlu.extract_local(text)
+        if residual:
+            llm_after += 1
+        print(f"[{step:>16}] {text!r}\n{'':>19}local={fields} residual={residual!r}")
+    elapsed = time.perf_counter() - start
+
+    saved = llm_before - llm_after
+    print(f"\nTurns replayed:          {len(CORPUS)}")
+    print(f"LLM calls (before):      {llm_before}")
+    print(f"LLM calls (local first): {llm_after}")
+    print(f"Turns saved:             {saved} ({saved / max(llm_before, 1):.0%} of LLM turns)")
+    print(f"Local extraction time:   {elapsed / len(CORPUS) * 1e6:.1f} µs/turn")
+
+
+if __name__ == "__main__":
+    main()
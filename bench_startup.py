@@ -0,0 +1,88 @@
+"""
+Measures how long a fresh worker takes to import the app, per module.
+
+Usage: python bench_startup.py [module] [--budget-ms N]
+
+Runs `python -X importtime -c "import <module>"` a few times in fresh
+interpreters, keeps the fastest run, and prints the cumulative import time of
+every project module and the heaviest packages. Exits non-zero if the total
+exceeds the budget or if any dependency that should load lazily was imported.
+"""
+import os
+import subprocess
+import sys
+
+RUNS = 3
+DEFAULT_BUDGET_MS = 1500
+
+# Must not be imported until first use (see lazy imports in the app modules).
+# speech_recognition is left out: streamlit_mic_recorder imports it for the page itself.
+LAZY_MODULES = [
+    "pandas", "kagglehub", "gtts", "pydub",
+    "google.genai", "groq", "googleapiclient", "supabase",
+]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_MODULES = {f[:-3] for f in os.listdir(HERE) if f.endswith(".py")}
+
+
+def import_profile(module):
+    """Returns {module name: (self_us, cumulative_us)} for one fresh import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_part, cumulative_part, name = line.split("|", 2)
+        profile[name.strip()] = (int(self_part.split(":")[1]), int(cumulative_part))
+    return profile
+
+
+def main():
+    args = sys.argv[1:]
+    budget_ms = DEFAULT_BUDGET_MS
+    if "--budget-ms" in args:
+        i = args.index("--budget-ms")
+        budget_ms = float(args[i + 1])
+        del args[i:i + 2]
+    module = args[0] if args else "streamlit_app"
+
+    runs = [import_profile(module) for _ in range(RUNS)]
+    profile = min(runs, key=lambda p: p[module][1])
+    total_ms = profile[module][1] / 1000
+
+    print(f"Import of {module}: {total_ms:.0f} ms (best of {RUNS}, budget {budget_ms:.0f} ms)\n")
+    print("Project modules (cumulative):")
+    for name, (_, cum) in sorted(profile.items(), key=lambda kv: -kv[1][1]):
+        if name in PROJECT_MODULES:
+            print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    print("\nHeaviest packages (cumulative):")
+    packages = {}
+    for name, (_, cum) in profile.items():
+        top = name.split(".")[0]
+        if top not in PROJECT_MODULES:
+            packages[top] = max(packages.get(top, 0), cum)
+    for name, cum in sorted(packages.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    eager = [m for m in LAZY_MODULES if m in profile]
+    failed = False
+    if eager:
+        print(f"\n❌ Imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > budget_ms:
+        print(f"\n❌ Startup import time {total_ms:.0f} ms exceeds budget {budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ Startup within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Headless conversation engine for the booking flow.
+
+The step machine that used to live in streamlit_app.handle_chat, as a dispatch
+table of step handlers over an explicit Session, with every side effect (database,
+LLM, email, speech) going through an injected Services object:
+
+    session = Session()                 # or Session(st.session_state)
+    services = default_services()       # or stubs (see bench_engine.py)
+    start(session)
+    reply = handle(session, "1", services)
+    reply.messages, reply.speak, reply.error
+
+Nothing here imports Streamlit, so the same flow runs in the app, in tests and
+behind an API server.
+"""
+import re
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+import nlu
+import date_parser
+import prompts
+import tracing
+
+# Fields collected for a booking, in the order they are asked for
+REQUIRED_FIELDS = ["name", "email", "mobile", "age", "gender", "symptoms", "selected_doctor", "appointment_date", "appointment_time"]
+# How many days ahead (from the chosen date) to look for free slots, and how many to offer
+SLOT_SEARCH_DAYS = 7
+SLOT_OFFERS = 5
+
+
+class Session:
+    """
+    One conversation's state. Lives in a plain mapping under the keys the app has
+    always used, so a dict, st.session_state or a stored snapshot all work.
+    """
+
+    def __init__(self, state=None):
+        self.state = {} if state is None else state
+        for key, default in (("step", None), ("messages", []), ("appointment_details", {})):
+            if key not in self.state:
+                self.state[key] = default
+
+    @property
+    def step(self):
+        return self.state["step"]
+
+    @step.setter
+    def step(self, value):
+        self.state["step"] = value
+
+    @property
+    def messages(self):
+        return self.state["messages"]
+
+    @property
+    def details(self):
+        return self.state["appointment_details"]
+
+    def reset_details(self):
+        self.state["appointment_details"] = {}
+
+
+class Services:
+    """
+    Everything the engine talks to; default_services() wires up the real ones.
+    db: check_availability, find_free_slots, book_if_free (as in database.py)
+    analyzer: analyze_turn, extract_entities, analyze_symptom, parse_datetime_ai (as in symptom_analyzer.py)
+    doctors(): {specialty: [doctor names]}
+    send_email(to, subject, body)
+    speak(text): optional, called with what the reply should say aloud
+    stream_triage(symptoms): optional, used instead of analyzer.analyze_symptom when the
+        patient has just described symptoms, so a UI can show the analysis as it streams
+    busy(label): optional context manager wrapped around slow AI calls (e.g. st.spinner)
+    now(): current datetime
+    """
+
+    def __init__(self, db, analyzer, doctors, send_email, speak=None, stream_triage=None, busy=None, now=datetime.now):
+        self.db = db
+        self.analyzer = analyzer
+        self.doctors = doctors
+        self.send_email = send_email
+        self.speak = speak
+        self.stream_triage = stream_triage
+        self.busy = busy or (lambda label: nullcontext())
+        self.now = now
+
+
+def default_services(**overrides):
+    """Services backed by the real Supabase, Groq/Gemini and the email outbox."""
+    import database
+    import doctor_snapshot
+    import email_outbox
+    import symptom_analyzer
+    options = {
+        "db": database,
+        "analyzer": symptom_analyzer,
+        "doctors": lambda: doctor_snapshot.load_snapshot() or {},
+        "send_email": lambda to, subject, body: email_outbox.shared_outbox(database.get_secret).enqueue(to, subject, body),
+    }
+    options.update(overrides)
+    return Services(**options)
+
+
+class Reply:
+    """What one turn produced: new assistant messages, text to speak and any error to show."""
+
+    def __init__(self):
+        self.messages = []
+        self.speak = None
+        self.error = None
+
+    def to_dict(self):
+        return {"messages": self.messages, "speak": self.speak, "error": self.error}
+
+
+class Turn:
+    """One user input being handled: the session, its services and the reply being built."""
+
+    def __init__(self, session, services, text):
+        self.session = session
+        self.services = services
+        self.text = text
+        self.reply = Reply()
+        self.extracted = {}
+
+    def say(self, content, speak=True):
+        message = {"role": "assistant", "content": content}
+        self.session.messages.append(message)
+        self.reply.messages.append(message)
+        if speak:
+            self.session.state["to_speak"] = content
+            self.reply.speak = content
+
+    def error(self, text):
+        self.reply.error = text
+
+
+# --- Parsing helpers ---------------------------------------------------------
+
+def validate_mobile(mobile):
+    return re.match(r'^\d{10}$', mobile) is not None
+
+def parse_date(date_str):
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
+        except ValueError: continue
+    return None
+
+def parse_time(time_str):
+    if not time_str: return None
+    t = time_str.lower().replace(".", "").replace(" ","").strip()
+    formats = ["%I:%M%p", "%I%p", "%H:%M", "%I.%M%p"]
+    for fmt in formats:
+        try:
+            return datetime.strptime(t, fmt).strftime("%I:%M %p")
+        except ValueError: continue
+    if "noon" in t: return "12:00 PM"
+    if "midnight" in t: return "12:00 AM"
+    return None
+
+def is_past_date(date_str, now=None):
+    return date_str < (now or datetime.now()).strftime("%Y-%m-%d")
+
+def is_past_time(date_str, time_str, now=None):
+    now = now or datetime.now()
+    if date_str == now.strftime("%Y-%m-%d"):
+        return time_str < now.strftime("%I:%M %p")
+    return False
+
+def now_context(now):
+    """The current date and time as the AI parsers expect it; they key their caches on the date."""
+    return f"Now is {now.strftime('%A, %Y-%m-%d %I:%M %p')}"
+
+def normalize_input(text):
+    return nlu.normalize_choice(text)
+
+
+# --- Prompts -----------------------------------------------------------------
+
+def next_missing_field(details):
+    for field in REQUIRED_FIELDS:
+        if not details.get(field): return field
+    return "confirm_appointment"
+
+def offer_doctors(turn, live=False):
+    """
+    Recommends a specialty for the stored symptoms and lists its doctors.
+    live: the patient just described them, so use services.stream_triage if there is one.
+    """
+    session, services = turn.session, turn.services
+    det = session.details
+    # Reuse the triage from a combined turn analysis of the same symptoms, if any
+    symptoms, ana = session.state.pop("triage", None) or (None, None)
+    if symptoms != det["symptoms"] or not ana:
+        if live and services.stream_triage:
+            ana = services.stream_triage(det["symptoms"])
+        else:
+            ana = services.analyzer.analyze_symptom(det["symptoms"])
+    spec = ana["specialty"]
+    turn.say(f"Recommended Specialty: **{spec}**\n\n{ana['reasoning']}", speak=False)
+    docs = services.doctors().get(spec, ["General Doctor"])[:5]
+    det["docs"] = docs
+    session.step = "select_doctor"
+    turn.say("Select doctor:\n" + "\n".join([f"{i+1}. {d}" for i, d in enumerate(docs)]))
+
+def offer_free_slots(turn, prefix=""):
+    """Offers the doctor's next free slots from the chosen date on; the user can reply with their number."""
+    session = turn.session
+    det = session.details
+    start = det.get("appointment_date") or turn.services.now().strftime("%Y-%m-%d")
+    end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=SLOT_SEARCH_DAYS - 1)).strftime("%Y-%m-%d")
+    slots = turn.services.db.find_free_slots(det["selected_doctor"], start, end, n=SLOT_OFFERS) if det.get("selected_doctor") else []
+    session.state["slot_offers"] = slots
+    if slots:
+        turn.say(prefix + "Next free slots:\n" + "\n".join([f"{i+1}. {d} at {t}" for i, (d, t) in enumerate(slots)]) + "\nReply with a number, or tell me another time.")
+    else:
+        turn.say(prefix + prompts.STEP_QUESTIONS["appointment_time"])
+
+def ask_step_question(turn, step):
+    if step == "selected_doctor":
+        offer_doctors(turn); return
+    if step == "appointment_time":
+        offer_free_slots(turn); return
+    msg = prompts.STEP_QUESTIONS.get(step)
+    messages = turn.session.messages
+    if msg and (not messages or messages[-1]["content"] != msg):
+        turn.say(msg)
+
+def advance(turn):
+    """Moves to the next field still missing and asks for it."""
+    turn.session.step = next_missing_field(turn.session.details)
+    ask_step_question(turn, turn.session.step)
+
+
+# --- Step handlers -----------------------------------------------------------
+
+def extract(turn):
+    """Fills any details a free-form answer mentions, with one combined LLM call where possible."""
+    session, services, text = turn.session, turn.services, turn.text
+    step, det = session.step, session.details
+    if step in [None, "options", "medical_info"] or not nlu.is_complex_input(text, step):
+        return
+    need_triage = not det.get("symptoms")
+    need_datetime = not (det.get("appointment_date") and det.get("appointment_time"))
+    now = services.now()
+    with services.busy("AI is understanding..."):
+        if need_triage or need_datetime:
+            # One combined LLM call instead of separate entity, triage and date/time calls
+            result = services.analyzer.analyze_turn(text, now_context(now))
+            extracted = result["entities"]
+            if result["triage"]: session.state["triage"] = (extracted.get("symptoms"), result["triage"])
+            when = result["datetime"] or {}
+            d = parse_date(when.get("date") or "")
+            if d and not is_past_date(d, now) and not det.get("appointment_date"): extracted["appointment_date"] = d
+            d = det.get("appointment_date") or extracted.get("appointment_date")
+            t = parse_time(when.get("time") or "")
+            if d and t and not is_past_time(d, t, now): extracted["appointment_time"] = t
+        else:
+            extracted = services.analyzer.extract_entities(text)
+    for k, v in (extracted or {}).items():
+        if v and not det.get(k):
+            if k == "email": v = str(v).lower().replace(" ", "").strip()
+            det[k] = v
+    turn.extracted = extracted or {}
+
+def on_options(turn):
+    session = turn.session
+    n = normalize_input(turn.text)
+    if n == "1": advance(turn)
+    elif n == "2": session.step = "reschedule_email"; ask_step_question(turn, "email")
+    elif n == "3": session.step = "cancel_email"; ask_step_question(turn, "email")
+    elif n == "4": session.step = "medical_info"; turn.say(prompts.MEDICAL_INFO_MSG, speak=False)
+    elif n == "5": turn.say(prompts.GOODBYE_MSG, speak=False); session.step = None
+
+def on_name(turn):
+    turn.session.details["name"] = turn.extracted.get("name") or turn.text
+    advance(turn)
+
+def on_email(turn):
+    turn.session.details["email"] = (turn.extracted.get("email") or turn.text).lower().replace(" ", "").strip()
+    advance(turn)
+
+def on_mobile(turn):
+    c = re.sub(r'\D', '', turn.text)
+    if validate_mobile(c): turn.session.details["mobile"] = c; advance(turn)
+    else: turn.error("Invalid mobile number.")
+
+def on_age(turn):
+    c = re.sub(r'\D', '', turn.text)
+    if c.isdigit(): turn.session.details["age"] = c; advance(turn)
+
+def on_gender(turn):
+    res, _ = nlu.extract_gender(turn.text)
+    if res: turn.session.details["gender"] = res; advance(turn)
+
+def on_symptoms(turn):
+    turn.session.details["symptoms"] = turn.text
+    offer_doctors(turn, live=True)
+
+def on_select_doctor(turn):
+    det = turn.session.details
+    docs = det.get("docs", [])
+    idx = None
+    norm = normalize_input(turn.text)
+    if norm.isdigit():
+        i = int(norm) - 1
+        if 0 <= i < len(docs): idx = i
+    if idx is None:
+        user_low = turn.text.lower()
+        for i, d in enumerate(docs):
+            if d.lower() in user_low or user_low in d.lower().replace("dr. ", ""):
+                idx = i
+                break
+    if idx is not None:
+        det["selected_doctor"] = docs[idx]
+        advance(turn)
+    else: turn.error(f"Please say the number (1-{len(docs)}) or the doctor's name.")
+
+def on_appointment_date(turn):
+    now = turn.services.now()
+    d = parse_date(turn.text)
+    if not d:
+        res = date_parser.parse_datetime_local(turn.text, now) or turn.services.analyzer.parse_datetime_ai(turn.text, now_context(now))
+        if res and res.get("date"): d = res["date"]
+    if d and not is_past_date(d, now): turn.session.details["appointment_date"] = d; advance(turn)
+
+def on_appointment_time(turn):
+    session, services = turn.session, turn.services
+    det, now = session.details, services.now()
+    t = parse_time(turn.text)
+    offers = session.state.get("slot_offers") or []
+    # Only a bare pick ("2", "the second one") selects an offer; "at 5" is a time
+    pick = nlu.parse_pick(turn.text) if offers and not t else None
+    if pick and pick <= len(offers):
+        det["appointment_date"], t = offers[pick - 1]
+    if not t:
+        res = date_parser.parse_datetime_local(turn.text, now) or services.analyzer.parse_datetime_ai(turn.text, now_context(now))
+        if res and res.get("time"): t = res["time"]
+    if t and not is_past_time(det["appointment_date"], t, now):
+        date = det["appointment_date"]
+        if not services.db.check_availability(date, t, det["selected_doctor"]):
+            offer_free_slots(turn, f"Sorry, {t} on {date} is already taken. ")
+        else:
+            det["appointment_time"] = t; session.state.pop("slot_offers", None)
+            session.step = "confirm_appointment"; ask_step_question(turn, "confirm_appointment")
+
+def on_confirm_appointment(turn):
+    if normalize_input(turn.text) not in ["1", "yes", "confirm"]:
+        return
+    session, services = turn.session, turn.services
+    d = session.details
+    # Conflict check and insert happen atomically in the database
+    res = services.db.book_if_free(d["email"], d["name"], d["mobile"], int(d["age"]), d["gender"], d["symptoms"], d["selected_doctor"], d["appointment_date"], d["appointment_time"])
+    if not res:
+        turn.error("Could not book right now. Please try again."); return
+    if res["status"] == "conflict":
+        taken = res["conflict"].get("appointment_time", d["appointment_time"])
+        d.pop("appointment_time", None)
+        offer_free_slots(turn, f"Sorry, {d['selected_doctor']} already has a booking at {taken}. ")
+        session.step = "appointment_time"; return
+    id_str = f"APPT-{res['appointment']['id']}"
+    email_body = f"""Hello {d['name']}, your appointment has been booked. Details: ID {id_str}, Doctor {d['selected_doctor']}, Date {d['appointment_date']}, Time {d['appointment_time']}."""
+    try:
+        services.send_email(d["email"], f"Appointment Confirmation - {id_str}", email_body)
+    except Exception as e:
+        print(f"Error sending confirmation email: {e}")
+    turn.say(f"Booked successfully! ID: {id_str}. Confirmation sent to your email.")
+    session.step = None; session.reset_details()
+
+# Step -> handler(turn). Steps without an entry (e.g. medical_info) ignore input.
+HANDLERS = {
+    "options": on_options,
+    "name": on_name,
+    "email": on_email,
+    "mobile": on_mobile,
+    "age": on_age,
+    "gender": on_gender,
+    "symptoms": on_symptoms,
+    "select_doctor": on_select_doctor,
+    "appointment_date": on_appointment_date,
+    "appointment_time": on_appointment_time,
+    "confirm_appointment": on_confirm_appointment,
+}
+
+
+def start(session):
+    """Greets a new conversation. Returns True if it added the greeting."""
+    if session.step is not None or session.messages:
+        return False
+    session.messages.append({"role": "assistant", "content": prompts.WELCOME_MSG})
+    session.messages.append({"role": "assistant", "content": prompts.OPTIONS_MSG})
+    session.step = "options"
+    session.state["to_speak"] = prompts.GREETING_SPEECH
+    return True
+
+
+def handle(session, text, services):
+    """Runs one user input through the step machine and returns its Reply."""
+    turn = Turn(session, services, text)
+    tracing.annotate(step=session.step or "start", input_chars=len(text))
+    extract(turn)
+    handler = HANDLERS.get(session.step)
+    if handler:
+        handler(turn)
+    if turn.reply.speak and services.speak:
+        services.speak(turn.reply.speak)
+    return turn.reply
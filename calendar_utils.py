@@ -1,26 +1,106 @@
 import os
+import json
 import datetime
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import threading
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 SERVICE_ACCOUNT_FILE = 'credentials.json'
+TIME_ZONE = 'Asia/Kolkata'
+# Google's batch endpoint accepts at most 50 calls per request.
+BATCH_LIMIT = 50
+
+# Credentials are shared process-wide so the OAuth token is reused until it expires.
+# httplib2 connections are not thread-safe, so each thread gets its own service object.
+_lock = threading.Lock()
+_credentials = None
+_discovery_doc = None
+_local = threading.local()
+# Bumped by reset_calendar_service; a thread whose service is from an older generation rebuilds it
+_generation = 0
+
+def _get_discovery_doc():
+    """Parses the bundled Calendar v3 discovery document once per process."""
+    global _discovery_doc
+    if _discovery_doc is None:
+        from googleapiclient import discovery_cache
+        _discovery_doc = json.loads(discovery_cache.get_static_doc("calendar", "v3"))
+    return _discovery_doc
+
+def _get_credentials():
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            from google.oauth2 import service_account
+            _credentials = service_account.Credentials.from_service_account_file(
+                SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        return _credentials
+
+def get_calendar_service(http=None):
+    """
+    Authenticates and returns the Google Calendar service (cached per thread).
+    Pass `http` (e.g. a fake transport) to build an uncached service for tests.
+    """
+    # The Google API client is heavy to import, so it is loaded on first use
+    from googleapiclient.discovery import build_from_document
+    if http is not None:
+        return build_from_document(_get_discovery_doc(), http=http)
+
+    generation = _generation
+    if getattr(_local, "generation", None) == generation:
+        return _local.service
 
-def get_calendar_service():
-    """Authenticates and returns the Google Calendar service."""
     if not os.path.exists(SERVICE_ACCOUNT_FILE):
         print("Warning: credentials.json not found. Calendar integration disabled.")
         return None
-    
+
     try:
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        service = build('calendar', 'v3', credentials=creds)
+        service = build_from_document(_get_discovery_doc(), credentials=_get_credentials())
+        _local.service, _local.generation = service, generation
         return service
     except Exception as e:
         print(f"Error authenticating with Google Calendar: {e}")
         return None
 
+def reset_calendar_service():
+    """
+    Drops cached credentials and services, e.g. after replacing credentials.json.
+    Every thread, not just the caller, builds a new service on its next call.
+    """
+    global _credentials, _generation
+    with _lock:
+        _credentials = None
+        _generation += 1
+
+def _build_event(doctor_name, patient_email, appointment_date, appointment_time):
+    # appointment_date is YYYY-MM-DD, appointment_time is HH:MM AM/PM
+    dt_str = f"{appointment_date} {appointment_time}"
+    start_dt = datetime.datetime.strptime(dt_str, "%Y-%m-%d %I:%M %p")
+    end_dt = start_dt + datetime.timedelta(minutes=30) # 30 min appointment
+
+    return {
+        'summary': f'Appointment with {doctor_name}',
+        'description': f'Doctor Appointment for {patient_email}',
+        'start': {
+            'dateTime': start_dt.isoformat(),
+            'timeZone': TIME_ZONE,
+        },
+        'end': {
+            'dateTime': end_dt.isoformat(),
+            'timeZone': TIME_ZONE,
+        },
+        'attendees': [
+            {'email': patient_email},
+            # We could add the doctor's email too if available in the dataset
+        ],
+    }
+
+def _error_result(error):
+    error_msg = str(error)
+    print(f"Error creating calendar event: {error_msg}")
+    if "accessNotConfigured" in error_msg:
+        return "API_DISABLED"
+    return False
+
 def create_appointment_event(doctor_name, patient_email, appointment_date, appointment_time):
     """Creates a Google Calendar event with Google Meet link."""
     service = get_calendar_service()
@@ -28,38 +108,9 @@ def create_appointment_event(doctor_name, patient_email, appointment_date, appoi
         return None
 
     try:
-        # Parse date and time to datetime objects
-        # appointment_date is YYYY-MM-DD
-        # appointment_time is HH:MM AM/PM
-        dt_str = f"{appointment_date} {appointment_time}"
-        start_dt = datetime.datetime.strptime(dt_str, "%Y-%m-%d %I:%M %p")
-        end_dt = start_dt + datetime.timedelta(minutes=30) # 30 min appointment
-
-        # Convert to ISO format necessary for Google API
-        # We'll assume the system local time or prompt for timezone. 
-        # For simplicity, we'll use 'Asia/Kolkata' as implied by the context (India mention in code) or just UTC/Local.
-        # Let's use 'Asia/Kolkata' since the user mentioned India in "Medical Info".
-        time_zone = 'Asia/Kolkata' 
-
-        event = {
-            'summary': f'Appointment with {doctor_name}',
-            'description': f'Doctor Appointment for {patient_email}',
-            'start': {
-                'dateTime': start_dt.isoformat(),
-                'timeZone': time_zone,
-            },
-            'end': {
-                'dateTime': end_dt.isoformat(),
-                'timeZone': time_zone,
-            },
-            'attendees': [
-                {'email': patient_email},
-                # We could add the doctor's email too if available in the dataset
-            ],
-        }
-
+        event = _build_event(doctor_name, patient_email, appointment_date, appointment_time)
         event = service.events().insert(
-            calendarId='primary', 
+            calendarId='primary',
             body=event
         ).execute()
 
@@ -67,8 +118,39 @@ def create_appointment_event(doctor_name, patient_email, appointment_date, appoi
         return True # Return success instead of link
 
     except Exception as e:
-        error_msg = str(e)
-        print(f"Error creating calendar event: {error_msg}")
-        if "accessNotConfigured" in error_msg:
-            return "API_DISABLED"
-        return False
+        return _error_result(e)
+
+def create_appointment_events(appointments, service=None):
+    """
+    Creates many calendar events using batch HTTP requests (up to 50 per round trip).
+    appointments: list of dicts with doctor_name, patient_email, appointment_date, appointment_time.
+    Returns a list aligned with `appointments`: True, False or "API_DISABLED" per event,
+    or None if the calendar is not configured.
+    """
+    service = service or get_calendar_service()
+    if not service:
+        return None
+
+    results = [False] * len(appointments)
+
+    def on_response(request_id, response, exception):
+        i = int(request_id)
+        results[i] = _error_result(exception) if exception else True
+
+    for start in range(0, len(appointments), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=on_response)
+        for i, appt in enumerate(appointments[start:start + BATCH_LIMIT], start):
+            try:
+                event = _build_event(appt["doctor_name"], appt["patient_email"], appt["appointment_date"], appt["appointment_time"])
+            except Exception as e:
+                results[i] = _error_result(e)
+                continue
+            batch.add(service.events().insert(calendarId='primary', body=event), request_id=str(i))
+        try:
+            batch.execute()
+        except Exception as e:
+            # The whole round trip failed; mark every event that was in it.
+            for i in range(start, min(start + BATCH_LIMIT, len(appointments))):
+                if results[i] is False:
+                    results[i] = _error_result(e)
+    return results
@@ -1,7 +1,14 @@
 import os
+import hashlib
+import random
+import threading
+import time
 import streamlit as st
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from slot_index import SlotIndex, CONFLICT_MINUTES, MAX_SEARCH_DAYS, time_to_minute
+from health_monitor import HealthMonitor, is_transport_error
+import tracing
 
 # Load environment variables (Local)
 load_dotenv()
@@ -18,24 +25,59 @@ def get_secret(key, default=None):
 url = get_secret("SUPABASE_URL")
 key = get_secret("SUPABASE_KEY")
 
-# Create client only if credentials are found
-if url and key:
-    supabase: Client = create_client(url, key)
-else:
-    supabase = None
+if not (url and key):
     st.warning("⚠️ SUPABASE_URL or SUPABASE_KEY not found. Please add them to your Streamlit Secrets.")
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the Supabase client, creating it on first use (None if credentials are missing)."""
+    global _client
+    if _client is None and url and key:
+        with _client_lock:
+            if _client is None:
+                # Imported here: the SDK is one of the slowest imports at startup
+                from supabase import create_client
+                _client = create_client(url, key)
+    return _client
+
+def _execute(op, request, **attrs):
+    """Runs a query builder's execute() inside a "db.<op>" span, noting the rows returned."""
+    with tracing.span(f"db.{op}", **attrs) as span:
+        response = request.execute()
+        data = response.data
+        span.set(rows=len(data) if isinstance(data, list) else int(data is not None))
+        return response
+
+
+def _load_day_bookings(doctor, date):
+    """Fetches (id, appointment_time) for one doctor/day to fill the slot index."""
+    response = _execute("load_day", get_client().table("appointments").select("id, appointment_time").eq("doctor", doctor).eq("appointment_date", date))
+    return [(row["id"], row["appointment_time"]) for row in response.data]
+
+# Bookings per doctor and day, kept sorted so availability checks skip the DB round trip.
+slot_index = SlotIndex(_load_day_bookings, max_age=float(get_secret("SLOT_INDEX_MAX_AGE", 30)))
+
 
 def test_connection():
     """Tests the connection to the Supabase appointments table."""
-    if not supabase:
+    if not get_client():
         return False, "Supabase client not initialized. Check your secrets."
     try:
-        supabase.table("appointments").select("id").limit(1).execute()
+        _execute("health", get_client().table("appointments").select("id").limit(1))
         return True, None
     except Exception as e:
         return False, str(e)
 
+# Probed in the background; the chat loop reads health.status() instead of querying each rerun
+health = HealthMonitor(test_connection, interval=float(get_secret("DB_HEALTH_INTERVAL", 30)), name="database")
+
+def _report_if_down(e):
+    """Degrades the health status for connection failures only; data errors leave it alone."""
+    if is_transport_error(e):
+        health.report_failure(e)
+
 def add_appointment(email, name, mobile, age, gender, symptoms, doctor, date, time):
     """Adds a new appointment to the database."""
     data = {
@@ -50,77 +92,394 @@ def add_appointment(email, name, mobile, age, gender, symptoms, doctor, date, ti
         "appointment_time": time,
     }
     try:
-        response = supabase.table("appointments").insert(data).execute()
+        response = _execute("insert", get_client().table("appointments").insert(data))
+        for row in response.data or [None]:
+            slot_index.add(row.get("id") if row else None, doctor, date, time)
         return response
     except Exception as e:
+        # The insert may have landed even though the call failed
+        slot_index.invalidate(doctor, date)
         print(f"Error adding appointment: {e}")
+        _report_if_down(e)
         return None
 
-def get_appointments(email):
+def book_if_free(email, name, mobile, age, gender, symptoms, doctor, date, time):
+    """
+    Books the slot only if the doctor has no booking within the conflict window,
+    in one RPC round trip (sql/002_book_if_free.sql).
+    Returns {"status": "booked", "appointment": row} or {"status": "conflict", "conflict": row},
+    or None if the database call failed.
+    """
+    data = {
+        "email": email,
+        "name": name,
+        "mobile": mobile,
+        "age": age,
+        "gender": gender,
+        "symptoms": symptoms,
+        "doctor": doctor,
+        "appointment_date": date,
+        "appointment_time": time,
+    }
+    data["idempotency_key"] = idempotency_key(data)
+    try:
+        # Safe to retry: a repeated call returns the row its first attempt created
+        result = _with_retries(lambda: _execute("book_if_free", get_client().rpc("book_if_free", {"appointment": data}))).data
+        if result["status"] == "booked":
+            row = result["appointment"]
+            slot_index.add(row["id"], doctor, date, time)
+        else:
+            # Someone else holds the slot; reload this day on the next check
+            slot_index.invalidate(doctor, date)
+        return result
+    except Exception as e:
+        slot_index.invalidate(doctor, date)
+        print(f"Error booking appointment: {e}")
+        _report_if_down(e)
+        return None
+
+# Rows per keyset page for iter_appointments
+PAGE_SIZE = int(get_secret("APPOINTMENTS_PAGE_SIZE", 200))
+_CURSOR_COLUMNS = ["appointment_date", "appointment_time", "id"]
+
+def _quote(value):
+    """Quotes a value for a PostgREST or=() filter (times contain spaces and colons)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def iter_appointments(columns="*", page_size=PAGE_SIZE, date_from=None, date_to=None, **filters):
+    """
+    Lazily yields appointments matching equality `filters` (e.g. email=..., doctor=...)
+    and an optional appointment_date range, fetching `page_size` rows per request.
+    Pages follow a keyset cursor on (appointment_date, appointment_time, id), so every
+    page is an index range scan however deep the caller reads, and only the requested
+    `columns` are transferred. The cursor columns are added to the projection if missing.
+    Note appointment_time is ordered as text, which is consistent but not chronological.
+    """
+    wanted = [c.strip() for c in columns.split(",")]
+    projection = ", ".join(wanted + [c for c in _CURSOR_COLUMNS if "*" not in wanted and c not in wanted])
+
+    cursor = None
+    while True:
+        query = get_client().table("appointments").select(projection)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        if date_from is not None:
+            query = query.gte("appointment_date", date_from)
+        if date_to is not None:
+            query = query.lte("appointment_date", date_to)
+        if cursor:
+            d, t, i = (_quote(v) for v in cursor)
+            query = query.or_(f"appointment_date.gt.{d},"
+                              f"and(appointment_date.eq.{d},appointment_time.gt.{t}),"
+                              f"and(appointment_date.eq.{d},appointment_time.eq.{t},id.gt.{i})")
+        query = query.order("appointment_date").order("appointment_time").order("id").limit(page_size)
+        rows = _execute("select_page", query, page_size=page_size).data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        cursor = (last["appointment_date"], last["appointment_time"], last["id"])
+
+def get_appointments(email, columns="*"):
     """Fetches appointments for a specific user email."""
     try:
-        response = supabase.table("appointments").select("*").eq("email", email).execute()
-        return response.data
+        return list(iter_appointments(columns, email=email))
     except Exception as e:
         print(f"Error fetching appointments: {e}")
+        _report_if_down(e)
         return []
 
 def cancel_appointment(appointment_id):
     """Cancels an appointment by its unique ID."""
     try:
-        response = supabase.table("appointments").delete().eq("id", appointment_id).execute()
+        response = _execute("delete", get_client().table("appointments").delete().eq("id", appointment_id))
+        slot_index.remove(appointment_id)
         return response
     except Exception as e:
         print(f"Error cancelling appointment: {e}")
+        _report_if_down(e)
         return None
 
+# A moved row no longer answers retries of the booking that created it: its key
+# (idempotency_key() of the old slot) would make book_if_free return it for that slot.
+_MOVED = {"idempotency_key": None}
+
 def reschedule_appointment(appointment_id, new_date, new_time):
     """Reschedules an appointment by ID."""
     try:
         update_data = {
             "appointment_date": new_date,
-            "appointment_time": new_time
+            "appointment_time": new_time,
+            **_MOVED,
         }
-        supabase.table("appointments").update(update_data).eq("id", appointment_id).execute()
+        _execute("update", get_client().table("appointments").update(update_data).eq("id", appointment_id))
+        slot_index.move(appointment_id, new_date, new_time)
         return True
     except Exception as e:
+        slot_index.invalidate(date=new_date)
         print(f"Error rescheduling appointment: {e}")
+        _report_if_down(e)
         return False
 
+def get_appointment(appointment_id, columns="*"):
+    """Fetches one appointment by ID, or None if there is none. Raises if the database call fails."""
+    try:
+        rows = _execute("select_one", get_client().table("appointments").select(columns).eq("id", appointment_id).limit(1)).data
+    except Exception as e:
+        print(f"Error fetching appointment: {e}")
+        _report_if_down(e)
+        raise
+    return rows[0] if rows else None
+
+def reschedule_if_free(appointment_id, new_date, new_time, email=None):
+    """
+    Moves an appointment only if its doctor has no other booking within the conflict window.
+    With `email`, only an appointment belonging to that patient is moved.
+    Returns {"status": "rescheduled", "appointment": row}, {"status": "conflict", "conflict": row}
+    or {"status": "not_found"}, or None if the database call failed. Raises ValueError for a bad time.
+    The check and the update are separate calls; the appointments_no_overlap constraint
+    (sql/002_book_if_free.sql) refuses an overlap that slips in between.
+    """
+    minute = time_to_minute(new_time)
+    try:
+        row = get_appointment(appointment_id, "id, email, doctor")
+        if row is None or (email is not None and str(row["email"]).strip().lower() != email.strip().lower()):
+            return {"status": "not_found"}
+        doctor = row["doctor"]
+        day = _execute("load_day", get_client().table("appointments").select("id, appointment_time")
+                       .eq("doctor", doctor).eq("appointment_date", new_date)).data or []
+        for other in day:
+            try:
+                clash = str(other["id"]) != str(appointment_id) and abs(time_to_minute(other["appointment_time"]) - minute) < CONFLICT_MINUTES
+            except ValueError:
+                continue
+            if clash:
+                slot_index.invalidate(doctor, new_date)
+                return {"status": "conflict", "conflict": {**other, "doctor": doctor, "appointment_date": new_date}}
+        update_data = {"appointment_date": new_date, "appointment_time": new_time, **_MOVED}
+        response = _execute("update", get_client().table("appointments").update(update_data).eq("id", appointment_id))
+        slot_index.move(appointment_id, new_date, new_time)
+        return {"status": "rescheduled", "appointment": (response.data or [{**row, **update_data}])[0]}
+    except Exception as e:
+        slot_index.invalidate(date=new_date)
+        if getattr(e, "code", None) == "23P01":  # exclusion_violation: booked in the meantime
+            return {"status": "conflict", "conflict": {"doctor": row["doctor"], "appointment_date": new_date}}
+        print(f"Error rescheduling appointment: {e}")
+        _report_if_down(e)
+        return None
+
 def check_availability(date, time, doctor):
     """Checks if a time slot is available for a doctor."""
     try:
-        print(f"DEBUG: Checking availability for {doctor} on {date} at {time}")
-        # Fetch appointments for the doctor on that date
-        response = supabase.table("appointments").select("*").eq("doctor", doctor).eq("appointment_date", date).execute()
-        appointments = response.data
-        print(f"DEBUG: Found {len(appointments)} existing appointments: {appointments}")
-        
-        from datetime import datetime
-        new_time_dt = datetime.strptime(time, "%I:%M %p")
-        
-        for appt in appointments:
-            booked_time = appt["appointment_time"]
-            try:
-                booked_time_dt = datetime.strptime(booked_time, "%I:%M %p")
-                
-                diff = abs((new_time_dt - booked_time_dt).total_seconds())
-                print(f"DEBUG: Comparing {new_time_dt} with {booked_time_dt}. Diff: {diff} seconds")
-
-                # Check for conflict (within 20 mins)
-                if diff < 1200:
-                    print("DEBUG: Conflict found!")
-                    return False
-            except ValueError as ve:
-                print(f"DEBUG: Error parsing booked time '{booked_time}': {ve}")
-                continue # Skip invalid time formats in DB
-                
-        print("DEBUG: Slot is available.")
-        return True
+        return not slot_index.has_conflict(doctor, date, time)
     except Exception as e:
         print(f"Error checking availability: {e}")
-        # Fail safe: assume available or not? Maybe blocking is safer.
-        # But let's return True to not block if DB is down? No, False prevents double booking.
+        _report_if_down(e)
+        # Fail safe: blocking prevents double booking if the DB is down.
         return False
 
+def find_free_slots(doctor, date_from, date_to, n=5, day_start="09:00 AM", day_end="05:00 PM", slot_minutes=CONFLICT_MINUTES):
+    """
+    Returns the earliest `n` free (date, 'HH:MM AM/PM') slots for a doctor between
+    date_from and date_to (YYYY-MM-DD, inclusive), within working hours, skipping
+    times already past. Bookings for the whole range come from one range query and
+    also refresh the slot index, so follow-up availability checks stay local.
+    Raises ValueError for a malformed date or a range longer than MAX_SEARCH_DAYS.
+    """
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    days = (datetime.strptime(date_to, "%Y-%m-%d") - start).days + 1
+    if not 1 <= days <= MAX_SEARCH_DAYS:
+        raise ValueError(f"date_to must be 0-{MAX_SEARCH_DAYS - 1} days after date_from")
+    dates = [(start + timedelta(days=k)).strftime("%Y-%m-%d") for k in range(days)]
+    try:
+        by_day = {d: [] for d in dates}
+        rows = iter_appointments("id, appointment_time", page_size=1000, doctor=doctor, date_from=date_from, date_to=date_to)
+        for row in rows:
+            by_day.setdefault(str(row["appointment_date"]), []).append((row["id"], row["appointment_time"]))
+        for d in dates:
+            slot_index.load_day(doctor, d, by_day[d])
+
+        now = datetime.now()
+        not_before = (now.strftime("%Y-%m-%d"), now.hour * 60 + now.minute)
+        return slot_index.next_free_slots(doctor, dates, n, day_start, day_end, slot_minutes, not_before=not_before)
+    except Exception as e:
+        print(f"Error finding free slots: {e}")
+        _report_if_down(e)
+        return []
+
+def get_free_slots(date, doctor, start="09:00 AM", end="05:00 PM"):
+    """Lists free 'HH:MM AM/PM' slots for a doctor on a given day."""
+    try:
+        return slot_index.free_slots(doctor, date, start, end)
+    except Exception as e:
+        print(f"Error listing free slots: {e}")
+        _report_if_down(e)
+        return []
+
+
+# Rows per request for the bulk helpers; keeps each PostgREST call well under its body limits.
+BULK_BATCH_SIZE = int(get_secret("BULK_BATCH_SIZE", 500))
+BULK_RETRIES = 2
+# Backoff before retry n is a random delay up to min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n) seconds
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 2.0
+
+APPOINTMENT_FIELDS = ["email", "name", "mobile", "age", "gender", "symptoms", "doctor", "appointment_date", "appointment_time"]
+
+def idempotency_key(row):
+    """Default key for a bulk row: the same patient, doctor and slot is the same booking."""
+    parts = [str(row.get(f, "")).strip().lower() for f in ("email", "doctor", "appointment_date", "appointment_time")]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _is_constraint_error(e):
+    """True for a Postgres integrity error (SQLSTATE class 23, e.g. 23P01 exclusion_violation)."""
+    return str(getattr(e, "code", "") or "").startswith("23")
+
+def _with_retries(request):
+    """
+    Runs request(), retrying failed round trips with exponential backoff; only used
+    for idempotent calls. The jitter keeps workers hit by the same outage from
+    retrying in lockstep. Constraint errors are raised at once: a retry would fail the same way.
+    """
+    for attempt in range(BULK_RETRIES + 1):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == BULK_RETRIES or _is_constraint_error(e):
+                raise
+        time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+def add_appointments(rows, batch_size=BULK_BATCH_SIZE):
+    """
+    Inserts many appointments in batches of `batch_size` rows per request.
+    rows: dicts with the add_appointment fields (doctor, appointment_date, appointment_time...)
+    and an optional idempotency_key; rows already inserted with the same key are skipped,
+    so a failed import can simply be run again. A batch refused by a constraint (e.g. one row
+    overlapping a booking, appointments_no_overlap) is retried row by row, so only the
+    offending rows are reported as "conflict".
+    Returns one dict per input row:
+    {"idempotency_key", "status": "created" | "duplicate" | "conflict" | "error", "id", "error"}.
+    """
+    records = []
+    for row in rows:
+        record = {f: row.get(f) for f in APPOINTMENT_FIELDS}
+        record["idempotency_key"] = row.get("idempotency_key") or idempotency_key(row)
+        records.append(record)
+
+    def upsert(batch):
+        return _with_retries(lambda: _execute("bulk_insert", get_client().table("appointments").upsert(
+            batch, on_conflict="idempotency_key", ignore_duplicates=True), payload_rows=len(batch)))
+
+    outcome = {}
+    unique = list({r["idempotency_key"]: r for r in records}.values())
+    pending = list(_chunks(unique, batch_size))
+    while pending:
+        batch = pending.pop(0)
+        try:
+            response = upsert(batch)
+        except Exception as e:
+            if _is_constraint_error(e) and len(batch) > 1:
+                pending[:0] = [[r] for r in batch]
+                continue
+            status = "conflict" if _is_constraint_error(e) else "error"
+            if status == "error":
+                print(f"Error adding appointments: {e}")
+                _report_if_down(e)
+            for r in batch:
+                outcome[r["idempotency_key"]] = {"status": status, "id": None, "error": str(e)}
+                slot_index.invalidate(r["doctor"], r["appointment_date"])
+            continue
+        for created in response.data or []:
+            outcome[created["idempotency_key"]] = {"status": "created", "id": created.get("id"), "error": None}
+            slot_index.add(created.get("id"), created["doctor"], created["appointment_date"], created["appointment_time"])
+
+    results, seen = [], set()
+    for r in records:
+        k = r["idempotency_key"]
+        res = outcome.get(k, {"status": "duplicate", "id": None, "error": None})
+        if k in seen and res["status"] == "created":
+            res = {"status": "duplicate", "id": res["id"], "error": None}
+        seen.add(k)
+        results.append({"idempotency_key": k, **res})
+    return results
+
+def cancel_appointments(ids=None, doctor=None, date=None, date_from=None, date_to=None, email=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Cancels many appointments with one delete per batch, e.g. a clinic closure:
+    cancel_appointments(doctor="Dr. X", date_from="2026-02-10", date_to="2026-02-12").
+    Filters are combined; at least one is required so nothing is deleted by accident.
+    Returns one dict per cancelled row ({"id", "status": "cancelled", ...row}); when `ids`
+    are given, ids that matched nothing are reported as "not_found" and failed batches as "error".
+    """
+    filters = [(op, col, val) for op, col, val in (
+        ("eq", "doctor", doctor), ("eq", "appointment_date", date), ("gte", "appointment_date", date_from),
+        ("lte", "appointment_date", date_to), ("eq", "email", email)) if val is not None]
+    if not filters and not ids:
+        raise ValueError("cancel_appointments needs ids or at least one filter")
+
+    def delete(id_batch=None):
+        query = get_client().table("appointments").delete()
+        for op, col, val in filters:
+            query = getattr(query, op)(col, val)
+        if id_batch is not None:
+            query = query.in_("id", id_batch)
+        return _execute("bulk_delete", query, payload_rows=len(id_batch or []))
+
+    results = []
+    for id_batch in (_chunks(list(ids), batch_size) if ids else [None]):
+        try:
+            # Deletes are idempotent, so retrying a lost response is safe
+            response = _with_retries(lambda: delete(id_batch))
+        except Exception as e:
+            print(f"Error cancelling appointments: {e}")
+            _report_if_down(e)
+            results += [{"id": i, "status": "error", "error": str(e)} for i in id_batch or []]
+            continue
+        deleted = {}
+        for row in response.data or []:
+            slot_index.remove(row["id"])
+            deleted[str(row["id"])] = {**row, "status": "cancelled"}
+        results += deleted.values()
+        for i in id_batch or []:
+            if str(i) not in deleted:
+                results.append({"id": i, "status": "not_found"})
+    return results
 
+def reschedule_appointments(changes, batch_size=BULK_BATCH_SIZE):
+    """
+    Moves many appointments in one RPC per batch (sql/001_bulk_operations.sql).
+    changes: dicts with id, appointment_date, appointment_time and optionally doctor (reassignment).
+    A batch refused by a constraint is retried one change at a time, as in add_appointments.
+    Returns one dict per change, in order:
+    {"id", "status": "rescheduled" | "not_found" | "conflict" | "error", ...}.
+    """
+    # Only the last change per appointment applies
+    latest = {str(c["id"]): c for c in changes}
+    outcome = {}
+    pending = list(_chunks(list(latest.values()), batch_size))
+    while pending:
+        batch = pending.pop(0)
+        payload = [{k: c[k] for k in ("id", "appointment_date", "appointment_time", "doctor") if k in c} for c in batch]
+        try:
+            response = _with_retries(lambda: _execute("bulk_reschedule", get_client().rpc("bulk_reschedule", {"changes": payload}), payload_rows=len(payload)))
+        except Exception as e:
+            if _is_constraint_error(e) and len(batch) > 1:
+                pending[:0] = [[c] for c in batch]
+                continue
+            status = "conflict" if _is_constraint_error(e) else "error"
+            if status == "error":
+                print(f"Error rescheduling appointments: {e}")
+                _report_if_down(e)
+            for c in batch:
+                outcome[str(c["id"])] = {"id": c["id"], "status": status, "error": str(e)}
+                slot_index.invalidate(date=c["appointment_date"])
+            continue
+        for row in response.data or []:
+            outcome[str(row["id"])] = row
+            if row["status"] == "rescheduled":
+                slot_index.add(row["id"], row["doctor"], row["appointment_date"], row["appointment_time"])
+    return [outcome.get(str(c["id"]), {"id": c["id"], "status": "not_found"}) for c in changes]
@@ -0,0 +1,242 @@
+"""
+Deterministic parser for the date and time phrases patients usually say
+("tomorrow", "next Monday", "in 2 hours", "5 in the evening", "noon", "25th Jan").
+It answers locally in microseconds and returns None whenever part of the
+message is left unexplained, so the caller can defer to the LLM.
+"""
+import re
+from datetime import datetime, timedelta
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_NUMBER_WORDS_RE = re.compile(r"\b(" + "|".join(w for w in _NUMBER_WORDS if len(w) > 2) + r")\b")
+
+_WEEKDAYS = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1, "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5, "sun": 6, "sunday": 6,
+}
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+_WEEKDAY_ALT = "|".join(sorted(_WEEKDAYS, key=len, reverse=True))
+_MONTH_ALT = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_ORD = r"(?:st|nd|rd|th)?"
+
+_RELATIVE_DAY_RE = re.compile(r"\b(day after tomorrow|tomorrow|tomorow|tmrw|tmr|today|tonight)\b")
+_IN_DAYS_RE = re.compile(r"\b(?:in|after)\s+(\d+|a|an)\s+(day|days|week|weeks)\b")
+_WEEKDAY_RE = re.compile(r"\b(?:(this|next|coming)\s+)?(" + _WEEKDAY_ALT + r")\b\.?")
+_DAY_MONTH_RE = re.compile(r"\b(\d{1,2})" + _ORD + r"\s+(?:of\s+)?(" + _MONTH_ALT + r")\b\.?(?:,?\s+(\d{4}))?")
+_MONTH_DAY_RE = re.compile(r"\b(" + _MONTH_ALT + r")\.?\s+(\d{1,2})" + _ORD + r"\b(?:,?\s+(\d{4}))?")
+_ORDINAL_DAY_RE = re.compile(r"\b(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)\b")
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?\b")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+
+_IN_TIME_RE = re.compile(r"\b(?:in|after)\s+(\d+|a|an|half an?)\s+(hours?|hrs?|minutes?|mins?)\b")
+# Phrases whose meaning shifts with the time of day, not just the date
+_NOW_RE = re.compile(r"\b(now|right away|asap|soon|later|earliest|next available|tonight|this (?:morning|afternoon|evening))\b")
+_NOON_RE = re.compile(r"\b(noon|midday|midnight)\b")
+_HALF_QUARTER_RE = re.compile(r"\b(half past|quarter past|quarter to)\s+(\d{1,2})\b")
+_AMPM_RE = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s?m\b\.?")
+_PERIOD_RE = re.compile(
+    r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(?:o'?clock\s*)?(?:in\s+the\s+|at\s+)?(morning|afternoon|evening|night)\b"
+)
+_24H_RE = re.compile(r"\b([01]?\d|2[0-3])[:.]([0-5]\d)\b")
+_O_CLOCK_RE = re.compile(r"\b(?:at\s+)?(\d{1,2})\s*o'?clock\b")
+_AT_HOUR_RE = re.compile(r"\bat\s+(\d{1,2})\b")
+_TRAILING_PERIOD_RE = re.compile(r"\s*(?:in\s+the\s+|at\s+)?(morning|afternoon|evening|night)\b")
+
+# Words that may surround a date/time without changing its meaning.
+_FILLER_WORDS = {
+    "at", "on", "in", "the", "by", "around", "about", "approx", "approximately", "please",
+    "i", "i'm", "want", "would", "like", "to", "come", "visit", "can", "could", "will",
+    "book", "appointment", "for", "maybe", "ok", "okay", "lets", "let's", "say", "how",
+    "is", "it", "fine", "works", "good", "that", "me", "for", "sometime", "a", "an",
+    "of", "this", "day", "date", "time", "slot", "be", "available", "free", "yes",
+}
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _to_12h(hour, minute):
+    return datetime(2000, 1, 1, hour, minute).strftime("%I:%M %p")
+
+
+def _clinic_hour(hour):
+    """Bare hours follow clinic hours: 8-11 are mornings, 12-7 afternoons/evenings."""
+    if hour == 12 or 1 <= hour <= 7:
+        return hour % 12 + 12
+    return hour
+
+
+def _apply_period(hour, period):
+    """Converts a 1-12 hour said with "morning"/"evening"/... to 24h."""
+    if period == "morning":
+        return hour % 12
+    if period == "night" and hour == 12:
+        return 0
+    return hour % 12 + 12
+
+
+def _safe_date(year, month, day):
+    try:
+        return datetime(year, month, day).date()
+    except ValueError:
+        return None
+
+
+def _upcoming(today, month, day, year):
+    """Resolves a day/month without a year to the next time it occurs."""
+    if year:
+        return _safe_date(int(year), month, day)
+    found = _safe_date(today.year, month, day)
+    if found and found < today:
+        found = _safe_date(today.year + 1, month, day)
+    return found
+
+
+def _parse_date(text, now):
+    """Returns (date or None, span) for the first date expression found."""
+    today = now.date()
+    match = _RELATIVE_DAY_RE.search(text)
+    if match:
+        offset = {"day after tomorrow": 2, "today": 0, "tonight": 0}.get(match.group(1), 1)
+        return today + timedelta(days=offset), match.span()
+    match = _IN_DAYS_RE.search(text)
+    if match:
+        count = 1 if match.group(1) in ("a", "an") else int(match.group(1))
+        days = count * (7 if match.group(2).startswith("week") else 1)
+        return today + timedelta(days=days), match.span()
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        return _safe_date(year, month, day), match.span()
+    match = _DAY_MONTH_RE.search(text)
+    if match:
+        return _upcoming(today, _MONTHS[match.group(2)], int(match.group(1)), match.group(3)), match.span()
+    match = _MONTH_DAY_RE.search(text)
+    if match:
+        return _upcoming(today, _MONTHS[match.group(1)], int(match.group(2)), match.group(3)), match.span()
+    match = _NUMERIC_DATE_RE.search(text)
+    if match:
+        # Day first, as written in India (25/01, 25-01-2026)
+        day, month, year = match.groups()
+        if year and len(year) == 2:
+            year = "20" + year
+        return _upcoming(today, int(month), int(day), year), match.span()
+    match = _WEEKDAY_RE.search(text)
+    if match:
+        qualifier, name = match.groups()
+        ahead = (_WEEKDAYS[name] - today.weekday()) % 7
+        if ahead == 0 and qualifier != "this":
+            ahead = 7
+        return today + timedelta(days=ahead), match.span()
+    match = _ORDINAL_DAY_RE.search(text)
+    if match:
+        day = int(match.group(1))
+        found = _safe_date(today.year, today.month, day)
+        if found and found < today:
+            month, year = (1, today.year + 1) if today.month == 12 else (today.month + 1, today.year)
+            found = _safe_date(year, month, day)
+        return found, match.span()
+    return None, None
+
+
+def _parse_time(text):
+    """Returns ((hour, minute) or None, span) for the first time expression found."""
+    match = _NOON_RE.search(text)
+    if match:
+        return (0 if match.group(1) == "midnight" else 12, 0), match.span()
+    match = _HALF_QUARTER_RE.search(text)
+    if match:
+        hour = int(match.group(2))
+        if not 1 <= hour <= 12:
+            return None, match.span()
+        period = _TRAILING_PERIOD_RE.match(text, match.end())
+        hour = _apply_period(hour, period.group(1)) if period else _clinic_hour(hour)
+        minute = {"half past": 30, "quarter past": 15}.get(match.group(1))
+        if minute is None:
+            hour, minute = (hour - 1) % 24, 45
+        return (hour, minute), (match.start(), period.end() if period else match.end())
+    match = _AMPM_RE.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            return None, match.span()
+        return (hour % 12 + (12 if match.group(3) == "p" else 0), minute), match.span()
+    match = _PERIOD_RE.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            return None, match.span()
+        return (_apply_period(hour, match.group(3)), minute), match.span()
+    match = _24H_RE.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour <= 12:
+            hour = _clinic_hour(hour) if hour else hour
+        return (hour, minute), match.span()
+    match = _O_CLOCK_RE.search(text) or _AT_HOUR_RE.search(text)
+    if match:
+        hour = int(match.group(1))
+        if not 1 <= hour <= 12:
+            return None, match.span()
+        return (_clinic_hour(hour), 0), match.span()
+    return None, None
+
+
+def depends_on_time_of_day(text):
+    """True if resolving the phrase needs the current time as well as today's date ("in 2 hours", "asap")."""
+    text = _NUMBER_WORDS_RE.sub(lambda m: str(_NUMBER_WORDS[m.group(1)]), str(text or "").lower())
+    return bool(_IN_TIME_RE.search(text) or _NOW_RE.search(text))
+
+
+def parse_datetime_local(text, now=None):
+    """
+    Parses relative and absolute date/time phrases without an LLM.
+    Returns {"date": "YYYY-MM-DD" or None, "time": "HH:MM AM/PM" or None}, or None
+    when nothing was recognised or some words were left unexplained.
+    """
+    if not text:
+        return None
+    now = now or datetime.now()
+    text = text.lower().strip()
+    text = _NUMBER_WORDS_RE.sub(lambda m: str(_NUMBER_WORDS[m.group(1)]), text)
+
+    date = time = None
+    match = _IN_TIME_RE.search(text)
+    if match:
+        amount, unit = match.groups()
+        if amount.startswith("half"):
+            delta = timedelta(minutes=30)
+        else:
+            count = 1 if amount in ("a", "an") else int(amount)
+            delta = timedelta(hours=count) if unit.startswith("h") else timedelta(minutes=count)
+        target = now + delta
+        date, time = target.date(), (target.hour, target.minute)
+        text = text[:match.start()] + " " + text[match.end():]
+    else:
+        for parser, is_date in ((_parse_date, True), (_parse_time, False)):
+            value, span = parser(text, now) if is_date else parser(text)
+            if span is None:
+                continue
+            if value is None:
+                return None  # Recognised the shape but not a real date/time
+            if is_date:
+                date = value
+            else:
+                time = value
+            text = text[:span[0]] + " " + text[span[1]:]
+
+    if date is None and time is None:
+        return None
+    if any(w not in _FILLER_WORDS for w in _WORD_RE.findall(text)):
+        return None
+    return {
+        "date": date.strftime("%Y-%m-%d") if date else None,
+        "time": _to_12h(*time) if time else None,
+    }
@@ -0,0 +1,184 @@
+"""
+Compact, versioned binary snapshot of the doctor directory.
+
+Build once (at deploy time):
+    python doctor_snapshot.py build [doctors.csv] [doctors.snap]
+
+Workers then memory-map the file read-only, so every process shares the
+same pages through the OS cache and startup skips kagglehub and pandas.
+
+Layout (little-endian):
+    header        magic, format version, string/specialty/ref counts, data version (CRC32 of the CSV)
+    offsets       (n_strings + 1) x u32, byte offsets into the string blob
+    specialties   n_specialties x (name string id, first ref, ref count)
+    refs          n_refs x u32, string ids of doctor names, grouped by specialty
+    blob          UTF-8 bytes of every distinct string, each stored once
+"""
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+
+MAGIC = b"DOCSNAP\x00"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHHIIII")
+_U32 = struct.Struct("<I")
+_SPECIALTY = struct.Struct("<III")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "doctors.snap")
+SPECIALTY_COLUMN = "speciality"
+NAME_COLUMN = "Doctor's Name"
+
+
+def read_csv_directory(csv_path):
+    """Reads the Kaggle CSV into {specialty: [doctor names]} in file order."""
+    directory = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            specialty, name = row.get(SPECIALTY_COLUMN), row.get(NAME_COLUMN)
+            if specialty and name:
+                directory.setdefault(specialty, []).append(name)
+    return directory
+
+
+def write_snapshot(directory, path, data_version=0):
+    """Serializes {specialty: [names]} into the snapshot format at `path`."""
+    strings, ids = [], {}
+
+    def intern(s):
+        if s not in ids:
+            ids[s] = len(strings)
+            strings.append(s)
+        return ids[s]
+
+    specialties, refs = [], []
+    for specialty in sorted(directory):
+        name_id = intern(specialty)
+        first = len(refs)
+        refs.extend(intern(name) for name in directory[specialty])
+        specialties.append((name_id, first, len(refs) - first))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(strings), len(specialties), len(refs), data_version))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for entry in specialties:
+            f.write(_SPECIALTY.pack(*entry))
+        f.write(struct.pack(f"<{len(refs)}I", *refs))
+        f.write(b"".join(encoded))
+    # Atomic swap so running workers never map a half-written file.
+    os.replace(tmp_path, path)
+
+
+class DoctorDirectory:
+    """Read-only, dict-like view of a memory-mapped snapshot: specialty -> [doctor names]."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n_strings, n_specialties, n_refs, data_version = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Unsupported doctor snapshot format in {path}")
+        self.data_version = data_version
+        self._offsets = _HEADER.size
+        specialties_at = self._offsets + _U32.size * (n_strings + 1)
+        self._refs = specialties_at + _SPECIALTY.size * n_specialties
+        self._blob = self._refs + _U32.size * n_refs
+        self._strings = {}
+        self._lists = {}
+        self._lock = threading.Lock()
+        self._index = {}
+        for i in range(n_specialties):
+            name_id, first, count = _SPECIALTY.unpack_from(self._mm, specialties_at + i * _SPECIALTY.size)
+            self._index[self._string(name_id)] = (first, count)
+
+    def _string(self, string_id):
+        cached = self._strings.get(string_id)
+        if cached is None:
+            start, end = struct.unpack_from("<II", self._mm, self._offsets + _U32.size * string_id)
+            cached = sys.intern(self._mm[self._blob + start:self._blob + end].decode("utf-8"))
+            self._strings[string_id] = cached
+        return cached
+
+    def _names(self, specialty):
+        names = self._lists.get(specialty)
+        if names is None:
+            first, count = self._index[specialty]
+            ids = struct.unpack_from(f"<{count}I", self._mm, self._refs + _U32.size * first)
+            with self._lock:
+                names = [self._string(i) for i in ids]
+                self._lists[specialty] = names
+        return names
+
+    def get(self, specialty, default=None):
+        if specialty not in self._index:
+            return default
+        return list(self._names(specialty))
+
+    def __getitem__(self, specialty):
+        if specialty not in self._index:
+            raise KeyError(specialty)
+        return list(self._names(specialty))
+
+    def __contains__(self, specialty):
+        return specialty in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return ((k, self[k]) for k in self._index)
+
+
+def load_snapshot(path=None):
+    """Maps the snapshot at `path` (or DOCTOR_SNAPSHOT_PATH); returns None if unavailable."""
+    path = path or os.environ.get("DOCTOR_SNAPSHOT_PATH", DEFAULT_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        return DoctorDirectory(path)
+    except (ValueError, OSError, struct.error) as e:
+        print(f"Warning: could not load doctor snapshot {path}: {e}")
+        return None
+
+
+def download_csv():
+    """Fetches the Kaggle dataset and returns the path of its CSV, or None."""
+    import kagglehub
+    path = kagglehub.dataset_download("niksaurabh/doctors-speciality")
+    csv_files = [file for file in os.listdir(path) if file.endswith('.csv')]
+    return os.path.join(path, csv_files[0]) if csv_files else None
+
+
+def build(csv_path=None, out_path=None):
+    csv_path = csv_path or download_csv()
+    out_path = out_path or DEFAULT_PATH
+    with open(csv_path, "rb") as f:
+        data_version = zlib.crc32(f.read())
+    directory = read_csv_directory(csv_path)
+    write_snapshot(directory, out_path, data_version)
+    doctors = sum(len(v) for v in directory.values())
+    print(f"Wrote {out_path}: {len(directory)} specialties, {doctors} doctors, "
+          f"{os.path.getsize(out_path)} bytes, data version {data_version:08x}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python doctor_snapshot.py build [doctors.csv] [doctors.snap]")
+        sys.exit(1)
+    build(*sys.argv[2:4])
@@ -0,0 +1,245 @@
+"""
+Persistent email outbox.
+Messages are written to a local SQLite queue and sent by a background
+worker that keeps an authenticated SMTP connection open between batches,
+so callers only pay for an INSERT.
+"""
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import tracing
+from email.mime.text import MIMEText
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+# Replies about the message itself; their SMTP code says whether a retry can help.
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def is_permanent(error):
+    """
+    True if retrying the same message can't succeed: a 5xx reply to the sender, a
+    recipient or the data. 4xx replies (421, 450, 451, 452) are temporary and retried.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(code >= 500 for code in codes)
+    return isinstance(error, _MESSAGE_ERRORS) and error.smtp_code >= 500
+
+
+class EmailOutbox:
+    """SQLite-backed queue of outgoing email with a pooled-connection sender thread."""
+
+    def __init__(self, db_path, host, port, sender, username=None, password=None, use_ssl=True,
+                 batch_size=20, max_attempts=5, backoff_base=2.0, backoff_max=300.0,
+                 idle_timeout=60.0, poll_interval=5.0, lease_seconds=300.0):
+        self.db_path = db_path
+        self.host, self.port, self.use_ssl = host, port, use_ssl
+        self.sender, self.username, self.password = sender, username, password
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base, self.backoff_max = backoff_base, backoff_max
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self.connections_opened = 0
+        with self._db() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, to_email, subject, body):
+        """Queues a message and wakes the worker. Returns the outbox row id."""
+        now = time.time()
+        cur = self._db().execute(
+            "INSERT INTO outbox (to_email, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (to_email, subject, body, now, now),
+        )
+        self._wake.set()
+        return cur.lastrowid
+
+    def _claim_batch(self):
+        """Marks up to batch_size due messages as 'sending' so other workers skip them."""
+        now = time.time()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows stuck in 'sending' past their lease belong to a worker that died.
+            rows = conn.execute(
+                "SELECT id, to_email, subject, body, attempts FROM outbox"
+                " WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND next_attempt_at <= ?)"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (now, now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _connection(self):
+        """Returns a logged-in SMTP connection, reusing the previous one while it is alive."""
+        if self._smtp is not None:
+            idle = time.monotonic() - self._smtp_last_used
+            try:
+                if idle < self.idle_timeout and self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._close()
+        smtp_cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_cls(self.host, self.port, timeout=30)
+        if self.username:
+            smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        self._smtp = smtp
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send(self, to_email, subject, body):
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = self.sender
+        msg["To"] = to_email
+        payload = msg.as_string()
+        with tracing.span("email.send", host=self.host, payload_bytes=len(payload)) as span:
+            try:
+                self._connection().sendmail(self.sender, to_email, payload)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped an idle connection; retry once on a fresh one.
+                span.set(reconnected=True)
+                self._close()
+                self._connection().sendmail(self.sender, to_email, payload)
+        self._smtp_last_used = time.monotonic()
+
+    def drain_once(self):
+        """Sends every message that is currently due. Returns the number sent."""
+        sent = 0
+        while True:
+            rows = self._claim_batch()
+            if not rows:
+                return sent
+            for msg_id, to_email, subject, body, attempts in rows:
+                try:
+                    self._send(to_email, subject, body)
+                except Exception as e:
+                    self._record_failure(msg_id, attempts + 1, e)
+                    if not is_permanent(e):
+                        self._close()
+                    continue
+                self._db().execute(
+                    "UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                    (attempts + 1, time.time(), msg_id),
+                )
+                sent += 1
+
+    def _record_failure(self, msg_id, attempts, error):
+        print(f"Error sending email {msg_id} (attempt {attempts}): {error}")
+        if is_permanent(error) or attempts >= self.max_attempts:
+            status, delay = "failed", 0
+        else:
+            # Exponential backoff with jitter so retries from many workers spread out.
+            status = "pending"
+            delay = min(self.backoff_max, self.backoff_base ** attempts) * random.uniform(0.8, 1.2)
+        self._db().execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (status, attempts, time.time() + delay, str(error), msg_id),
+        )
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain_once()
+            except Exception as e:
+                print(f"Email outbox worker error: {e}")
+            if self._smtp is not None and time.monotonic() - self._smtp_last_used >= self.idle_timeout:
+                self._close()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        self._close()
+
+    def start(self):
+        """Starts the background sender thread (once per outbox)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Returns the number of messages per status."""
+        rows = self._db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_outbox(get_secret):
+    """
+    The app's outbox, configured from SMTP_* and EMAIL_OUTBOX_PATH settings read
+    through get_secret, and started once per process.
+    Raises RuntimeError if SMTP_USER or SMTP_PASSWORD is not set.
+    """
+    with _shared_lock:
+        if "outbox" not in _shared:
+            sender_email, password = get_secret("SMTP_USER"), get_secret("SMTP_PASSWORD")
+            if not (sender_email and password):
+                raise RuntimeError("SMTP_USER and SMTP_PASSWORD must be set to send email")
+            outbox = EmailOutbox(
+                db_path=get_secret("EMAIL_OUTBOX_PATH", "email_outbox.sqlite3"),
+                host=get_secret("SMTP_HOST", "smtp.gmail.com"),
+                port=int(get_secret("SMTP_PORT", 465)),
+                use_ssl=str(get_secret("SMTP_SSL", "on")).lower() not in ("0", "off", "false", "no"),
+                sender=sender_email,
+                username=sender_email,
+                password=password,
+            )
+            _shared["outbox"] = outbox.start()
+        return _shared["outbox"]
@@ -0,0 +1,74 @@
+import threading
+import time
+
+try:
+    from httpx import TransportError as _HTTPTransportError
+except ImportError:  # httpx comes with supabase; without it only OS-level errors count
+    _HTTPTransportError = OSError
+
+
+def is_transport_error(error):
+    """
+    True if `error` means the dependency couldn't be reached (connection refused or
+    reset, DNS, timeouts). Bad input and constraint violations are answers from a
+    healthy dependency, so they don't count.
+    """
+    return isinstance(error, (OSError, _HTTPTransportError))
+
+
+class HealthMonitor:
+    """
+    Process-wide cached health status for a dependency.
+    A daemon thread runs `probe()` every `interval` seconds (more often while
+    degraded); probe returns (ok, error) like database.test_connection.
+    Readers call status(), which only reads the cached tuple. Callers that see
+    a real failure report it so the status degrades immediately.
+    """
+
+    def __init__(self, probe, interval=30.0, degraded_interval=5.0, name="dependency"):
+        self.name = name
+        self._probe = probe
+        self._interval = interval
+        self._degraded_interval = degraded_interval
+        self._status = (True, None, 0.0)  # (ok, error, checked_at)
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _check(self):
+        try:
+            ok, error = self._probe()
+        except Exception as e:
+            ok, error = False, str(e)
+        self._status = (ok, error, time.time())
+
+    def _run(self):
+        while True:
+            ok = self._status[0]
+            self._wake.wait(self._interval if ok else self._degraded_interval)
+            self._wake.clear()
+            self._check()
+
+    def start(self):
+        """Runs the first probe synchronously, then keeps probing in the background."""
+        with self._start_lock:
+            if self._thread is None:
+                self._check()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-health", daemon=True)
+                self._thread.start()
+        return self
+
+    def status(self):
+        """Returns (ok, error) from the last probe or reported failure."""
+        if self._thread is None:
+            self.start()
+        ok, error, _ = self._status
+        return ok, error
+
+    def report_failure(self, error):
+        """Marks the dependency degraded now; the prober re-checks on its short interval."""
+        self._status = (False, str(error), time.time())
+        self._wake.set()
+
+    def last_checked(self):
+        return self._status[2]
@@ -1,22 +1,13 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
-
-load_dotenv()
-
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-
-supabase: Client = create_client(url, key)
+import database
 
 try:
     print("Fetching all appointments...")
-    response = supabase.table("appointments").select("*").execute()
-    data = response.data
-
-    print(f"Found {len(data)} appointments.")
-    for appt in data:
+    # Streams page by page, reading only the printed columns
+    count = 0
+    for appt in database.iter_appointments("id, doctor, appointment_date, appointment_time"):
+        count += 1
         print(f"ID: {appt.get('id')} | Doctor: {appt.get('doctor')} | Date: {appt.get('appointment_date')} | Time: {appt.get('appointment_time')}")
+    print(f"Found {count} appointments.")
 except Exception as e:
     print("An error occurred:")
     print(e)
@@ -0,0 +1,146 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Shared pool for provider calls. Hedges run on their own smaller pool and are
+# skipped while it is full, so abandoned hedges cannot queue up primary calls.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+HEDGE_WORKERS = 4
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+class LLMUnavailable(Exception):
+    """Raised when no provider produced a valid answer before the deadline."""
+
+
+class LatencyStats:
+    """Rolling per-provider latency and outcome counters."""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._providers = {}
+
+    def _entry(self, provider):
+        if provider not in self._providers:
+            self._providers[provider] = {
+                "calls": 0, "errors": 0, "wins": 0, "abandoned": 0,
+                "latencies": deque(maxlen=self._window),
+            }
+        return self._providers[provider]
+
+    def record(self, provider, seconds, ok):
+        with self._lock:
+            entry = self._entry(provider)
+            entry["calls"] += 1
+            if ok:
+                entry["latencies"].append(seconds)
+            else:
+                entry["errors"] += 1
+
+    def record_outcome(self, provider, won):
+        with self._lock:
+            self._entry(provider)["wins" if won else "abandoned"] += 1
+
+    def snapshot(self):
+        """Returns counters plus mean/p50/p95 latency (seconds) for each provider."""
+        with self._lock:
+            result = {}
+            for provider, entry in self._providers.items():
+                samples = sorted(entry["latencies"])
+                stats = {k: v for k, v in entry.items() if k != "latencies"}
+                if samples:
+                    stats["mean"] = round(sum(samples) / len(samples), 3)
+                    stats["p50"] = round(samples[int(0.50 * (len(samples) - 1))], 3)
+                    stats["p95"] = round(samples[int(0.95 * (len(samples) - 1))], 3)
+                result[provider] = stats
+            return result
+
+
+latency_stats = LatencyStats()
+
+
+def _timed(name, fn, timeout):
+    start = time.monotonic()
+    try:
+        result = fn(timeout)
+    except Exception:
+        latency_stats.record(name, time.monotonic() - start, ok=False)
+        raise
+    latency_stats.record(name, time.monotonic() - start, ok=True)
+    return result
+
+
+def hedged_call(providers, hedge_delay, deadline, validate=None):
+    """
+    Calls providers in priority order and returns the first valid answer.
+    providers: list of (name, fn) where fn(timeout) returns the raw response.
+    The next provider is fired when the running ones have all failed, or when
+    `hedge_delay` seconds pass without an answer. Nothing is awaited past
+    `deadline` seconds. Losing calls are abandoned, not cancelled: a call that
+    has started keeps running until its own timeout. Hedges fired while another
+    call is running use a separate bounded pool; when it is full the hedge is
+    skipped and the running call is simply awaited.
+    validate(raw) turns a response into the result, raising if it is unusable.
+    """
+    start = time.monotonic()
+    end = start + deadline
+    pending = {}
+    errors = []
+    next_idx = 0
+    hedge_at = start
+
+    def launch():
+        nonlocal next_idx, hedge_at
+        executor = _executor
+        if pending:
+            if not _hedge_slots.acquire(blocking=False):
+                hedge_at = end  # no room to hedge; keep waiting on the running call
+                return
+            executor = _hedge_executor
+        name, fn = providers[next_idx]
+        next_idx += 1
+        hedge_at = time.monotonic() + hedge_delay
+        remaining = max(0.1, end - time.monotonic())
+        # Run in a copy of the caller's context so tracing spans nest under its turn
+        ctx = contextvars.copy_context()
+        future = executor.submit(ctx.run, _timed, name, fn, remaining)
+        if executor is _hedge_executor:
+            future.add_done_callback(lambda _: _hedge_slots.release())
+        pending[future] = name
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            if next_idx < len(providers) and (not pending or now >= hedge_at):
+                launch()
+                continue
+            if not pending:
+                break
+            timeout = end - now
+            if next_idx < len(providers):
+                timeout = min(timeout, hedge_at - now)
+            done, _ = wait(pending, timeout=max(0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    raw = future.result()
+                    result = validate(raw) if validate else raw
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+                latency_stats.record_outcome(name, won=True)
+                return result
+    finally:
+        for future, name in pending.items():
+            future.cancel()
+            latency_stats.record_outcome(name, won=False)
+
+    if not errors:
+        errors.append(f"no answer within {deadline}s")
+    raise LLMUnavailable("; ".join(errors))
@@ -0,0 +1,268 @@
+"""
+Load test: many concurrent synthetic patients booking through the real chat flow.
+
+Usage:
+    python loadtest.py [--sessions 200] [--concurrency 50]
+                       [--db-latency 0.03] [--db-errors 0] [--llm-latency 0.6] [--llm-errors 0]
+                       [--smtp-latency 0.2] [--smtp-errors 0] [--tts-latency 0.3] [--tts-errors 0]
+                       [--groq-rpm 0]
+                       [--transcripts conversations.jsonl] [--report report.json] [--trace spans.jsonl]
+
+Each session runs streamlit_app.py in its own Streamlit AppTest (so every turn
+goes through handle_chat exactly as in the browser), with Supabase, Groq, Gemini,
+SMTP and gTTS replaced by the stand-ins in stand_ins.py. Prints throughput and
+p50/p95/p99 latency per conversation step.
+
+Transcripts (JSONL): one conversation per line, either a list of user messages
+or {"turns": [...]}. Without --transcripts, a booking conversation is generated
+per session with a unique patient and a random day in the coming week.
+
+--groq-rpm N makes the Groq stand-in answer 429 above N requests a minute. The
+client-side limits (GROQ_RPM, GROQ_TPM, GEMINI_RPM, GEMINI_TPM) are off unless
+set in the environment, so their effect can be compared against the 429s.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "streamlit_app.py")
+
+SYMPTOMS = [
+    "fever and body ache", "chest pain when climbing stairs", "itchy skin rash", "blurred vision",
+    "tooth ache", "knee joint pain", "stomach cramps", "frequent headache", "sore throat and ear pain",
+    "cough for two weeks", "feeling anxious all the time",
+]
+NAMES = ["Asha", "Rahul", "Priya", "Vikram", "Meera", "Arjun", "Kavya", "Rohan", "Sneha", "Imran"]
+
+
+def synthetic_conversation(i):
+    """A full booking: menu, details, symptoms, first doctor, a date, first offered slot, confirm."""
+    rng = random.Random(i)
+    day = (datetime.now() + timedelta(days=rng.randint(1, 7))).strftime("%Y-%m-%d")
+    return [
+        "1",
+        f"{rng.choice(NAMES)} Test{i}",
+        f"patient{i}@example.com",
+        f"9{rng.randint(100000000, 999999999)}",
+        str(rng.randint(18, 80)),
+        rng.choice(["Male", "Female"]),
+        rng.choice(SYMPTOMS),
+        "1",
+        day,
+        "1",
+        "yes",
+    ]
+
+
+def load_transcripts(path):
+    conversations = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                conversations.append(item["turns"] if isinstance(item, dict) else item)
+    return conversations
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not samples:
+        return None
+    k = max(0, min(len(samples) - 1, int(round(p / 100 * len(samples) + 0.5)) - 1))
+    return samples[k]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}        # step -> [seconds]
+        self.errors = {}       # step -> count
+        self.sessions_ok = 0
+        self.sessions_failed = 0
+
+    def turn(self, step, seconds, ok):
+        with self._lock:
+            self.steps.setdefault(step, []).append(seconds)
+            if not ok:
+                self.errors[step] = self.errors.get(step, 0) + 1
+
+    def session(self, ok):
+        with self._lock:
+            if ok:
+                self.sessions_ok += 1
+            else:
+                self.sessions_failed += 1
+
+
+def share_test_runtime():
+    """
+    AppTest installs a mock Streamlit Runtime for each run and removes it afterwards,
+    which races when sessions run in parallel threads. Pin one shared mock instead.
+    It also compiles the script on every run; share one ScriptCache as the real
+    server does, so concurrent compiles don't collide and CPU goes to the app.
+    """
+    from unittest.mock import MagicMock
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    # Each run restores this option on exit; keeping it set makes that a no-op
+    config.set_option("global.appTest", True)
+
+
+def run_session(turns, recorder, timeout):
+    """Plays one conversation; returns True if every turn ran without an app exception."""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=timeout)
+
+    start = time.perf_counter()
+    at.run()
+    recorder.turn("start", time.perf_counter() - start, not at.exception)
+    if at.exception:
+        recorder.session(False)
+        return False
+
+    for text in turns:
+        step = at.session_state["step"] if "step" in at.session_state else None
+        step = step or "start"
+        if not at.chat_input:
+            # The app stopped before rendering input (e.g. the database health check failed)
+            recorder.turn(step, 0.0, False)
+            recorder.session(False)
+            return False
+        start = time.perf_counter()
+        try:
+            at.chat_input[0].set_value(text).run()
+            ok = not at.exception
+        except Exception as e:
+            print(f"Session error at step {step}: {e}")
+            ok = False
+        recorder.turn(step, time.perf_counter() - start, ok)
+        if not ok:
+            recorder.session(False)
+            return False
+    recorder.session(True)
+    return True
+
+
+def report(recorder, wall_seconds, supabase, smtp):
+    turns = sum(len(v) for v in recorder.steps.values())
+    rows = []
+    for step, samples in sorted(recorder.steps.items(), key=lambda kv: -len(kv[1])):
+        ordered = sorted(samples)
+        rows.append({
+            "step": step,
+            "count": len(samples),
+            "errors": recorder.errors.get(step, 0),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        })
+    return {
+        "wall_seconds": round(wall_seconds, 2),
+        "sessions_completed": recorder.sessions_ok,
+        "sessions_failed": recorder.sessions_failed,
+        "turns": turns,
+        "turns_per_second": round(turns / wall_seconds, 2) if wall_seconds else None,
+        "sessions_per_second": round(recorder.sessions_ok / wall_seconds, 3) if wall_seconds else None,
+        "appointments_booked": len(supabase.tables.get("appointments", [])),
+        "emails_sent": len(smtp.sent),
+        "steps": rows,
+    }
+
+
+def print_report(result):
+    print(f"\nSessions: {result['sessions_completed']} completed, {result['sessions_failed']} failed "
+          f"in {result['wall_seconds']} s")
+    print(f"Throughput: {result['turns_per_second']} turns/s, {result['sessions_per_second']} sessions/s")
+    print(f"Booked: {result['appointments_booked']} appointments, emails sent so far: {result['emails_sent']}\n")
+    print(f"{'step':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in result["steps"]:
+        print(f"{row['step']:<22}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    for provider, s in result.get("rate_limits", {}).items():
+        print(f"\n{provider}: {s['admitted']} admitted, {s['throttled']} got 429, {s['rejected']} held back by the limiter, "
+              f"{s['wait_seconds']} s queued, concurrency cap {s['concurrency_limit']}", end="")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--transcripts", help="JSONL file of conversations to replay (cycled across sessions)")
+    parser.add_argument("--report", help="Also write the results as JSON to this file")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed per turn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", help="Record per-stage spans (tracing.py) as JSONL to this file")
+    parser.add_argument("--groq-rpm", type=int, default=0, help="Groq stand-in quota; 429 above it (0 = none)")
+    for service, latency in (("db", 0.03), ("llm", 0.6), ("smtp", 0.2), ("tts", 0.3)):
+        parser.add_argument(f"--{service}-latency", type=float, default=latency, help="seconds")
+        parser.add_argument(f"--{service}-errors", type=float, default=0.0, help="error rate 0..1")
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    # Keep every local side effect (outbox, speech cache, sessions) out of the working tree
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["EMAIL_OUTBOX_PATH"] = os.path.join(workdir, "outbox.sqlite3")
+    os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "tts")
+    os.environ["SESSION_STORE_PATH"] = os.path.join(workdir, "sessions.sqlite3")
+    os.environ.setdefault("LLM_HEDGE_DELAY", "1.5")
+    for limit in ("GROQ_RPM", "GROQ_TPM", "GEMINI_RPM", "GEMINI_TPM"):
+        os.environ.setdefault(limit, "0")
+    if args.trace:
+        os.environ["TRACING"], os.environ["TRACING_JSONL"] = "on", os.path.abspath(args.trace)
+    sys.path.insert(0, HERE)
+
+    import stand_ins
+    fakes = stand_ins.install(
+        db=stand_ins.Behaviour(args.db_latency, args.db_errors, "supabase"),
+        llm=stand_ins.Behaviour(args.llm_latency, args.llm_errors, "llm"),
+        smtp=stand_ins.Behaviour(args.smtp_latency, args.smtp_errors, "smtp"),
+        tts=stand_ins.Behaviour(args.tts_latency, args.tts_errors, "gtts"),
+        groq_rpm=args.groq_rpm,
+    )
+
+    share_test_runtime()
+    conversations = load_transcripts(args.transcripts) if args.transcripts else None
+    recorder = Recorder()
+    print(f"Running {args.sessions} sessions, {args.concurrency} at a time...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(args.sessions):
+            turns = conversations[i % len(conversations)] if conversations else synthetic_conversation(i)
+            pool.submit(run_session, turns, recorder, args.timeout)
+    result = report(recorder, time.perf_counter() - start, fakes.supabase, fakes.smtp)
+    import rate_limiter
+    result["rate_limits"] = rate_limiter.stats()
+
+    print_report(result)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
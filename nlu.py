@@ -0,0 +1,195 @@
+"""
+Local, rule-based understanding of common chat inputs.
+Everything here runs on precompiled patterns so menu choices and simple
+entities (email, mobile, age, gender) never need an LLM round trip.
+"""
+import re
+
+# Menu words -> option number. Word boundaries keep "one" from matching "phone".
+_CHOICE_WORDS = {
+    "one": "1", "book": "1", "two": "2", "reschedule": "2", "three": "3",
+    "cancel": "3", "four": "4", "medical": "4", "five": "5",
+}
+_CHOICE_RE = re.compile(r"\b(" + "|".join(_CHOICE_WORDS) + r")\b")
+_DIGITS_RE = re.compile(r"\d+")
+
+_DIGIT_WORDS = {
+    "zero": "0", "oh": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+_SPOKEN_DIGITS_RE = re.compile(
+    r"\b(?:(?:double|triple)\s+)?(?:" + "|".join(_DIGIT_WORDS) + r")\b"
+    r"(?:[\s,-]+(?:(?:double|triple)\s+)?(?:" + "|".join(_DIGIT_WORDS) + r")\b)+"
+)
+
+_EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+# Spoken form: "<local words> at [the rate [of]] <word> dot <word> [dot <word>...]"
+_SPOKEN_EMAIL_RE = re.compile(
+    r"(?P<local>(?:[\w.+-]+\s+){0,40}?)(?:\bat\s+the\s+rate(?:\s+of)?|\bat|@)\s+"
+    r"(?P<domain>[a-z0-9-]+(?:\s*(?:dot|point|\.)\s*[a-z0-9-]+)+)\b"
+)
+_EMAIL_LOCAL_SYMBOLS = {"dot": ".", "point": ".", "underscore": "_", "dash": "-", "hyphen": "-"}
+# Words that end the local part when walking backwards from "at".
+_EMAIL_STOP_WORDS = {
+    "is", "email", "e-mail", "mail", "id", "address", "my", "its", "it's",
+    "and", "the", "me", "contact", "reach", "on", "at",
+}
+
+_MOBILE_RE = re.compile(r"(?<!\d)(?:\+?91[\s-]*|0)?((?:\d[\s-]*){9}\d)(?![\s-]*\d)")
+
+_AGE_RES = [
+    re.compile(r"\b(\d{1,3})\s*(?:years?|yrs?|yo|y/o)(?:\s+old)?\b"),
+    re.compile(r"\bage(?:d|\s+is)?\s*:?\s*(\d{1,3})\b"),
+    re.compile(r"\b(?:i\s+am|i'm|im)\s+(\d{1,3})\b(?!\s*(?::|am\b|pm\b|o'?clock|kg|cm))"),
+    # "29, female" / "34 male"
+    re.compile(r"\b(\d{1,3})\s*[,/]?\s*(?=(?:female|male|woman|man|boy|girl|transgender|trans)\b)"),
+]
+
+_GENDER_RE = re.compile(
+    r"\b(?:(?P<female>female|woman|girl|femail|lady)|(?P<trans>transgender|trans)"
+    r"|(?P<male>male|man|boy|mail(?!\s+(?:id|address|is)\b)))\b"
+)
+
+# Words that carry no field value; anything else left over may need the LLM.
+_FILLER_WORDS = {
+    "i", "i'm", "im", "am", "my", "is", "it", "its", "it's", "and", "a", "an", "the",
+    "email", "e-mail", "mail", "id", "address", "mobile", "phone", "number", "no",
+    "contact", "age", "aged", "years", "year", "old", "yrs", "gender", "sex", "also",
+    "here", "this", "that", "me", "you", "please", "ok", "okay", "yes", "so", "of",
+    "at", "on", "with", "for", "to", "hi", "hello", "hey", "sure", "well",
+}
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# A reply that is only a pick from a numbered list: "2", "option 2", "the second one"
+_PICK_WORDS = {
+    "one": 1, "first": 1, "two": 2, "second": 2, "three": 3, "third": 3,
+    "four": 4, "fourth": 4, "five": 5, "fifth": 5,
+}
+_PICK_RE = re.compile(
+    r"(?:(?:option|slot|number|no)\s*)?(?:the\s+)?(\d{1,2}|" + "|".join(_PICK_WORDS) + r")"
+    r"(?:st|nd|rd|th)?(?:\s+(?:one|option|slot))?(?:\s+please)?"
+)
+
+
+def normalize_choice(text):
+    """Maps a menu reply to its option number; returns the cleaned text otherwise."""
+    if not text: return ""
+    text = text.lower().strip()
+    match = _CHOICE_RE.search(text)
+    if match:
+        return _CHOICE_WORDS[match.group(1)]
+    digits = _DIGITS_RE.findall(text)
+    return digits[0] if digits else text
+
+
+def parse_pick(text):
+    """
+    Returns the number picked when the whole reply is a list pick ("2", "option 2",
+    "the second one"), else None. Unlike normalize_choice, "at 5" or "cancel" are not picks.
+    """
+    text = " ".join(str(text or "").lower().replace("#", " ").split()).strip(" .!")
+    match = _PICK_RE.fullmatch(text)
+    if not match:
+        return None
+    word = match.group(1)
+    return int(word) if word.isdigit() else _PICK_WORDS[word]
+
+
+def is_complex_input(text, current_step=None):
+    """True if the message may carry more than the answer to the current step."""
+    if not text: return False
+    if current_step in ["symptoms", "appointment_time", "appointment_date"]:
+        if not re.match(r'^\d{1,2}$', text.strip()): return True
+    words = text.strip().split()
+    if len(words) > 4: return True
+    keywords = ["and", "have", "with", "my", "is", "am", "at", "on"]
+    if any(k in text.lower() for k in keywords) and len(words) > 2: return True
+    return False
+
+
+def _spoken_digits_to_numbers(text):
+    """Rewrites runs of spoken digits ("nine eight double seven") as numbers."""
+    def repl(match):
+        out = []
+        repeat = 1
+        for word in re.split(r"[\s,-]+", match.group(0)):
+            if word == "double": repeat = 2
+            elif word == "triple": repeat = 3
+            elif word in _DIGIT_WORDS:
+                out.append(_DIGIT_WORDS[word] * repeat)
+                repeat = 1
+        return "".join(out)
+    return _SPOKEN_DIGITS_RE.sub(repl, text)
+
+
+def extract_email(text):
+    """Returns (email, span) from a typed or spoken email address, or (None, None)."""
+    match = _EMAIL_RE.search(text)
+    if match:
+        return match.group(0).lower(), match.span()
+    match = _SPOKEN_EMAIL_RE.search(text)
+    if not match:
+        return None, None
+    local = []
+    words = match.group("local").split()
+    consumed = 0
+    for word in reversed(words):
+        if word in _EMAIL_STOP_WORDS:
+            break
+        local.append(_EMAIL_LOCAL_SYMBOLS.get(word, word))
+        consumed += len(word) + 1
+    if not local:
+        return None, None
+    domain = re.sub(r"\s*(?:dot|point|\.)\s*", ".", match.group("domain"))
+    email = "".join(reversed(local)) + "@" + domain
+    if not _EMAIL_RE.fullmatch(email):
+        return None, None
+    start = match.start("local") + len(match.group("local")) - consumed
+    return email, (max(start, match.start()), match.end())
+
+
+def extract_mobile(text):
+    """Returns (10-digit mobile, span) or (None, None)."""
+    match = _MOBILE_RE.search(text)
+    if not match:
+        return None, None
+    return re.sub(r"\D", "", match.group(1)), match.span()
+
+
+def extract_age(text):
+    """Returns (age as string, span) or (None, None)."""
+    for pattern in _AGE_RES:
+        match = pattern.search(text)
+        if match and 0 < int(match.group(1)) <= 120:
+            return match.group(1), match.span()
+    return None, None
+
+
+def extract_gender(text):
+    """Returns ("Male" | "Female" | "Transgender", span) or (None, None)."""
+    match = _GENDER_RE.search(text.lower())
+    if not match:
+        return None, None
+    if match.group("female"): return "Female", match.span()
+    if match.group("trans"): return "Transgender", match.span()
+    return "Male", match.span()
+
+
+def extract_local(text):
+    """
+    Extracts email, mobile, age and gender without calling an LLM.
+    Returns (fields, residual): the fields found, and the words left over
+    once those matches and filler words are removed. An empty residual
+    means there is nothing the LLM could add.
+    """
+    text = _spoken_digits_to_numbers(str(text or "").lower())
+    fields = {}
+    # Email first so its digits and "mail" aren't taken by the other fields.
+    for name, extractor in (("email", extract_email), ("mobile", extract_mobile),
+                            ("age", extract_age), ("gender", extract_gender)):
+        value, span = extractor(text)
+        if value:
+            fields[name] = value
+            text = text[:span[0]] + " " + text[span[1]:]
+    residual = [w for w in _WORD_RE.findall(text) if w not in _FILLER_WORDS]
+    return fields, " ".join(residual)
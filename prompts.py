@@ -0,0 +1,24 @@
+"""Fixed assistant prompts. Kept in one place so TTS audio for them can be pre-synthesized."""
+
+WELCOME_MSG = "Welcome! I'm your Medical Assistant. How can I help you today?"
+OPTIONS_MSG = "1. Book Appointment\n2. Reschedule\n3. Cancel\n4. Medical Info\n5. Exit"
+# What speak_text receives for the greeting turn
+GREETING_SPEECH = WELCOME_MSG + ". " + OPTIONS_MSG
+
+STEP_QUESTIONS = {
+    "name": "What's your full name?",
+    "email": "What's your email address?",
+    "mobile": "What's your mobile number?",
+    "age": "What's your age?",
+    "gender": "What's your gender? (Male, Female, or Transgender)",
+    "symptoms": "What symptoms are you having?",
+    "appointment_date": "When would you like to visit?",
+    "appointment_time": "What time?",
+    "confirm_appointment": "Ready to book?"
+}
+
+MEDICAL_INFO_MSG = "What disease?"
+GOODBYE_MSG = "Goodbye!"
+
+# Everything speak_text is asked to say that never changes
+STATIC_PROMPTS = [GREETING_SPEECH] + list(STEP_QUESTIONS.values())
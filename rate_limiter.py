@@ -0,0 +1,281 @@
+"""
+Client-side rate limiting for the LLM providers.
+
+Each provider gets a ProviderLimiter with two token buckets, requests per minute
+(RPM) and tokens per minute (TPM), and an adaptive cap on calls in flight:
+    - a call reserves one request plus its estimated tokens, waiting in line (FIFO)
+      for at most `max_wait` seconds; if the capacity can't come in time it gets
+      RateLimited straight away, so the caller moves on instead of queueing
+    - the token estimate is corrected with the usage the provider reports
+    - a 429 halves the in-flight cap and pauses the provider for its Retry-After;
+      every success adds 1/cap back (AIMD)
+
+Usage:
+    with limiter.acquire(estimate_request(prompt), timeout) as permit:
+        response = client.call(..., timeout=timeout - permit.waited)
+        permit.used(response.usage.total_tokens)
+
+Queue depth, in-flight calls, the cap and throttling counters are in stats() and
+on /metrics (tracing.render_prometheus); queue waits are recorded as
+"llm.<provider>.queue" spans.
+"""
+import math
+import threading
+import time
+from collections import deque
+import tracing
+
+# Completion tokens reserved per call when the caller doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 250
+# Pause after a 429 that doesn't say how long to wait (seconds)
+DEFAULT_BACKOFF = 2.0
+# The cap is halved at most once per this many seconds, however many 429s arrive together
+DECREASE_INTERVAL = 1.0
+
+
+class RateLimited(Exception):
+    """Raised when a call can't get capacity from its provider within the wait bound."""
+
+    def __init__(self, provider, reason):
+        super().__init__(f"{provider} rate limited: {reason}")
+        self.provider = provider
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for the Llama and Gemini tokenizers: about 4 characters per
+    token in English, but at least ~1.3 per word for short or punctuation-heavy text.
+    """
+    if not text:
+        return 0
+    return math.ceil(max(len(text) / 4, len(text.split()) * 1.3)) + 4
+
+
+def estimate_request(prompt, max_tokens=None):
+    """Tokens to reserve for one call: the prompt plus its expected completion."""
+    return estimate_tokens(prompt) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def is_rate_limit(exc):
+    """True for a provider's 429 (groq.RateLimitError, google.genai ClientError 429, ...)."""
+    if isinstance(exc, RateLimited):
+        return False
+    code = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return code == 429 or type(exc).__name__ == "RateLimitError" or "RESOURCE_EXHAUSTED" in str(exc)[:200]
+
+
+def retry_after(exc):
+    """Seconds from the Retry-After header of a 429, if the exception carries its response."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, continuously, up to one minute's worth."""
+
+    def __init__(self, per_minute, now=None):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n, now):
+        """Seconds until `n` units are available (a request bigger than the bucket waits for a full one)."""
+        self._refill(now)
+        return max(0.0, min(n, self.capacity) - self.level) / self.rate
+
+    def take(self, n, now):
+        self._refill(now)
+        self.level -= n
+
+    def give(self, n):
+        """Returns (or, if negative, charges) units after the fact."""
+        self.level = min(self.capacity, self.level + n)
+
+
+class Permit:
+    """One admitted call. Releases its slot on exit and reports the outcome to the limiter."""
+
+    def __init__(self, limiter, tokens, waited):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.waited = waited
+        self.actual = None
+
+    def used(self, tokens):
+        """Actual tokens the call consumed, when the provider reports them."""
+        if tokens is not None:
+            self.actual = tokens
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.limiter.release(self, exc)
+        return False
+
+
+class ProviderLimiter:
+    """RPM and TPM buckets plus an AIMD concurrency cap for one provider. 0 means unlimited."""
+
+    def __init__(self, name, rpm=0, tpm=0, max_concurrency=8, max_wait=2.0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.counters = {"admitted": 0, "rejected": 0, "throttled": 0, "completed": 0, "errors": 0}
+        self.wait_seconds = 0.0
+
+    def _delay(self, tokens, now):
+        """Seconds until a call of `tokens` could start, or None if it must wait for a running call."""
+        if self.in_flight >= max(1, int(self.limit)):
+            return None
+        delay = max(0.0, self.paused_until - now)
+        if self.requests:
+            delay = max(delay, self.requests.wait_time(1, now))
+        if self.tokens:
+            delay = max(delay, self.tokens.wait_time(tokens, now))
+        return delay
+
+    def acquire(self, tokens, timeout=None):
+        """
+        Waits (FIFO) for capacity for a call of `tokens`, at most min(max_wait, timeout)
+        seconds. Returns a Permit to use as a context manager; raises RateLimited.
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait if timeout is None else min(self.max_wait, timeout))
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(tokens, now) if self._queue[0] is ticket else None
+                    if delay == 0:
+                        break
+                    if now >= deadline or (delay is not None and now + delay > deadline):
+                        self.counters["rejected"] += 1
+                        reason = "paused after 429" if now < self.paused_until else \
+                                 f"no capacity within {deadline - start:.1f}s"
+                        raise RateLimited(self.name, reason)
+                    self._cond.wait(deadline - now if delay is None else delay)
+                if self.requests:
+                    self.requests.take(1, now)
+                if self.tokens:
+                    self.tokens.take(tokens, now)
+                self.in_flight += 1
+                self.counters["admitted"] += 1
+                waited = now - start
+                self.wait_seconds += waited
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        if waited > 0.001:
+            tracing.record(f"llm.{self.name}.queue", waited, provider=self.name, tokens=tokens)
+        return Permit(self, tokens, waited)
+
+    def release(self, permit, exc=None):
+        """Frees the permit's slot and adapts to how the call went."""
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if permit.actual is not None and self.tokens:
+                self.tokens.give(permit.tokens - permit.actual)
+            # A consumer abandoning a stream (GeneratorExit) isn't the provider's fault
+            if exc is None or not isinstance(exc, Exception):
+                self.counters["completed"] += 1
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif is_rate_limit(exc):
+                self.counters["throttled"] += 1
+                if now - self._last_decrease >= DECREASE_INTERVAL:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                self.paused_until = max(self.paused_until, now + (retry_after(exc) or DEFAULT_BACKOFF))
+            else:
+                self.counters["errors"] += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            stats = dict(self.counters, queued=len(self._queue), in_flight=self.in_flight,
+                         concurrency_limit=round(self.limit, 2), wait_seconds=round(self.wait_seconds, 3),
+                         paused_for=round(max(0.0, self.paused_until - now), 2))
+            if self.requests:
+                self.requests._refill(now)
+                stats["requests_available"] = round(self.requests.level, 1)
+            if self.tokens:
+                self.tokens._refill(now)
+                stats["tokens_available"] = round(self.tokens.level)
+            return stats
+
+
+# Limiters by provider name, for stats() and /metrics
+_limiters = {}
+
+
+def register(limiter):
+    _limiters[limiter.name] = limiter
+    return limiter
+
+
+def stats():
+    """Returns each provider's limiter counters and gauges."""
+    return {name: limiter.stats() for name, limiter in sorted(_limiters.items())}
+
+
+_GAUGES = (("queued", "llm_queue_depth", "Calls waiting for rate-limit capacity."),
+           ("in_flight", "llm_in_flight", "Calls currently running."),
+           ("concurrency_limit", "llm_concurrency_limit", "Current AIMD cap on calls in flight."))
+_COUNTERS = (("rejected", "llm_rate_limited_total", "Calls refused by the client-side limiter."),
+             ("throttled", "llm_throttled_total", "429 responses from the provider."),
+             ("wait_seconds", "llm_queue_wait_seconds_total", "Time calls spent queued."))
+
+
+def render_prometheus():
+    """Limiter gauges and counters in Prometheus text format."""
+    snapshot = stats()
+    lines = []
+    for kinds, kind in ((_GAUGES, "gauge"), (_COUNTERS, "counter")):
+        for key, metric, help_text in kinds:
+            lines += [f"# HELP medassist_{metric} {help_text}", f"# TYPE medassist_{metric} {kind}"]
+            lines += [f'medassist_{metric}{{provider="{name}"}} {s[key]}' for name, s in snapshot.items()]
+    return "\n".join(lines) + "\n" if snapshot else ""
+
+
+tracing.add_collector(render_prometheus)
+
+
+def from_settings(get_secret):
+    """
+    Groq and Gemini limiters from GROQ_RPM/GROQ_TPM and GEMINI_RPM/GEMINI_TPM (0 = unlimited),
+    LLM_MAX_CONCURRENCY (per provider) and LLM_QUEUE_WAIT (seconds). The defaults are
+    the providers' free-tier limits; set them to your account's.
+    """
+    concurrency = int(get_secret("LLM_MAX_CONCURRENCY", 8))
+    max_wait = float(get_secret("LLM_QUEUE_WAIT", 2.0))
+    limits = {"groq": (30, 12000), "gemini": (15, 1000000)}
+    return {
+        name: register(ProviderLimiter(
+            name,
+            rpm=float(get_secret(f"{name.upper()}_RPM", rpm)),
+            tpm=float(get_secret(f"{name.upper()}_TPM", tpm)),
+            max_concurrency=concurrency,
+            max_wait=max_wait,
+        ))
+        for name, (rpm, tpm) in limits.items()
+    }
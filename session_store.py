@@ -0,0 +1,333 @@
+"""
+Shared conversation state, so any worker can pick up any session.
+
+A session is saved as two parts: its fields (step, appointment details, ...) as one
+compact JSON blob, and its messages as an append-only log. Each save writes only
+what changed since the last one: the fields if they differ, plus the new messages.
+Fixed prompts are stored as short ids rather than their text.
+
+Backends:
+    SQLiteSessionStore(path)      default; one file shared by the workers on a host
+    RedisSessionStore(client)     any client with redis-py's hash/list/expire commands
+                                  (redis.Redis, or stand_ins.FakeRedis locally)
+
+Idle sessions expire after `ttl` seconds. Only the last `keep_messages` messages are
+loaded back into memory; older ones stay in the store.
+"""
+import json
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+import prompts
+
+# Conversation fields persisted besides the message log
+FIELDS = ("step", "appointment_details", "audio_key_index", "slot_offers", "last_audio_id")
+SESSION_TTL = 2 * 3600
+# Messages kept in memory per session; older ones are only in the store
+KEEP_MESSAGES = 100
+
+# Fixed assistant prompts, stored by id. The ids are persisted: never reuse or
+# renumber one; give a new prompt the next free id.
+_PROMPTS = MappingProxyType({
+    0: prompts.WELCOME_MSG,
+    1: prompts.OPTIONS_MSG,
+    2: prompts.MEDICAL_INFO_MSG,
+    3: prompts.GOODBYE_MSG,
+    4: prompts.STEP_QUESTIONS["name"],
+    5: prompts.STEP_QUESTIONS["email"],
+    6: prompts.STEP_QUESTIONS["mobile"],
+    7: prompts.STEP_QUESTIONS["age"],
+    8: prompts.STEP_QUESTIONS["gender"],
+    9: prompts.STEP_QUESTIONS["symptoms"],
+    10: prompts.STEP_QUESTIONS["appointment_date"],
+    11: prompts.STEP_QUESTIONS["appointment_time"],
+    12: prompts.STEP_QUESTIONS["confirm_appointment"],
+})
+_PROMPT_IDS = {text: i for i, text in _PROMPTS.items()}
+# Shown for an id saved by a newer version (or since retired) that this one doesn't know
+UNKNOWN_PROMPT = "(earlier message unavailable)"
+_ROLES = {"assistant": "a", "user": "u"}
+_ROLE_NAMES = {v: k for k, v in _ROLES.items()}
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_message(message):
+    content = message["content"]
+    prompt_id = _PROMPT_IDS.get(content)
+    return _dumps([_ROLES.get(message["role"], message["role"]), content if prompt_id is None else prompt_id])
+
+
+def decode_message(blob):
+    role, content = json.loads(blob)
+    if isinstance(content, int):
+        content = _PROMPTS.get(content, UNKNOWN_PROMPT)
+    return {"role": _ROLE_NAMES.get(role, role), "content": content}
+
+
+def encode_fields(state):
+    return _dumps({k: state[k] for k in FIELDS if state.get(k) is not None})
+
+
+def decode_fields(blob):
+    fields = json.loads(blob)
+    if "slot_offers" in fields:
+        fields["slot_offers"] = [tuple(slot) for slot in fields["slot_offers"]]
+    return fields
+
+
+class SessionStore:
+    """
+    Delta tracking shared by the backends. Subclasses implement _write, _read,
+    delete and purge_expired.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, keep_messages=KEEP_MESSAGES):
+        self.ttl = ttl
+        self.keep_messages = keep_messages
+        self._lock = threading.Lock()
+        # session_id -> (fields blob, messages stored, blob of the last stored message)
+        self._saved = {}
+
+    def save(self, session_id, state):
+        """
+        Writes what changed in `state` (a dict or st.session_state) since the last
+        save or load of this session. Returns {"fields": bool, "appended": n, "rewritten": bool}.
+        Trims the in-memory messages to keep_messages afterwards.
+        """
+        fields = encode_fields(state)
+        messages = state.get("messages") or []
+        dropped = state.get("messages_dropped", 0)
+        with self._lock:
+            prev_fields, stored, last = self._saved.get(session_id, (None, 0, None))
+
+        # Messages are normally only appended; anything else (e.g. a reset) rewrites the log.
+        # Trimming keeps the last stored message in memory, so it marks where the new ones start.
+        i = stored - 1 - dropped
+        if stored and 0 <= i < len(messages) and encode_message(messages[i]) == last:
+            new, rewrite = [encode_message(m) for m in messages[stored - dropped:]], False
+        else:
+            new, rewrite = [encode_message(m) for m in messages], True
+            dropped = 0
+        total = dropped + len(messages)
+
+        changed = fields != prev_fields
+        self._write(session_id, fields, changed, new, rewrite)
+        last = encode_message(messages[-1]) if messages else None
+        with self._lock:
+            self._saved[session_id] = (fields, total, last)
+
+        if len(messages) > self.keep_messages:
+            extra = len(messages) - self.keep_messages
+            del messages[:extra]
+            state["messages_dropped"] = dropped + extra
+        elif rewrite:
+            state["messages_dropped"] = 0
+        return {"fields": changed, "appended": 0 if rewrite else len(new), "rewritten": rewrite}
+
+    def load(self, session_id):
+        """Returns the session's state dict (with its latest messages), or None if unknown or expired."""
+        found = self._read(session_id, self.keep_messages)
+        if found is None:
+            return None
+        fields, blobs, total = found
+        state = decode_fields(fields)
+        state["messages"] = [decode_message(b) for b in blobs]
+        state["messages_dropped"] = total - len(blobs)
+        with self._lock:
+            self._saved[session_id] = (fields, total, blobs[-1] if blobs else None)
+        return state
+
+    def forget(self, session_id):
+        """Drops this process's delta bookkeeping for a session (the stored copy stays)."""
+        with self._lock:
+            self._saved.pop(session_id, None)
+
+    def _write(self, session_id, fields, changed, new_messages, rewrite):
+        """Stores `new_messages` and refreshes the expiry; `fields` need only be written if `changed`."""
+        raise NotImplementedError
+
+    def _read(self, session_id, tail):
+        """Returns (fields blob, last `tail` message blobs, total message count) or None."""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    fields TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+CREATE TABLE IF NOT EXISTS session_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a local SQLite file (WAL), shared by every worker process on the host."""
+
+    # Expired sessions are swept at most this often (seconds), from save()
+    purge_interval = 300
+
+    def __init__(self, path="sessions.sqlite3", ttl=SESSION_TTL, keep_messages=KEEP_MESSAGES):
+        super().__init__(ttl, keep_messages)
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0.0
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, session_id, fields, changed, new_messages, rewrite):
+        now = time.time()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if rewrite:
+                conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+                start = 0
+            else:
+                row = conn.execute("SELECT message_count FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                start = row[0] if row else 0
+            conn.executemany("INSERT INTO session_messages (session_id, seq, message) VALUES (?, ?, ?)",
+                             [(session_id, start + k, m) for k, m in enumerate(new_messages)])
+            count = start + len(new_messages)
+            if not changed:
+                # Swept while idle: the row is gone and the fields go back in with the log
+                changed = not conn.execute("UPDATE sessions SET message_count = ?, updated_at = ? WHERE id = ?",
+                                           (count, now, session_id)).rowcount
+            if changed:
+                conn.execute(
+                    "INSERT INTO sessions (id, fields, message_count, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (id) DO UPDATE SET fields = excluded.fields,"
+                    " message_count = excluded.message_count, updated_at = excluded.updated_at",
+                    (session_id, fields, count, now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge_expired()
+
+    def _read(self, session_id, tail):
+        conn = self._db()
+        row = conn.execute("SELECT fields, message_count FROM sessions WHERE id = ? AND updated_at >= ?",
+                           (session_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        fields, total = row
+        blobs = [r[0] for r in conn.execute(
+            "SELECT message FROM session_messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, total - tail))]
+        return fields, blobs, total
+
+    def delete(self, session_id):
+        conn = self._db()
+        conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        self.forget(session_id)
+
+    def purge_expired(self):
+        """Deletes sessions idle for longer than ttl. Returns how many were removed."""
+        conn = self._db()
+        cutoff = time.time() - self.ttl
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_messages WHERE session_id IN (SELECT id FROM sessions WHERE updated_at < ?)", (cutoff,))
+            removed = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in Redis: a hash session:{id} holding the fields and a list session:{id}:messages,
+    both with a TTL refreshed on every save. Each save is one pipelined round trip.
+    """
+
+    def __init__(self, client, ttl=SESSION_TTL, keep_messages=KEEP_MESSAGES, prefix="session:"):
+        super().__init__(ttl, keep_messages)
+        self.client = client
+        self.prefix = prefix
+
+    def _keys(self, session_id):
+        key = f"{self.prefix}{session_id}"
+        return key, key + ":messages"
+
+    def _write(self, session_id, fields, changed, new_messages, rewrite):
+        key, log = self._keys(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        if rewrite:
+            pipe.delete(log)
+        if new_messages:
+            pipe.rpush(log, *new_messages)
+        if changed:
+            pipe.hset(key, "fields", fields)
+        else:
+            # Only if the hash expired while idle
+            pipe.hsetnx(key, "fields", fields)
+        pipe.expire(key, int(self.ttl))
+        pipe.expire(log, int(self.ttl))
+        pipe.execute()
+
+    def _read(self, session_id, tail):
+        key, log = self._keys(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(key, "fields")
+        pipe.llen(log)
+        pipe.lrange(log, -tail, -1)
+        fields, total, blobs = pipe.execute()
+        if fields is None:
+            return None
+        decode = lambda v: v.decode("utf-8") if isinstance(v, bytes) else v
+        return decode(fields), [decode(b) for b in blobs], total
+
+    def delete(self, session_id):
+        self.client.delete(*self._keys(session_id))
+        self.forget(session_id)
+
+    def purge_expired(self):
+        """Redis expires keys itself."""
+        return 0
+
+
+def from_settings(get_secret):
+    """
+    The store named by SESSION_STORE: "sqlite" (default, file SESSION_STORE_PATH),
+    a redis:// URL (needs the redis package), or "off" for none.
+    """
+    kind = str(get_secret("SESSION_STORE", "sqlite"))
+    ttl = float(get_secret("SESSION_TTL", SESSION_TTL))
+    if kind.lower() in ("off", "none", "0", "false"):
+        return None
+    if kind.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return RedisSessionStore(redis.Redis.from_url(kind), ttl=ttl)
+    return SQLiteSessionStore(get_secret("SESSION_STORE_PATH", "sessions.sqlite3"), ttl=ttl)
@@ -0,0 +1,188 @@
+import bisect
+import threading
+import time as _time
+from datetime import datetime
+
+# Two bookings for the same doctor must be at least this many minutes apart.
+CONFLICT_MINUTES = 20
+# Longest date range a free-slot search may cover, in days
+MAX_SEARCH_DAYS = 31
+
+
+def time_to_minute(time_str):
+    """Converts 'HH:MM AM/PM' to minutes since midnight. Raises ValueError if invalid."""
+    t = datetime.strptime(str(time_str).strip(), "%I:%M %p")
+    return t.hour * 60 + t.minute
+
+
+def minute_to_time(minute):
+    """Converts minutes since midnight back to 'HH:MM AM/PM'."""
+    hour, mins = divmod(minute, 60)
+    suffix = "AM" if hour < 12 else "PM"
+    return f"{hour % 12 or 12:02d}:{mins:02d} {suffix}"
+
+
+def sweep_free(booked, first, last, step=CONFLICT_MINUTES, gap=CONFLICT_MINUTES, limit=None):
+    """
+    Yields start minutes in [first, last - step] that are at least `gap` minutes
+    from every minute in `booked` (sorted), in one pass over both sequences.
+    """
+    j = 0
+    found = 0
+    for minute in range(first, last - step + 1, step):
+        # Advance past bookings that can no longer conflict with this or later slots.
+        while j < len(booked) and booked[j] <= minute - gap:
+            j += 1
+        if j < len(booked) and booked[j] < minute + gap:
+            continue
+        yield minute
+        found += 1
+        if limit is not None and found >= limit:
+            return
+
+
+class SlotIndex:
+    """
+    In-memory index of booked slots, grouped per (doctor, date).
+    Each day holds a list of (minute, id) sorted by start minute, so a
+    conflict check is a single bisect instead of a scan over every booking.
+    Days are filled lazily through `loader(doctor, date)`, which returns
+    (id, appointment_time) pairs, and are refetched once older than `max_age`
+    seconds so bookings made by other processes are eventually picked up.
+    """
+
+    def __init__(self, loader, max_age=30):
+        self._loader = loader
+        self._max_age = max_age
+        self._days = {}   # (doctor, date) -> (loaded_at, [(minute, id), ...])
+        self._by_id = {}  # str(id) -> (doctor, date, minute)
+        self._lock = threading.Lock()
+
+    def _fresh(self, key):
+        entry = self._days.get(key)
+        if entry and (self._max_age is None or _time.monotonic() - entry[0] < self._max_age):
+            return entry[1]
+        return None
+
+    def _bookings(self, doctor, date):
+        with self._lock:
+            slots = self._fresh((doctor, date))
+        if slots is not None:
+            return slots
+        # Fetch outside the lock so one slow query doesn't stall other doctors.
+        rows = self._loader(doctor, date)
+        return self.load_day(doctor, date, rows)
+
+    def load_day(self, doctor, date, rows):
+        """Replaces the cached bookings for one doctor/day with (id, time) rows."""
+        slots = []
+        for appt_id, time_str in rows:
+            try:
+                slots.append((time_to_minute(time_str), str(appt_id)))
+            except ValueError:
+                continue  # Skip invalid time formats in DB
+        slots.sort()
+        with self._lock:
+            old = self._days.get((doctor, date))
+            if old:
+                for _, appt_id in old[1]:
+                    self._by_id.pop(appt_id, None)
+            for minute, appt_id in slots:
+                self._by_id[appt_id] = (doctor, date, minute)
+            self._days[(doctor, date)] = (_time.monotonic(), slots)
+        return slots
+
+    def add(self, appt_id, doctor, date, time_str):
+        """
+        Records a new booking. Days that are not cached yet are left to the loader.
+        Adding an id that is already indexed (e.g. a replayed booking) moves it instead of duplicating it.
+        """
+        try:
+            minute = time_to_minute(time_str)
+        except ValueError:
+            return
+        if appt_id is not None:
+            self.remove(appt_id)
+        with self._lock:
+            entry = self._days.get((doctor, date))
+            if entry is None:
+                return
+            if appt_id is None:
+                # Without an id we can't track it later; force a reload instead.
+                self._days.pop((doctor, date), None)
+                return
+            bisect.insort(entry[1], (minute, str(appt_id)))
+            self._by_id[str(appt_id)] = (doctor, date, minute)
+
+    def remove(self, appt_id):
+        """Drops a booking by id. Returns the (doctor, date) it belonged to, if known."""
+        with self._lock:
+            found = self._by_id.pop(str(appt_id), None)
+            if not found:
+                return None
+            doctor, date, minute = found
+            entry = self._days.get((doctor, date))
+            if entry:
+                slots = entry[1]
+                i = bisect.bisect_left(slots, (minute, str(appt_id)))
+                if i < len(slots) and slots[i] == (minute, str(appt_id)):
+                    del slots[i]
+            return doctor, date
+
+    def move(self, appt_id, new_date, new_time):
+        """Moves a booking to a new date/time for the same doctor."""
+        found = self.remove(appt_id)
+        if found:
+            self.add(appt_id, found[0], new_date, new_time)
+        else:
+            # Unknown booking: we can't tell which doctor's day it lands on.
+            self.invalidate(date=new_date)
+
+    def invalidate(self, doctor=None, date=None):
+        """Forgets cached days matching the given doctor and/or date (all if neither)."""
+        with self._lock:
+            for key in list(self._days):
+                if (doctor is None or key[0] == doctor) and (date is None or key[1] == date):
+                    for _, appt_id in self._days.pop(key)[1]:
+                        self._by_id.pop(appt_id, None)
+
+    def has_conflict(self, doctor, date, time_str, gap=CONFLICT_MINUTES):
+        """True if a booking starts less than `gap` minutes before or after `time_str`."""
+        minute = time_to_minute(time_str)
+        slots = self._bookings(doctor, date)
+        with self._lock:
+            i = bisect.bisect_left(slots, (minute - gap + 1,))
+            return i < len(slots) and slots[i][0] < minute + gap
+
+    def free_slots(self, doctor, date, start="09:00 AM", end="05:00 PM", step=CONFLICT_MINUTES, gap=CONFLICT_MINUTES):
+        """Lists 'HH:MM AM/PM' start times between `start` and `end` that don't conflict."""
+        first, last = time_to_minute(start), time_to_minute(end)
+        slots = self._bookings(doctor, date)
+        with self._lock:
+            booked = [m for m, _ in slots]
+        return [minute_to_time(m) for m in sweep_free(booked, first, last, step, gap)]
+
+    def next_free_slots(self, doctor, dates, n, start="09:00 AM", end="05:00 PM", step=CONFLICT_MINUTES,
+                        gap=CONFLICT_MINUTES, not_before=None):
+        """
+        Returns the earliest `n` free (date, 'HH:MM AM/PM') slots over `dates` (in order).
+        not_before: optional (date, minute); earlier slots are skipped, e.g. times already past today.
+        Days not cached are fetched through the loader; prefill them with load_day to avoid that.
+        """
+        first, last = time_to_minute(start), time_to_minute(end)
+        found = []
+        for date in dates:
+            day_first = first
+            if not_before and date <= not_before[0]:
+                if date < not_before[0]:
+                    continue
+                # Keep slots on the step grid
+                day_first = max(first, first + -(-(not_before[1] - first) // step) * step)
+            slots = self._bookings(doctor, date)
+            with self._lock:
+                booked = [m for m, _ in slots]
+            for minute in sweep_free(booked, day_first, last, step, gap, n - len(found)):
+                found.append((date, minute_to_time(minute)))
+            if len(found) >= n:
+                break
+        return found
@@ -0,0 +1,41 @@
+-- Bulk appointment operations (database.add_appointments / reschedule_appointments).
+-- Run once in the Supabase SQL editor. Safe to re-run.
+
+-- Retried imports carry the same key, so the upsert skips rows that already landed.
+alter table appointments add column if not exists idempotency_key text;
+create unique index if not exists appointments_idempotency_key_idx
+    on appointments (idempotency_key);
+
+-- Applies many reschedules/reassignments in one statement.
+-- changes: [{"id": 1, "appointment_date": "2026-02-10", "appointment_time": "10:00 AM", "doctor": "Dr. X"}, ...]
+-- "doctor" is optional. Returns one object per change, in input order:
+-- {"id", "status": "rescheduled" | "not_found", "doctor", "appointment_date", "appointment_time"}
+create or replace function bulk_reschedule(changes jsonb)
+returns jsonb
+language sql
+as $$
+    with c as (
+        select e.ord, r.id, r.appointment_date, r.appointment_time, r.doctor, e.x ? 'doctor' as has_doctor
+        from jsonb_array_elements(changes) with ordinality as e(x, ord),
+             jsonb_populate_record(null::appointments, e.x) as r
+    ), u as (
+        update appointments a
+           set appointment_date = c.appointment_date,
+               appointment_time = c.appointment_time,
+               doctor = case when c.has_doctor then c.doctor else a.doctor end,
+               -- The key named the old slot; book_if_free would return this row for it
+               idempotency_key = null
+          from c
+         where a.id = c.id
+        returning a.id, a.doctor, a.appointment_date, a.appointment_time
+    )
+    select coalesce(jsonb_agg(
+        jsonb_build_object(
+            'id', c.id,
+            'status', case when u.id is null then 'not_found' else 'rescheduled' end,
+            'doctor', u.doctor,
+            'appointment_date', u.appointment_date,
+            'appointment_time', u.appointment_time
+        ) order by c.ord), '[]'::jsonb)
+    from c left join u on u.id = c.id;
+$$;
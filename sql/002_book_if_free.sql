@@ -0,0 +1,107 @@
+-- Atomic booking (database.book_if_free): conflict check and insert in one round trip.
+-- Run after 001_bulk_operations.sql in the Supabase SQL editor. Safe to re-run.
+-- Existing overlapping bookings must be resolved first or the constraint below won't apply.
+
+-- Supabase ships btree_gist; minimal Postgres builds without contrib fall back to
+-- the advisory lock in book_if_free alone.
+do $$
+begin
+    create extension if not exists btree_gist;
+exception when others then
+    raise notice 'btree_gist unavailable, skipping appointments_no_overlap: %', sqlerrm;
+end;
+$$;
+
+-- Start of the slot as a real timestamp, filled from appointment_date + appointment_time ('HH:MM AM').
+alter table appointments add column if not exists slot_start timestamp;
+
+create or replace function appointments_set_slot_start()
+returns trigger
+language plpgsql
+as $$
+begin
+    begin
+        new.slot_start := (new.appointment_date::text || ' ' || new.appointment_time)::timestamp;
+    exception when others then
+        new.slot_start := null;  -- unparseable legacy time; not covered by the constraint
+    end;
+    return new;
+end;
+$$;
+
+drop trigger if exists appointments_slot_start on appointments;
+create trigger appointments_slot_start
+    before insert or update of appointment_date, appointment_time on appointments
+    for each row execute function appointments_set_slot_start();
+
+update appointments set appointment_time = appointment_time where slot_start is null;
+
+-- Backstop against double booking from any code path: a doctor's bookings may not
+-- start within 20 minutes of each other (slot_index.CONFLICT_MINUTES).
+do $$
+begin
+    if exists (select 1 from pg_extension where extname = 'btree_gist')
+       and not exists (select 1 from pg_constraint where conname = 'appointments_no_overlap') then
+        alter table appointments add constraint appointments_no_overlap exclude using gist (
+            doctor with =,
+            tsrange(slot_start, slot_start + interval '20 minutes') with &&
+        );
+    end if;
+end;
+$$;
+
+-- Books the appointment unless the doctor already has one within gap_minutes.
+-- appointment: {"email", "name", "mobile", "age", "gender", "symptoms", "doctor",
+--               "appointment_date", "appointment_time", "idempotency_key" (optional)}
+-- Returns {"status": "booked", "appointment": row} or {"status": "conflict", "conflict": row}.
+create or replace function book_if_free(appointment jsonb, gap_minutes integer default 20)
+returns jsonb
+language plpgsql
+as $$
+declare
+    r appointments;
+    start_at timestamp;
+    booked appointments;
+    clash appointments;
+begin
+    r := jsonb_populate_record(null::appointments, appointment);
+    start_at := (r.appointment_date::text || ' ' || r.appointment_time)::timestamp;
+
+    -- Serializes bookings for one doctor and day, so concurrent callers queue here
+    -- instead of both passing the check.
+    perform pg_advisory_xact_lock(hashtext(r.doctor || '|' || r.appointment_date::text));
+
+    -- A retried call whose first attempt committed gets its own row back
+    if r.idempotency_key is not null then
+        select * into booked from appointments a where a.idempotency_key = r.idempotency_key;
+        if found then
+            return jsonb_build_object('status', 'booked', 'appointment', to_jsonb(booked));
+        end if;
+    end if;
+
+    select * into clash from appointments a
+     where a.doctor = r.doctor
+       and a.slot_start > start_at - make_interval(mins => gap_minutes)
+       and a.slot_start < start_at + make_interval(mins => gap_minutes)
+     order by a.slot_start
+     limit 1;
+    if found then
+        return jsonb_build_object('status', 'conflict', 'conflict', to_jsonb(clash));
+    end if;
+
+    insert into appointments (email, name, mobile, age, gender, symptoms, doctor,
+                              appointment_date, appointment_time, idempotency_key)
+    values (r.email, r.name, r.mobile, r.age, r.gender, r.symptoms, r.doctor,
+            r.appointment_date, r.appointment_time, r.idempotency_key)
+    returning * into booked;
+    return jsonb_build_object('status', 'booked', 'appointment', to_jsonb(booked));
+
+exception when exclusion_violation then
+    -- A writer that skipped the lock (e.g. a plain insert) got there first
+    select * into clash from appointments a
+     where a.doctor = r.doctor
+       and tsrange(a.slot_start, a.slot_start + interval '20 minutes') && tsrange(start_at, start_at + interval '20 minutes')
+     limit 1;
+    return jsonb_build_object('status', 'conflict', 'conflict', to_jsonb(clash));
+end;
+$$;
@@ -0,0 +1,509 @@
+"""
+Local stand-ins for Supabase, Groq, Gemini, SMTP, gTTS and Redis.
+
+Each one answers like the real service (enough for the booking flow) after a
+configurable delay, and fails with a configurable probability. install()
+patches them into the app modules; used by loadtest.py and the engine benchmark.
+"""
+import json
+import os
+import random
+import re
+import smtplib
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import nlu
+
+
+class Behaviour:
+    """Latency (seconds, jittered +/-50%) and error rate for one stand-in."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, name="service"):
+        self.latency, self.error_rate, self.name = latency, error_rate, name
+
+    def wait(self, fraction=1.0):
+        if self.latency:
+            time.sleep(self.latency * fraction * random.uniform(0.5, 1.5))
+
+    def call(self):
+        self.wait()
+        if self.error_rate and random.random() < self.error_rate:
+            raise ConnectionError(f"{self.name}: injected failure")
+
+
+# --- Supabase -------------------------------------------------------------
+
+_OR_TERM = re.compile(r'and\(|\)|,|([a-z_]+)\.(eq|gt|gte|lt|lte)\."?((?:[^"\\,()]|\\.)*)"?')
+
+
+def _compare(have, op, want):
+    if have is None:
+        return False
+    if isinstance(have, (int, float)) and not isinstance(want, (int, float)):
+        want = type(have)(want)
+    return {"eq": have == want, "gt": have > want, "gte": have >= want,
+            "lt": have < want, "lte": have <= want}[op]
+
+
+def _parse_or(expr):
+    """Parses a PostgREST or=() expression with nested and() into [[(col, op, value)]]."""
+    groups, current, nested = [], [], False
+    for m in _OR_TERM.finditer(expr):
+        token = m.group(0)
+        if token == "and(":
+            nested, current = True, []
+        elif token == ")":
+            nested = False
+            groups.append(current)
+        elif token != ",":
+            cond = (m.group(1), m.group(2), m.group(3).replace('\\"', '"'))
+            if nested:
+                current.append(cond)
+            else:
+                groups.append([cond])
+    return groups
+
+
+class _Query:
+    def __init__(self, db, table, action, payload=None, columns="*", **options):
+        self.db, self.table, self.action, self.payload = db, table, action, payload
+        self.columns = [c.strip() for c in columns.split(",")]
+        self.options = options
+        self.filters, self.orders, self.size = [], [], None
+
+    def _filter(self, op, col, val):
+        self.filters.append(lambda r: _compare(r.get(col), op, val))
+        return self
+
+    def eq(self, col, val): return self._filter("eq", col, val)
+    def gt(self, col, val): return self._filter("gt", col, val)
+    def gte(self, col, val): return self._filter("gte", col, val)
+    def lt(self, col, val): return self._filter("lt", col, val)
+    def lte(self, col, val): return self._filter("lte", col, val)
+
+    def in_(self, col, vals):
+        vals = {str(v) for v in vals}
+        self.filters.append(lambda r: str(r.get(col)) in vals)
+        return self
+
+    def or_(self, expr):
+        groups = _parse_or(expr)
+        self.filters.append(lambda r: any(all(_compare(r.get(c), op, v) for c, op, v in g) for g in groups))
+        return self
+
+    def order(self, col, desc=False):
+        self.orders.append(col)
+        return self
+
+    def limit(self, n):
+        self.size = n
+        return self
+
+    def _project(self, row):
+        return dict(row) if "*" in self.columns else {c: row.get(c) for c in self.columns}
+
+    def execute(self):
+        self.db.behaviour.call()
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            matched = [r for r in rows if all(f(r) for f in self.filters)]
+            if self.action == "select":
+                matched.sort(key=lambda r: tuple(str(r.get(c)) if c != "id" else r.get(c) for c in self.orders))
+                return SimpleNamespace(data=[self._project(r) for r in matched[:self.size]])
+            if self.action in ("insert", "upsert"):
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                keys = {r.get("idempotency_key") for r in rows if r.get("idempotency_key")}
+                created = []
+                for item in payload:
+                    if self.action == "upsert" and item.get("idempotency_key") in keys:
+                        continue
+                    created.append(self.db.insert_row(self.table, item))
+                return SimpleNamespace(data=created)
+            if self.action == "update":
+                for r in matched:
+                    r.update(self.payload)
+                return SimpleNamespace(data=[dict(r) for r in matched])
+            if self.action == "delete":
+                self.db.tables[self.table] = [r for r in rows if r not in matched]
+                return SimpleNamespace(data=[dict(r) for r in matched])
+        raise ValueError(f"Unsupported action {self.action}")
+
+
+class _Table:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def select(self, columns="*", **options): return _Query(self.db, self.name, "select", columns=columns)
+    def insert(self, data, **options): return _Query(self.db, self.name, "insert", data)
+    def upsert(self, data, **options): return _Query(self.db, self.name, "upsert", data, **options)
+    def update(self, data, **options): return _Query(self.db, self.name, "update", data)
+    def delete(self, **options): return _Query(self.db, self.name, "delete")
+
+
+class _Rpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.behaviour.call()
+        return SimpleNamespace(data=getattr(self.db, f"_rpc_{self.name}")(**self.params))
+
+
+class FakeSupabase:
+    """In-memory tables behind the supabase-py query builder calls the app makes."""
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or Behaviour(name="supabase")
+        self.tables = {}
+        self.lock = threading.Lock()
+        self._next_id = 0
+
+    def table(self, name):
+        return _Table(self, name)
+
+    def rpc(self, name, params):
+        return _Rpc(self, name, params)
+
+    def insert_row(self, table, item):
+        self._next_id += 1
+        row = dict(item, id=self._next_id)
+        self.tables.setdefault(table, []).append(row)
+        return dict(row)
+
+    def _rpc_book_if_free(self, appointment, gap_minutes=20):
+        # Same contract as sql/002_book_if_free.sql
+        from slot_index import time_to_minute
+        minute = time_to_minute(appointment["appointment_time"])
+        with self.lock:
+            rows = self.tables.setdefault("appointments", [])
+            for r in rows:
+                if appointment.get("idempotency_key") and r.get("idempotency_key") == appointment["idempotency_key"]:
+                    return {"status": "booked", "appointment": dict(r)}
+            for r in rows:
+                if (r["doctor"] == appointment["doctor"] and r["appointment_date"] == appointment["appointment_date"]
+                        and abs(time_to_minute(r["appointment_time"]) - minute) < gap_minutes):
+                    return {"status": "conflict", "conflict": dict(r)}
+            return {"status": "booked", "appointment": self.insert_row("appointments", appointment)}
+
+    def _rpc_bulk_reschedule(self, changes):
+        out = []
+        with self.lock:
+            rows = {r["id"]: r for r in self.tables.setdefault("appointments", [])}
+            for change in changes:
+                row = rows.get(change["id"])
+                if row:
+                    row.update(change, idempotency_key=None)
+                    out.append({"id": row["id"], "status": "rescheduled", **{k: row[k] for k in ("doctor", "appointment_date", "appointment_time")}})
+                else:
+                    out.append({"id": change["id"], "status": "not_found", "doctor": None, "appointment_date": None, "appointment_time": None})
+        return out
+
+
+# --- Groq / Gemini ----------------------------------------------------------
+
+def fake_llm_reply(prompt):
+    """Answers the app's prompts plausibly from the prompt text alone."""
+    import symptom_analyzer
+    quoted = re.findall(r'"([^"]*)"', prompt)
+    if "Respond in this exact format" in prompt:
+        text = prompt.split('Symptom description: "', 1)[-1].split('"', 1)[0]
+        guess = symptom_analyzer.fallback_keyword_match(text)
+        return f"Specialty: {guess['specialty']}\nConfidence: High\nReasoning: Symptoms described as '{text}'."
+    if "date and time parsing assistant" in prompt:
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        return json.dumps({"date": tomorrow, "time": "10:00 AM"})
+    user_input = prompt.split('User Input: "', 1)[-1].split('"', 1)[0] if 'User Input: "' in prompt else (quoted[-1] if quoted else "")
+    fields, _ = nlu.extract_local(user_input)
+    name = re.search(r"\b(?:i'm|i am|my name is)\s+([A-Z][a-z]+)", user_input)
+    if name:
+        fields["name"] = name.group(1)
+    guess = symptom_analyzer.fallback_keyword_match(user_input)
+    if guess["reasoning"].startswith("Keyword match"):
+        fields["symptoms"] = user_input
+        fields.update(specialty=guess["specialty"], confidence="Medium", reasoning="Matched from the description.")
+    return json.dumps(fields)
+
+
+def _chunks(text, size=6):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeRateLimitError(Exception):
+    """Like groq.RateLimitError: status 429 with a Retry-After header."""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__(f"429 Too Many Requests (retry after {retry_after:.1f}s)")
+        self.response = SimpleNamespace(headers={"retry-after": f"{retry_after:.1f}"})
+
+
+class FakeGroq:
+    """
+    Mimics groq.Groq().chat.completions.create, including stream=True.
+    With `rpm`, requests beyond that many in the last minute get a 429.
+    """
+
+    def __init__(self, behaviour=None, rpm=0):
+        self.behaviour = behaviour or Behaviour(name="groq")
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.rpm = rpm
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _check_quota(self):
+        if not self.rpm:
+            return
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm:
+                raise FakeRateLimitError(self._recent[0] + 60 - now)
+            self._recent.append(now)
+
+    def _create(self, model, messages, stream=False, **options):
+        self._check_quota()
+        reply = fake_llm_reply(messages[-1]["content"])
+        if not stream:
+            self.behaviour.call()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+        return self._stream(reply)
+
+    def _stream(self, reply):
+        # First token after ~30% of the latency, the rest spread over the remainder
+        self.behaviour.wait(0.3)
+        if self.behaviour.error_rate and random.random() < self.behaviour.error_rate:
+            raise ConnectionError("groq: injected failure")
+        parts = _chunks(reply)
+        for part in parts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+            self.behaviour.wait(0.7 / len(parts))
+
+
+class FakeGemini:
+    """Mimics google.genai.Client().models.generate_content(_stream)."""
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or Behaviour(name="gemini")
+        self.models = SimpleNamespace(generate_content=self._generate, generate_content_stream=self._stream)
+
+    def _generate(self, model, contents, config=None):
+        self.behaviour.call()
+        return SimpleNamespace(text=fake_llm_reply(contents))
+
+    def _stream(self, model, contents, config=None):
+        self.behaviour.wait(0.3)
+        if self.behaviour.error_rate and random.random() < self.behaviour.error_rate:
+            raise ConnectionError("gemini: injected failure")
+        parts = _chunks(fake_llm_reply(contents))
+        for part in parts:
+            yield SimpleNamespace(text=part)
+            self.behaviour.wait(0.7 / len(parts))
+
+
+# --- SMTP / gTTS --------------------------------------------------------------
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP / SMTP_SSL; records sent messages."""
+
+    behaviour = Behaviour(name="smtp")
+    sent = []
+    _lock = threading.Lock()
+
+    def __init__(self, host=None, port=None, timeout=None, **kwargs):
+        self.behaviour.call()
+
+    def login(self, username, password): pass
+    def ehlo(self): return 250, b"ok"
+    def starttls(self, **kwargs): return 220, b"ok"
+    def noop(self): return 250, b"ok"
+    def quit(self): pass
+    def close(self): pass
+
+    def send_message(self, msg, *args, **kwargs):
+        self.behaviour.call()
+        with self._lock:
+            self.sent.append(msg)
+        return {}
+
+    def sendmail(self, *args, **kwargs):
+        self.behaviour.call()
+        with self._lock:
+            self.sent.append(args)
+        return {}
+
+
+class FakeGTTS:
+    """Stands in for gtts.gTTS; writes a few placeholder bytes."""
+
+    behaviour = Behaviour(name="gtts")
+
+    def __init__(self, text, lang="en", tld="com", **kwargs):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        self.behaviour.call()
+        fp.write(b"ID3" + self.text.encode("utf-8")[:64])
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.write_to_fp(f)
+
+
+# --- Redis --------------------------------------------------------------------
+
+class FakeRedis:
+    """
+    Stands in for redis.Redis with the hash, list and expiry commands session_store.py
+    uses. Values come back as bytes, like redis-py without decode_responses.
+    """
+
+    behaviour = Behaviour(name="redis")
+
+    def __init__(self, behaviour=None):
+        if behaviour is not None:
+            self.behaviour = behaviour
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def _run(self, commands):
+        self.behaviour.call()
+        with self._lock:
+            return [getattr(self, "_" + name)(*args) for name, args in commands]
+
+    def __getattr__(self, name):
+        # Single commands: one round trip each
+        if name.startswith("_") or not hasattr(type(self), "_" + name):
+            raise AttributeError(name)
+        return lambda *args: self._run([(name, args)])[0]
+
+    def _delete(self, *keys):
+        found = sum(1 for k in keys if self._live(k) is not None)
+        for k in keys:
+            self._data.pop(k, None)
+            self._expires.pop(k, None)
+        return found
+
+    def _exists(self, *keys):
+        return sum(1 for k in keys if self._live(k) is not None)
+
+    def _expire(self, key, seconds):
+        if self._live(key) is None:
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    def _hset(self, key, field, value):
+        h = self._live(key)
+        if h is None:
+            h = self._data[key] = {}
+        added = field not in h
+        h[field] = self._bytes(value)
+        return int(added)
+
+    def _hsetnx(self, key, field, value):
+        h = self._live(key)
+        if h is not None and field in h:
+            return 0
+        return self._hset(key, field, value)
+
+    def _hget(self, key, field):
+        return (self._live(key) or {}).get(field)
+
+    def _rpush(self, key, *values):
+        lst = self._live(key)
+        if lst is None:
+            lst = self._data[key] = []
+        lst.extend(self._bytes(v) for v in values)
+        return len(lst)
+
+    def _llen(self, key):
+        return len(self._live(key) or [])
+
+    def _lrange(self, key, start, end):
+        lst = self._live(key) or []
+        end = len(lst) if end == -1 else (end + 1 if end >= 0 else len(lst) + end + 1)
+        return lst[start:end]
+
+
+class _FakePipeline:
+    """Queues commands and sends them to FakeRedis as one round trip."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((name, args))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return self.redis._run(commands)
+
+
+# --- Wiring -------------------------------------------------------------------
+
+DEFAULT_DOCTORS = {
+    specialty: [f"Dr. {specialty.split()[0]} {n}" for n in ("Rao", "Iyer", "Khan")]
+    for specialty in [
+        "Primary Care Doctor", "Cardiologist", "Dermatologist", "Neurologist", "Orthopedic Surgeon",
+        "Pediatrician", "Psychiatrist", "Ear, Nose & Throat Doctor", "Ophthalmologist", "Dentist",
+        "Gastroenterologist", "Pulmonologist", "Urologist",
+    ]
+}
+
+
+def install(db=None, llm=None, smtp=None, tts=None, doctors=None, groq_rpm=0):
+    """
+    Patches the stand-ins into the app modules and returns them.
+    Each of db/llm/smtp/tts is a Behaviour (latency, error rate) or None for instant and reliable.
+    groq_rpm makes the Groq stand-in answer 429 above that many requests per minute.
+    """
+    import database
+    import doctor_snapshot
+    import symptom_analyzer
+
+    supabase = FakeSupabase(db)
+    database.get_client = lambda: supabase
+    database.slot_index.invalidate()
+
+    llm = llm or Behaviour()
+    symptom_analyzer._clients["groq"] = FakeGroq(Behaviour(llm.latency, llm.error_rate, "groq"), rpm=groq_rpm)
+    symptom_analyzer._clients["gemini"] = FakeGemini(Behaviour(llm.latency * 1.5, llm.error_rate, "gemini"))
+
+    FakeSMTP.behaviour = smtp or Behaviour(name="smtp")
+    smtplib.SMTP = smtplib.SMTP_SSL = FakeSMTP
+    # The outbox needs a login even though FakeSMTP ignores it
+    os.environ.setdefault("SMTP_USER", "clinic@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "stand-in")
+
+    import gtts
+    FakeGTTS.behaviour = tts or Behaviour(name="gtts")
+    gtts.gTTS = FakeGTTS
+
+    directory = doctors or DEFAULT_DOCTORS
+    doctor_snapshot.load_snapshot = lambda path=None: directory
+    return SimpleNamespace(supabase=supabase, smtp=FakeSMTP, tts=FakeGTTS)
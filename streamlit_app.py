@@ -1,25 +1,29 @@
 import hashlib
-import smtplib
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-import pandas as pd
-import random
-import re
+import html
+import uuid
 import os
-import tempfile
-from difflib import get_close_matches
 import streamlit as st
-import kagglehub
 import database
-import calendar_utils
 import symptom_analyzer
 import voice_utils
+import email_outbox
+import doctor_snapshot
+import prompts
+import tts_cache
+import booking_engine
+import tracing
+import session_store
 from streamlit_mic_recorder import mic_recorder
-from gtts import gTTS
-import base64
 
 @st.cache_resource
 def load_doctor_data():
+    # Prebuilt snapshot (python doctor_snapshot.py build) maps in milliseconds
+    directory = doctor_snapshot.load_snapshot()
+    if directory is not None:
+        return directory
+    # Slow path: download and parse the CSV (pandas and kagglehub are only imported here)
+    import kagglehub
+    import pandas as pd
     path = kagglehub.dataset_download("niksaurabh/doctors-speciality")
     csv_files = [file for file in os.listdir(path) if file.endswith('.csv')]
     if csv_files:
@@ -28,317 +32,259 @@ def load_doctor_data():
         return df.groupby('speciality')['Doctor\'s Name'].apply(list).to_dict()
     return {}
 
-doctors_by_specialty = load_doctor_data()
-
-def send_email(to_email, subject, body):
-    sender_email = "adityaraj6112025@gmail.com"
-    password = "kjowmfcicgzkqnti"
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = to_email
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, password)
-            server.sendmail(sender_email, to_email, msg.as_string())
-        st.success("Email sent successfully!")
-    except Exception as e:
-        st.error(f"Error sending email: {e}")
+@st.cache_resource
+def setup_tracing():
+    """Off unless TRACING is set; spans go to TRACING_JSONL and /metrics on TRACING_METRICS_PORT."""
+    tracing.configure(
+        enabled=str(database.get_secret("TRACING", "off")).lower() in ("1", "on", "true", "yes"),
+        jsonl_path=database.get_secret("TRACING_JSONL"),
+        metrics_port=database.get_secret("TRACING_METRICS_PORT"),
+    )
 
-def validate_mobile(mobile):
-    return re.match(r'^\d{10}$', mobile) is not None
+@st.cache_resource
+def get_email_outbox():
+    """One outbox and sender thread per process; sends reuse a pooled SMTP login."""
+    return email_outbox.shared_outbox(database.get_secret)
 
-def parse_date(date_str):
-    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%Y"):
-        try:
-            return datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
-        except ValueError: continue
-    return None
+@st.cache_resource
+def get_session_store():
+    """Conversation state shared by all workers (SESSION_STORE: sqlite by default, or a redis:// URL)."""
+    return session_store.from_settings(database.get_secret)
 
-def parse_time(time_str):
-    if not time_str: return None
-    t = time_str.lower().replace(".", "").replace(" ","").strip()
-    formats = ["%I:%M%p", "%I%p", "%H:%M", "%I.%M%p"]
-    for fmt in formats:
+def restore_session():
+    """
+    Ties this browser tab to a stored session through the ?sid= query parameter, so a
+    reload or another worker picks the conversation up where it left off.
+    """
+    if "session_id" in st.session_state: return
+    store = get_session_store()
+    sid = st.query_params.get("sid")
+    state = None
+    if sid and store:
         try:
-            return datetime.strptime(t, fmt).strftime("%I:%M %p")
-        except ValueError: continue
-    if "noon" in t: return "12:00 PM"
-    if "midnight" in t: return "12:00 AM"
-    return None
+            state = store.load(sid)
+        except Exception as e: print(f"Session Load Error: {e}")
+    if state: st.session_state.update(state)
+    else: sid = uuid.uuid4().hex
+    st.session_state["session_id"] = sid
+    st.query_params["sid"] = sid
 
-def is_past_date(date_str):
-    return date_str < datetime.today().strftime("%Y-%m-%d")
+def persist_session():
+    """Saves what this run changed: new messages and, if they changed, the booking fields."""
+    store = get_session_store()
+    if not store: return
+    try:
+        with tracing.span("session.save"):
+            store.save(st.session_state["session_id"], st.session_state)
+    except Exception as e: print(f"Session Save Error: {e}")
 
-def is_past_time(date_str, time_str):
-    if date_str == datetime.today().strftime("%Y-%m-%d"):
-        return time_str < datetime.now().strftime("%I:%M %p")
-    return False
+def send_email(to_email, subject, body):
+    try:
+        with tracing.span("email.enqueue", body_chars=len(body)):
+            get_email_outbox().enqueue(to_email, subject, body)
+        st.success("Email queued for delivery!")
+    except Exception as e:
+        st.error(f"Error sending email: {e}")
 
-def is_time_slot_available(date_str, time_str, doctor):
-    return database.check_availability(date_str, time_str, doctor)
+@st.cache_resource
+def get_tts_cache():
+    """Shared speech cache; fixed prompts are synthesized in the background at startup."""
+    cache = tts_cache.TTSCache(database.get_secret("TTS_CACHE_DIR", tts_cache.DEFAULT_DIR))
+    cache.prewarm_async(prompts.STATIC_PROMPTS, lang='en', tld='co.in')
+    return cache
 
 def speak_text(text):
     if not text: return
     try:
-        # Normalize text for speech (e.g. remove numbering for cleaner speech)
-        clean_text = re.sub(r'^\d+\.\s*', '', text, flags=re.MULTILINE)
-        tts = gTTS(text=clean_text, lang='en', tld='co.in')
-        fd, tmp_path = tempfile.mkstemp(suffix=".mp3")
-        os.close(fd)
-        try:
-            tts.save(tmp_path)
-            with open(tmp_path, "rb") as f:
-                data = f.read()
-                b64 = base64.b64encode(data).decode()
-                # Use style="display:none" to hide the audio player
-                md = f'<audio autoplay="true" style="display:none;"><source src="data:audio/mp3;base64,{b64}" type="audio/mp3"></audio>'
-                st.markdown(md, unsafe_allow_html=True)
-        finally:
-            if os.path.exists(tmp_path): os.remove(tmp_path)
+        with tracing.span("tts.speak", text_chars=len(text)):
+            b64 = get_tts_cache().get_audio_b64(text, lang='en', tld='co.in')
+        # Use style="display:none" to hide the audio player
+        md = f'<audio autoplay="true" style="display:none;"><source src="data:audio/mp3;base64,{b64}" type="audio/mp3"></audio>'
+        st.markdown(md, unsafe_allow_html=True)
     except Exception as e: print(f"TTS Error: {e}")
 
-def normalize_input(text):
-    if not text: return ""
-    text = text.lower().strip()
-    word_to_digit = {"one": "1", "book": "1", "two": "2", "reschedule": "2", "three": "3", "cancel": "3", "four": "4", "medical": "4", "five": "5"}
-    for word, digit in word_to_digit.items():
-        if word in text: return digit
-    digits = re.findall(r'\d+', text)
-    return digits[0] if digits else text
+def stream_triage(symptoms, container):
+    """Renders the triage reply into `container` while it streams; returns the final result."""
+    with container, st.chat_message("assistant", avatar="🤖"):
+        placeholder = st.empty()
+        placeholder.markdown("_Analyzing your symptoms..._")
+        spec, reasoning = None, ""
+        for event, value in symptom_analyzer.analyze_symptom_stream(symptoms):
+            if event == "done": return value
+            if event == "specialty": spec = value
+            elif event == "reasoning": reasoning += value
+            if spec: placeholder.markdown(f"Recommended Specialty: **{spec}**\n\n{reasoning}")
 
-def get_next_missing_field():
-    required = ["name", "email", "mobile", "age", "gender", "symptoms", "selected_doctor", "appointment_date", "appointment_time"]
-    details = st.session_state["appointment_details"]
-    for field in required:
-        if not details.get(field): return field
-    return "confirm_appointment"
+def booking_services(container):
+    """Real services for the booking engine, with the triage streamed into `container`."""
+    return booking_engine.Services(
+        db=database,
+        analyzer=symptom_analyzer,
+        doctors=load_doctor_data,
+        send_email=send_email,
+        stream_triage=lambda symptoms: stream_triage(symptoms, container),
+        busy=st.spinner,
+    )
 
-def is_complex_input(text, current_step=None):
-    if not text: return False
-    if current_step in ["symptoms", "appointment_time", "appointment_date"]:
-        if not re.match(r'^\d{1,2}$', text.strip()): return True
-    words = text.strip().split()
-    if len(words) > 4: return True
-    keywords = ["and", "have", "with", "my", "is", "am", "at", "on"]
-    if any(k in text.lower() for k in keywords) and len(words) > 2: return True
-    return False
+# Page styling and static markup, built once per process
+CUSTOM_CSS = """<link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600&family=Outfit:wght@400;600;700&display=swap" rel="stylesheet"><style>@keyframes meshGradient { 0% { background-position: 0% 50%; } 50% { background-position: 100% 50%; } 100% { background-position: 0% 50%; } }@keyframes pulse { 0% { box-shadow: 0 0 0 0 rgba(99, 102, 241, 0.4); transform: scale(1); } 70% { box-shadow: 0 0 0 20px rgba(99, 102, 241, 0); transform: scale(1.05); } 100% { box-shadow: 0 0 0 0 rgba(99, 102, 241, 0); transform: scale(1); } }.stApp { background-color: #030712; background-image: radial-gradient(circle at 20% 20%, rgba(79, 70, 229, 0.15) 0% , transparent 50%), radial-gradient(circle at 80% 80%, rgba(99, 102, 241, 0.15) 0%, transparent 50%), radial-gradient(circle at 50% 50%, rgba(31, 41, 55, 0.2) 0%, transparent 70%); background-size: 200% 200%; animation: meshGradient 20s ease infinite; background-attachment: fixed; font-family: 'Inter', sans-serif; }.title { font-family: 'Outfit', sans-serif; font-size: clamp(28px, 5vw, 46px); font-weight: 700; background: linear-gradient(135deg, #ffffff 0%, #818cf8 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; text-align: center; padding: 20px 10px 40px; filter: drop-shadow(0 4px 12px rgba(0,0,0,0.4)); }.stChatMessage { border-radius: 24px !important; padding: 1.2rem !important; border: 1px solid rgba(255, 255, 255, 0.1) !important; background: rgba(15, 23, 42, 0.8) !important; backdrop-filter: blur(30px); margin-bottom: 1.2rem !important; } /* PRECISION HIDE LABELS */ .stChatMessage [data-testid="stChatMessageAvatar"] + div > div:first-child:not([data-testid="stMarkdownContainer"]), [data-testid="stChatMessage"] header, div[class*="ChatMessageName"] { display: none !important; font-size: 0 !important; visibility: hidden !important; height: 0 !important; } .stChatMessage p, .stChatMessage li, .stChatMessage span, .stChatMessage div { color: #ffffff !important; font-family: 'Inter', sans-serif !important; font-size: 1rem !important; line-height: 1.6 !important; }.dashboard-item { background: rgba(31, 41, 55, 0.6); padding: 20px; border-radius: 20px; margin-bottom: 15px; border-left: 5px solid #6366f1; transition: 0.3s; }.dashboard-item:hover { transform: translateY(-2px); background: rgba(31, 41, 55, 0.8); }.assistant-header { color: #a5b4fc !important; font-family: 'Outfit', sans-serif; font-weight: 700; font-size: 1.2rem; letter-spacing: 2px; margin-bottom: 20px; text-transform: uppercase; }.stMicRecorder button { background: linear-gradient(135deg, #6366f1 0%, #4f46e5 100%) !important; color: white !important; padding: 12px 30px !important; border-radius: 100px !important; font-family: 'Outfit', sans-serif !important; font-weight: 700 !important; font-size: 1rem !important; text-transform: uppercase !important; letter-spacing: 2px !important; transition: 0.4s all cubic-bezier(0.175, 0.885, 0.32, 1.275) !important; cursor: pointer !important; width: 100% !important; } .stMicRecorder button [data-recording="true"] { background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%) !important; animation: pulse 1.5s infinite !important; }@media (max-width: 900px) { [data-testid="column"] { width: 100% !important; flex: 1 1 100% !important; } }@media (max-width: 768px) { .stChatMessage { padding: 1rem !important; border-radius: 16px !important; } .dashboard-item { padding: 15px !important; } }div[data-testid="stChatInput"] { background-color: rgba(255, 255, 255, 0.95) !important; border: 2px solid #6366f1 !important; border-radius: 20px !important; }#MainMenu, header, footer {visibility: hidden;}</style>"""
 
-def ask_step_question(step):
-    questions = {
-        "name": "What's your full name?",
-        "email": "What's your email address?",
-        "mobile": "What's your mobile number?",
-        "age": "What's your age?",
-        "gender": "What's your gender? (Male, Female, or Transgender)",
-        "symptoms": "What symptoms are you having?",
-        "appointment_date": "When would you like to visit?",
-        "appointment_time": "What time?",
-        "confirm_appointment": "Ready to book?"
-    }
-    msg = questions.get(step)
-    if msg and (not st.session_state["messages"] or st.session_state["messages"][-1]["content"] != msg):
-        st.session_state["messages"].append({"role": "assistant", "content": msg})
-        st.session_state["to_speak"] = msg
+TITLE_HTML = '<div class="title">✨ Advanced AI Medical Assistant</div>'
+DASHBOARD_HEADER_HTML = '<div style="text-align: center; padding: 20px;"><h2 style="color: #6366f1; font-family: \'Outfit\', sans-serif;">🏥 Patient Dashboard</h2></div>'
+VOICE_PANEL_HTML = """
+    <div style="background: rgba(31, 41, 55, 0.3); padding: 15px; border-radius: 20px; border: 1px solid rgba(99, 102, 241, 0.2); margin-top: 10px; margin-bottom: 5px;">
+        <div style="color: #a5b4fc; font-size: 0.85rem; font-weight: 600; text-align: center; margin-bottom: 8px;">🎙️ VOICE COMMANDS</div>
+        <div style="color: #94a3b8; font-size: 0.75rem; text-align: center; line-height: 1.4;">
+            Click <b>Record</b>, speak clearly, and click <b>Stop</b> to send.<br>
+            "I want to book", "My name is...", "I have a headache"
+        </div>
+    </div>
+"""
+DASHBOARD_HTML = """
+    <div class="dashboard-item" style="color: white; padding: 15px;">
+        <div style="font-size: 0.75rem; color: #94a3b8; text-transform: uppercase;">Patient Name</div>
+        <div style="font-size: 1.1rem; font-weight: 600; color: #ffffff;">{name}</div>
+    </div>
+    <div class="dashboard-item" style="color: white; padding: 15px;">
+        <div style="font-size: 0.75rem; color: #94a3b8; text-transform: uppercase;">Patient Email</div>
+        <div style="font-size: 0.95rem; font-weight: 500; color: #ffffff; word-break: break-all;">{email}</div>
+    </div>
+    <div style="display: flex; gap: 1rem;">
+        <div class="dashboard-item" style="flex: 1; padding: 12px; color: white;"><div style="font-size: 0.7rem; color: #94a3b8; text-transform: uppercase;">Age</div><div style="color: white;">{age}</div></div>
+        <div class="dashboard-item" style="flex: 1; padding: 12px; color: white;"><div style="font-size: 0.7rem; color: #94a3b8; text-transform: uppercase;">Gender</div><div style="color: white;">{gender}</div></div>
+    </div>
+    <div class="dashboard-item" style="border-left-color: #818cf8; color: white;"><div style="font-size: 0.8rem; color: #94a3b8; text-transform: uppercase;">Medical Specialist</div><div style="color: #a5b4fc; font-weight: 600;">{doctor}</div></div>
+    <div class="dashboard-item" style="color: white;"><div style="font-size: 0.8rem; color: #94a3b8; text-transform: uppercase;">Appointment</div><div style="color: white;">📅 {date}</div><div style="color: white;">🕒 {time}</div></div>
+"""
+# Fields shown on the dashboard, with their placeholder while unset
+DASHBOARD_FIELDS = {"name": "---", "email": "---", "age": "--", "gender": "--", "selected_doctor": "Awaiting Analysis...",
+                    "appointment_date": "Not Set", "appointment_time": "Not Set"}
+# Most recent messages rendered as chat bubbles; older ones are collapsed into one block
+CHAT_WINDOW = int(database.get_secret("CHAT_WINDOW", 20))
 
 def inject_custom_css():
-    css = """<link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600&family=Outfit:wght@400;600;700&display=swap" rel="stylesheet"><style>@keyframes meshGradient { 0% { background-position: 0% 50%; } 50% { background-position: 100% 50%; } 100% { background-position: 0% 50%; } }@keyframes pulse { 0% { box-shadow: 0 0 0 0 rgba(99, 102, 241, 0.4); transform: scale(1); } 70% { box-shadow: 0 0 0 20px rgba(99, 102, 241, 0); transform: scale(1.05); } 100% { box-shadow: 0 0 0 0 rgba(99, 102, 241, 0); transform: scale(1); } }.stApp { background-color: #030712; background-image: radial-gradient(circle at 20% 20%, rgba(79, 70, 229, 0.15) 0% , transparent 50%), radial-gradient(circle at 80% 80%, rgba(99, 102, 241, 0.15) 0%, transparent 50%), radial-gradient(circle at 50% 50%, rgba(31, 41, 55, 0.2) 0%, transparent 70%); background-size: 200% 200%; animation: meshGradient 20s ease infinite; background-attachment: fixed; font-family: 'Inter', sans-serif; }.title { font-family: 'Outfit', sans-serif; font-size: clamp(28px, 5vw, 46px); font-weight: 700; background: linear-gradient(135deg, #ffffff 0%, #818cf8 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; text-align: center; padding: 20px 10px 40px; filter: drop-shadow(0 4px 12px rgba(0,0,0,0.4)); }.stChatMessage { border-radius: 24px !important; padding: 1.2rem !important; border: 1px solid rgba(255, 255, 255, 0.1) !important; background: rgba(15, 23, 42, 0.8) !important; backdrop-filter: blur(30px); margin-bottom: 1.2rem !important; } /* PRECISION HIDE LABELS */ .stChatMessage [data-testid="stChatMessageAvatar"] + div > div:first-child:not([data-testid="stMarkdownContainer"]), [data-testid="stChatMessage"] header, div[class*="ChatMessageName"] { display: none !important; font-size: 0 !important; visibility: hidden !important; height: 0 !important; } .stChatMessage p, .stChatMessage li, .stChatMessage span, .stChatMessage div { color: #ffffff !important; font-family: 'Inter', sans-serif !important; font-size: 1rem !important; line-height: 1.6 !important; }.dashboard-item { background: rgba(31, 41, 55, 0.6); padding: 20px; border-radius: 20px; margin-bottom: 15px; border-left: 5px solid #6366f1; transition: 0.3s; }.dashboard-item:hover { transform: translateY(-2px); background: rgba(31, 41, 55, 0.8); }.assistant-header { color: #a5b4fc !important; font-family: 'Outfit', sans-serif; font-weight: 700; font-size: 1.2rem; letter-spacing: 2px; margin-bottom: 20px; text-transform: uppercase; }.stMicRecorder button { background: linear-gradient(135deg, #6366f1 0%, #4f46e5 100%) !important; color: white !important; padding: 12px 30px !important; border-radius: 100px !important; font-family: 'Outfit', sans-serif !important; font-weight: 700 !important; font-size: 1rem !important; text-transform: uppercase !important; letter-spacing: 2px !important; transition: 0.4s all cubic-bezier(0.175, 0.885, 0.32, 1.275) !important; cursor: pointer !important; width: 100% !important; } .stMicRecorder button [data-recording="true"] { background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%) !important; animation: pulse 1.5s infinite !important; }@media (max-width: 900px) { [data-testid="column"] { width: 100% !important; flex: 1 1 100% !important; } }@media (max-width: 768px) { .stChatMessage { padding: 1rem !important; border-radius: 16px !important; } .dashboard-item { padding: 15px !important; } }div[data-testid="stChatInput"] { background-color: rgba(255, 255, 255, 0.95) !important; border: 2px solid #6366f1 !important; border-radius: 20px !important; }#MainMenu, header, footer {visibility: hidden;}</style>"""
-    st.markdown(css, unsafe_allow_html=True)
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
-def handle_chat():
-    if "step" not in st.session_state: st.session_state["step"] = None
-    if "messages" not in st.session_state: st.session_state["messages"] = []
-    if "appointment_details" not in st.session_state: st.session_state["appointment_details"] = {}
-    if "audio_key_index" not in st.session_state: st.session_state["audio_key_index"] = 0
+def dashboard_snapshot():
+    det = st.session_state["appointment_details"]
+    return tuple(det.get(k) for k in DASHBOARD_FIELDS)
 
-    # 0. DATABASE CHECK
-    is_connected, db_error = database.test_connection()
-    if not is_connected:
-        st.error(f"🚨 Connection Error: {db_error}")
-        st.stop()
+@st.fragment(key="dashboard")
+def render_dashboard():
+    """Patient profile cards; reruns on its own or with the chat, never for the whole page."""
+    st.markdown(DASHBOARD_HEADER_HTML, unsafe_allow_html=True)
+    det = st.session_state["appointment_details"]
+    values = {k: html.escape(str(det.get(k) or placeholder)) for k, placeholder in DASHBOARD_FIELDS.items()}
+    st.markdown(DASHBOARD_HTML.format(name=values["name"], email=values["email"], age=values["age"], gender=values["gender"],
+                                      doctor=values["selected_doctor"], date=values["appointment_date"], time=values["appointment_time"]),
+                unsafe_allow_html=True)
+    st.session_state["dashboard_shown"] = dashboard_snapshot()
+    if st.button("Reset Session", use_container_width=True):
+        st.session_state["messages"] = []; st.session_state["appointment_details"] = {}; st.session_state["step"] = None
+        persist_session(); st.rerun()
 
-    # Create Main Columns (Left for Chat, Right for Dashboard)
-    col_chat, col_dash = st.columns([1.8, 1])
+def render_messages(messages):
+    for m in messages:
+        avatar = "🤖" if m["role"] == "assistant" else "👤"
+        with st.chat_message(m["role"], avatar=avatar): st.write(m["content"])
 
-    # 1. RIGHT SECTION - PATIENT PROFILE
-    with col_dash:
-        st.markdown('<div style="text-align: center; padding: 20px;"><h2 style="color: #6366f1; font-family: \'Outfit\', sans-serif;">🏥 Patient Dashboard</h2></div>', unsafe_allow_html=True)
-        det = st.session_state["appointment_details"]
-        
-        # Display Cards
-        st.markdown(f'''
-            <div class="dashboard-item" style="color: white; padding: 15px;">
-                <div style="font-size: 0.75rem; color: #94a3b8; text-transform: uppercase;">Patient Name</div>
-                <div style="font-size: 1.1rem; font-weight: 600; color: #ffffff;">{det.get("name", "---")}</div>
-            </div>
-            <div class="dashboard-item" style="color: white; padding: 15px;">
-                <div style="font-size: 0.75rem; color: #94a3b8; text-transform: uppercase;">Patient Email</div>
-                <div style="font-size: 0.95rem; font-weight: 500; color: #ffffff; word-break: break-all;">{det.get("email", "---")}</div>
-            </div>
-        ''', unsafe_allow_html=True)
-        
-        sc1, sc2 = st.columns(2)
-        with sc1: st.markdown(f'<div class="dashboard-item" style="padding: 12px; color: white;"><div style="font-size: 0.7rem; color: #94a3b8; text-transform: uppercase;">Age</div><div style="color: white;">{det.get("age", "--")}</div></div>', unsafe_allow_html=True)
-        with sc2: st.markdown(f'<div class="dashboard-item" style="padding: 12px; color: white;"><div style="font-size: 0.7rem; color: #94a3b8; text-transform: uppercase;">Gender</div><div style="color: white;">{det.get("gender", "--")}</div></div>', unsafe_allow_html=True)
-        
-        st.markdown(f'<div class="dashboard-item" style="border-left-color: #818cf8; color: white;"><div style="font-size: 0.8rem; color: #94a3b8; text-transform: uppercase;">Medical Specialist</div><div style="color: #a5b4fc; font-weight: 600;">{det.get("selected_doctor", "Awaiting Analysis...")}</div></div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="dashboard-item" style="color: white;"><div style="font-size: 0.8rem; color: #94a3b8; text-transform: uppercase;">Appointment</div><div style="color: white;">📅 {det.get("appointment_date", "Not Set")}</div><div style="color: white;">🕒 {det.get("appointment_time", "Not Set")}</div></div>', unsafe_allow_html=True)
-        
-        if st.button("Reset Session", use_container_width=True):
-            st.session_state["messages"] = []; st.session_state["appointment_details"] = {}; st.session_state["step"] = None; st.rerun()
+def render_history(messages):
+    """Shows the last CHAT_WINDOW messages; anything older goes in one collapsed expander."""
+    older, recent = messages[:-CHAT_WINDOW], messages[-CHAT_WINDOW:]
+    if older:
+        with st.expander(f"Earlier messages ({len(older)})"):
+            st.markdown("\n\n---\n\n".join(m["content"] for m in older))
+    render_messages(recent)
 
-    with col_chat:
-        # 2. CHAT HISTORY
-        for m in st.session_state["messages"]:
-            avatar = "🤖" if m["role"] == "assistant" else "👤"
-            with st.chat_message(m["role"], avatar=avatar): st.write(m["content"])
+def listen():
+    """Returns the transcript of a new voice recording, if there is one."""
+    audio = mic_recorder(
+        start_prompt="🔴 Start Recording",
+        stop_prompt="✅ Stop & Process",
+        key=f"rec_{st.session_state['audio_key_index']}",
+        use_container_width=True
+    )
+    if audio:
+        curr_aid = hashlib.md5(audio['bytes']).hexdigest()
+        if st.session_state.get("last_audio_id") != curr_aid:
+            with st.spinner("Analyzing your voice..."):
+                txt = voice_utils.transcribe_audio(audio['bytes'])
+            if txt:
+                st.session_state["last_audio_id"] = curr_aid
+                st.session_state["audio_key_index"] += 1
+                return txt
+    return None
+
+def on_chat_submit():
+    # A typed turn reruns the chat and then the dashboard, not the whole page
+    st.rerun(["chat", "dashboard"])
 
-        # 3. INITIAL GREETING (If app just started)
-        if st.session_state["step"] is None and not st.session_state["messages"]:
-            welcome_msg = "Welcome! I'm your Medical Assistant. How can I help you today?"
-            options_msg = "1. Book Appointment\n2. Reschedule\n3. Cancel\n4. Medical Info\n5. Exit"
-            st.session_state["messages"].append({"role": "assistant", "content": welcome_msg})
-            st.session_state["messages"].append({"role": "assistant", "content": options_msg})
-            st.session_state["step"] = "options"
-            st.session_state["to_speak"] = welcome_msg + ". " + options_msg
-            st.rerun()
+@st.fragment(key="chat")
+def chat_panel():
+    """
+    History, voice recorder and chat input. A turn appends its reply below the
+    history in place instead of rerunning the page.
+    """
+    session = booking_engine.Session(st.session_state)
+    with tracing.span("turn", session=st.session_state["trace_session"]):
+        if booking_engine.start(session): persist_session()
+        history = st.container()
+        with history:
+            render_history(session.messages)
 
-        # 4. VOICE COMPONENT (ALWAYS ABOVE CHAT INPUT)
+        # Voice recorder (always above the chat input)
         with st.container():
-            st.markdown("""
-                <div style="background: rgba(31, 41, 55, 0.3); padding: 15px; border-radius: 20px; border: 1px solid rgba(99, 102, 241, 0.2); margin-top: 10px; margin-bottom: 5px;">
-                    <div style="color: #a5b4fc; font-size: 0.85rem; font-weight: 600; text-align: center; margin-bottom: 8px;">🎙️ VOICE COMMANDS</div>
-                    <div style="color: #94a3b8; font-size: 0.75rem; text-align: center; line-height: 1.4;">
-                        Click <b>Record</b>, speak clearly, and click <b>Stop</b> to send.<br>
-                        "I want to book", "My name is...", "I have a headache"
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
-            
-            audio = mic_recorder(
-                start_prompt="🔴 Start Recording", 
-                stop_prompt="✅ Stop & Process", 
-                key=f"rec_{st.session_state['audio_key_index']}",
-                use_container_width=True
-            )
-            
-            if audio:
-                curr_aid = hashlib.md5(audio['bytes']).hexdigest()
-                if st.session_state.get("last_audio_id") != curr_aid:
-                    with st.spinner("Analyzing your voice..."):
-                        txt = voice_utils.transcribe_audio(audio['bytes'])
-                        if txt:
-                            st.session_state["pending_input"] = txt
-                            st.session_state["last_audio_id"] = curr_aid
-                            st.session_state["audio_key_index"] += 1
-                            st.rerun()
+            st.markdown(VOICE_PANEL_HTML, unsafe_allow_html=True)
+            spoken = listen()
 
-        # 5. INPUT HANDLING
-        user_input = st.chat_input("Type or say anything...")
-        if st.session_state.get("pending_input"):
-            user_input = st.session_state.pop("pending_input")
+        typed = st.chat_input("Type or say anything...", on_submit=on_chat_submit)
+        user_input = typed or spoken
+        if user_input:
+            with history:
+                live = st.empty()
+            reply = booking_engine.handle(session, user_input, booking_services(live.container()))
+            # The streamed triage is replaced by the reply's final messages
+            live.empty()
+            persist_session()
+            with history:
+                render_messages(reply.messages)
+            if reply.error:
+                st.error(reply.error)
+            if not typed and dashboard_snapshot() != st.session_state.get("dashboard_shown"):
+                # Voice turns only rerun this fragment, so refresh the dashboard with the page
+                st.rerun()
 
-    if user_input:
-        step = st.session_state["step"]
-        # --- SMART AI EXTRACTION ---
-        if step not in [None, "options", "medical_info"] and is_complex_input(user_input, step):
-             with st.spinner("AI is understanding..."):
-                extracted = symptom_analyzer.extract_entities(user_input)
-                if extracted:
-                    for k, v in extracted.items():
-                        if v and not st.session_state["appointment_details"].get(k):
-                            if k == "email": v = str(v).lower().replace(" ", "").strip()
-                            st.session_state["appointment_details"][k] = v
+        if st.session_state.get("to_speak"):
+            speak_text(st.session_state.pop("to_speak"))
 
-        # --- STEP HANDLER ---
-        if step == "options":
-            n = normalize_input(user_input)
-            if n == "1": st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-            elif n == "2": st.session_state["step"] = "reschedule_email"; ask_step_question("email"); st.rerun()
-            elif n == "3": st.session_state["step"] = "cancel_email"; ask_step_question("email"); st.rerun()
-            elif n == "4": st.session_state["step"] = "medical_info"; st.session_state["messages"].append({"role": "assistant", "content": "What disease?"}); st.rerun()
-            elif n == "5": st.session_state["messages"].append({"role": "assistant", "content": "Goodbye!"}); st.session_state["step"] = None
-        elif step == "name":
-            st.session_state["appointment_details"]["name"] = user_input
-            st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-        elif step == "email":
-            st.session_state["appointment_details"]["email"] = user_input.lower().replace(" ", "").strip()
-            st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-        elif step == "mobile":
-            c = re.sub(r'\D', '', user_input)
-            if validate_mobile(c): st.session_state["appointment_details"]["mobile"] = c; st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-            else: st.error("Invalid mobile number.")
-        elif step == "age":
-            c = re.sub(r'\D', '', user_input)
-            if c.isdigit(): st.session_state["appointment_details"]["age"] = c; st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-        elif step == "gender":
-            g = user_input.lower()
-            res = "Male" if "mal" in g or "mail" in g else "Female" if "fem" in g else "Transgender" if "trans" in g else None
-            if res: st.session_state["appointment_details"]["gender"] = res; st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-        elif step == "symptoms":
-            s = user_input; st.session_state["appointment_details"]["symptoms"] = s
-            with st.spinner("Analyzing..."):
-                ana = symptom_analyzer.analyze_symptom(s)
-                spec = ana["specialty"]
-                st.session_state["messages"].append({"role": "assistant", "content": f"Recommended Specialty: **{spec}**\n\n{ana['reasoning']}"})
-                docs = doctors_by_specialty.get(spec, ["General Doctor"])[:5]
-                st.session_state["appointment_details"]["docs"] = docs
-                st.session_state["step"] = "select_doctor"
-                sel_msg = "Select doctor:\n" + "\n".join([f"{i+1}. {d}" for i, d in enumerate(docs)])
-                st.session_state["messages"].append({"role": "assistant", "content": sel_msg})
-                st.session_state["to_speak"] = sel_msg
-                st.rerun()
-        elif step == "select_doctor":
-            docs = st.session_state["appointment_details"].get("docs", [])
-            idx = None
-            norm = normalize_input(user_input)
-            if norm.isdigit():
-                i = int(norm) - 1
-                if 0 <= i < len(docs): idx = i
-            if idx is None:
-                user_low = user_input.lower()
-                for i, d in enumerate(docs):
-                    if d.lower() in user_low or user_low in d.lower().replace("dr. ", ""):
-                        idx = i
-                        break
-            if idx is not None:
-                st.session_state["appointment_details"]["selected_doctor"] = docs[idx]
-                st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-            else: st.error(f"Please say the number (1-{len(docs)}) or the doctor's name.")
-        elif step == "appointment_date":
-            d = parse_date(user_input)
-            if not d:
-                res = symptom_analyzer.parse_datetime_ai(user_input, f"Today is {datetime.now().strftime('%Y-%m-%d')}")
-                if res and res.get("date"): d = res["date"]
-            if d and not is_past_date(d): st.session_state["appointment_details"]["appointment_date"] = d; st.session_state["step"] = get_next_missing_field(); ask_step_question(st.session_state["step"]); st.rerun()
-        elif step == "appointment_time":
-            t = parse_time(user_input)
-            if not t:
-                res = symptom_analyzer.parse_datetime_ai(user_input, f"Now is {datetime.now().strftime('%I:%M %p')}")
-                if res and res.get("time"): t = res["time"]
-            if t:
-                date = st.session_state["appointment_details"]["appointment_date"]
-                if not is_past_time(date, t): st.session_state["appointment_details"]["appointment_time"] = t; st.session_state["step"] = "confirm_appointment"; ask_step_question("confirm_appointment"); st.rerun()
-        elif step == "confirm_appointment":
-            if normalize_input(user_input) in ["1", "yes", "confirm"]:
-                d = st.session_state["appointment_details"]
-                res = database.add_appointment(d["email"], d["name"], d["mobile"], int(d["age"]), d["gender"], d["symptoms"], d["selected_doctor"], d["appointment_date"], d["appointment_time"])
-                id_str = f"APPT-{res.data[0]['id']}" if res.data and res.data[0].get('id') else "OK"
-                email_body = f"""Hello {d['name']}, your appointment has been booked. Details: ID {id_str}, Doctor {d['selected_doctor']}, Date {d['appointment_date']}, Time {d['appointment_time']}."""
-                send_email(d["email"], f"Appointment Confirmation - {id_str}", email_body)
-                msg = f"Booked successfully! ID: {id_str}. Confirmation sent to your email."
-                st.session_state["messages"].append({"role": "assistant", "content": msg})
-                st.session_state["to_speak"] = msg
-                st.session_state["step"] = None; st.session_state["appointment_details"] = {}; st.rerun()
+def handle_chat():
+    if "audio_key_index" not in st.session_state: st.session_state["audio_key_index"] = 0
+    restore_session()
+    if "trace_session" not in st.session_state: st.session_state["trace_session"] = st.session_state["session_id"][:12]
+    # Creates step, messages and appointment_details on the first run
+    booking_engine.Session(st.session_state)
+
+    # 0. DATABASE CHECK
+    is_connected, db_error = database.health.status()
+    if not is_connected:
+        st.error(f"🚨 Connection Error: {db_error}")
+        st.stop()
+
+    # Main columns: chat on the left, patient dashboard on the right.
+    # The chat renders first so a full run shows the details it just collected.
+    col_chat, col_dash = st.columns([1.8, 1])
+    with col_chat:
+        chat_panel()
+    with col_dash:
+        render_dashboard()
 
 def main():
     st.set_page_config(page_title="Medical Assistant", page_icon="🏥", initial_sidebar_state="collapsed", layout="wide")
+    # Only full-page runs get here; chat turns rerun just the chat and dashboard fragments
     inject_custom_css()
-    st.markdown('<div class="title">✨ Advanced AI Medical Assistant</div>', unsafe_allow_html=True)
+    st.markdown(TITLE_HTML, unsafe_allow_html=True)
+    setup_tracing()
     handle_chat()
-    if "to_speak" in st.session_state and st.session_state["to_speak"]:
-        text_to_say = st.session_state.pop("to_speak")
-        speak_text(text_to_say)
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,16 @@
 import os
+import re
 import streamlit as st
 from datetime import datetime
+import threading
+import time
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from groq import Groq
+from ai_cache import ResultCache, make_key, normalize_text
+import llm_router
+import nlu
+import date_parser
+import tracing
+import rate_limiter
 
 # Load environment variables (Local)
 load_dotenv()
@@ -22,8 +28,27 @@ def get_secret(key, default=None):
 gemini_key = get_secret("GEMINI_API_KEY")
 groq_key = get_secret("GROQ_API_KEY")
 
-gemini_client = genai.Client(api_key=gemini_key) if gemini_key else None
-groq_client = Groq(api_key=groq_key) if groq_key else None
+# SDK clients are created on first use; google-genai alone takes ~0.4s to import
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_groq_client():
+    """Returns the Groq client, or None if GROQ_API_KEY is missing."""
+    if "groq" not in _clients:
+        with _clients_lock:
+            if "groq" not in _clients:
+                from groq import Groq
+                _clients["groq"] = Groq(api_key=groq_key) if groq_key else None
+    return _clients["groq"]
+
+def get_gemini_client():
+    """Returns the Gemini client, or None if GEMINI_API_KEY is missing."""
+    if "gemini" not in _clients:
+        with _clients_lock:
+            if "gemini" not in _clients:
+                from google import genai
+                _clients["gemini"] = genai.Client(api_key=gemini_key) if gemini_key else None
+    return _clients["gemini"]
 
 if not gemini_key or not groq_key:
     st.warning("⚠️ AI API keys missing. AI features will be limited.")
@@ -32,6 +57,38 @@ if not gemini_key or not groq_key:
 GROQ_MODEL = "llama-3.3-70b-versatile"
 GEMINI_MODEL = "gemini-flash-latest"
 
+# Hedged requests: fire the secondary provider if the primary hasn't answered
+# within LLM_HEDGE_DELAY seconds, and give up on both after LLM_DEADLINE seconds.
+# Set LLM_HEDGING=off to only try Gemini after Groq fails.
+LLM_HEDGING = str(get_secret("LLM_HEDGING", "on")).lower() not in ("0", "off", "false", "no")
+LLM_DEADLINE = float(get_secret("LLM_DEADLINE", 8.0))
+LLM_HEDGE_DELAY = float(get_secret("LLM_HEDGE_DELAY", 1.5)) if LLM_HEDGING else LLM_DEADLINE
+
+# Client-side RPM/TPM limits and adaptive concurrency per provider (rate_limiter.py).
+# A provider without capacity within LLM_QUEUE_WAIT is skipped like a failed one.
+rate_limits = rate_limiter.from_settings(get_secret)
+
+# Result caches: memory LRU always, SQLite tier when AI_CACHE_PATH is set
+AI_CACHE_PATH = get_secret("AI_CACHE_PATH")
+AI_CACHE_TTL = float(get_secret("AI_CACHE_TTL", 86400))
+
+symptom_cache = ResultCache("analyze_symptom", ttl=AI_CACHE_TTL, db_path=AI_CACHE_PATH)
+entity_cache = ResultCache("extract_entities", ttl=AI_CACHE_TTL, db_path=AI_CACHE_PATH)
+datetime_cache = ResultCache("parse_datetime_ai", ttl=AI_CACHE_TTL, db_path=AI_CACHE_PATH)
+turn_cache = ResultCache("analyze_turn", ttl=AI_CACHE_TTL, db_path=AI_CACHE_PATH)
+
+def cache_stats():
+    """Returns hit/miss counters for every AI result cache."""
+    return {c.name: c.stats() for c in (symptom_cache, entity_cache, datetime_cache, turn_cache)}
+
+def provider_stats():
+    """Returns per-provider call counts, wins and latency percentiles."""
+    return llm_router.latency_stats.snapshot()
+
+def rate_limit_stats():
+    """Returns per-provider queue depth, in-flight calls, concurrency cap and throttling counters."""
+    return rate_limiter.stats()
+
 # Available specialties (matched exactly to dataset)
 SPECIALTIES = [
     "Primary Care Doctor", "Cardiologist", "Dermatologist", "Neurologist",
@@ -40,13 +97,197 @@ SPECIALTIES = [
     "Urologist"
 ]
 
-def analyze_symptom(user_input):
+def _ask_groq(prompt, timeout, **options):
+    groq_client = get_groq_client()
+    if not groq_client: raise Exception("Groq client not initialized")
+    tokens = rate_limiter.estimate_request(prompt, options.get("max_tokens"))
+    with rate_limits["groq"].acquire(tokens, timeout) as permit, \
+            tracing.span("llm.groq", provider="groq", model=GROQ_MODEL, prompt_chars=len(prompt)) as span:
+        response = groq_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=max(0.1, timeout - permit.waited),
+            **options
+        )
+        text = response.choices[0].message.content.strip()
+        usage = getattr(response, "usage", None)
+        permit.used(getattr(usage, "total_tokens", None))
+        span.set(response_chars=len(text), prompt_tokens=getattr(usage, "prompt_tokens", None),
+                 completion_tokens=getattr(usage, "completion_tokens", None))
+        return text
+
+def _ask_gemini(prompt, timeout):
+    from google.genai import types
+    gemini_client = get_gemini_client()
+    if not gemini_client: raise Exception("Gemini client not initialized")
+    with rate_limits["gemini"].acquire(rate_limiter.estimate_request(prompt), timeout) as permit, \
+            tracing.span("llm.gemini", provider="gemini", model=GEMINI_MODEL, prompt_chars=len(prompt)) as span:
+        timeout = max(0.1, timeout - permit.waited)
+        response = gemini_client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+        )
+        text = response.text.strip()
+        permit.used(getattr(getattr(response, "usage_metadata", None), "total_token_count", None))
+        span.set(response_chars=len(text))
+        return text
+
+def _stream_groq(prompt, timeout, **options):
+    groq_client = get_groq_client()
+    if not groq_client: raise Exception("Groq client not initialized")
+    tokens = rate_limiter.estimate_request(prompt, options.get("max_tokens"))
+    with rate_limits["groq"].acquire(tokens, timeout) as permit:
+        stream = groq_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=max(0.1, timeout - permit.waited),
+            stream=True,
+            **options
+        )
+        text = ""
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text += chunk.choices[0].delta.content
+                yield chunk.choices[0].delta.content
+        permit.used(rate_limiter.estimate_tokens(prompt) + rate_limiter.estimate_tokens(text))
+
+def _stream_gemini(prompt, timeout):
+    from google.genai import types
+    gemini_client = get_gemini_client()
+    if not gemini_client: raise Exception("Gemini client not initialized")
+    with rate_limits["gemini"].acquire(rate_limiter.estimate_request(prompt), timeout) as permit:
+        timeout = max(0.1, timeout - permit.waited)
+        stream = gemini_client.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+        )
+        text = ""
+        for chunk in stream:
+            if chunk.text:
+                text += chunk.text
+                yield chunk.text
+        permit.used(rate_limiter.estimate_tokens(prompt) + rate_limiter.estimate_tokens(text))
+
+def _ask_llm(prompt, validate, **groq_options):
     """
-    Uses Gemini AI to analyze natural language symptom descriptions
-    and recommend the appropriate medical specialty.
+    Sends the prompt to Groq (primary) and Gemini (secondary) as a hedged request
+    and returns validate(text) of the first valid answer.
+    Raises llm_router.LLMUnavailable if neither answers within LLM_DEADLINE.
     """
-    try:
-        prompt = f"""You are a medical triage assistant. Analyze the following symptom description and recommend the most appropriate medical specialty.
+    providers = [
+        ("groq", lambda timeout: _ask_groq(prompt, timeout, **groq_options)),
+        ("gemini", lambda timeout: _ask_gemini(prompt, timeout)),
+    ]
+    with tracing.span("llm.hedged", prompt_chars=len(prompt)):
+        return llm_router.hedged_call(providers, LLM_HEDGE_DELAY, LLM_DEADLINE, validate)
+
+def _parse_json(result):
+    """Parses a JSON object reply, tolerating markdown code fences from Gemini."""
+    import json
+    result = result.strip()
+    if result.startswith("```json"):
+        result = result.split("```json")[1].split("```")[0].strip()
+    elif result.startswith("```"):
+        result = result.split("```")[1].split("```")[0].strip()
+    data = json.loads(result)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return data
+
+def _parse_triage(result_text):
+    """Parses the Specialty/Confidence/Reasoning reply of the triage prompt."""
+    lines = result_text.split('\n')
+    specialty = None
+    confidence = "Medium"
+    reasoning = ""
+    
+    for line in lines:
+        if line.startswith("Specialty:"):
+            specialty = line.replace("Specialty:", "").strip()
+        elif line.startswith("Confidence:"):
+            confidence = line.replace("Confidence:", "").strip()
+        elif line.startswith("Reasoning:"):
+            reasoning = line.replace("Reasoning:", "").strip()
+    
+    if specialty is None:
+        raise ValueError("No specialty in response")
+    # Validate specialty is in our list
+    if specialty not in SPECIALTIES:
+        specialty = "Primary Care Doctor"
+    
+    return {
+        "specialty": specialty,
+        "confidence": confidence,
+        "reasoning": reasoning,
+        "success": True
+    }
+
+class TriageStreamParser:
+    """
+    Incremental version of _parse_triage for streamed replies.
+    feed(chunk) returns the events that chunk completes: ("specialty", name) and
+    ("confidence", level) once their lines end, ("reasoning", text) as it grows.
+    """
+
+    def __init__(self):
+        self.specialty = None
+        self.confidence = "Medium"
+        self.reasoning = ""
+        self._buffer = ""
+
+    def _line(self, line, complete):
+        if line.startswith("Reasoning:"):
+            text = line.replace("Reasoning:", "", 1).strip()
+            delta = text[len(self.reasoning):]
+            self.reasoning = text
+            return [("reasoning", delta)] if delta else []
+        if not complete:
+            return []
+        if line.startswith("Specialty:") and self.specialty is None:
+            specialty = line.replace("Specialty:", "").strip()
+            self.specialty = specialty if specialty in SPECIALTIES else "Primary Care Doctor"
+            return [("specialty", self.specialty)]
+        if line.startswith("Confidence:"):
+            self.confidence = line.replace("Confidence:", "").strip()
+            return [("confidence", self.confidence)]
+        return []
+
+    def feed(self, chunk):
+        events = []
+        self._buffer += chunk
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            events += self._line(line.strip(), complete=True)
+        # The reasoning line is streamed before it ends
+        events += self._line(self._buffer.strip(), complete=False)
+        return events
+
+    def close(self):
+        line, self._buffer = self._buffer, ""
+        return self._line(line.strip(), complete=True)
+
+    def result(self):
+        if self.specialty is None:
+            raise ValueError("No specialty in response")
+        return {
+            "specialty": self.specialty,
+            "confidence": self.confidence,
+            "reasoning": self.reasoning,
+            "success": True
+        }
+
+def _triage_events(result):
+    """Replays a finished triage result as stream events."""
+    yield ("specialty", result["specialty"])
+    yield ("confidence", result["confidence"])
+    if result["reasoning"]:
+        yield ("reasoning", result["reasoning"])
+    yield ("done", result)
+
+def _triage_prompt(user_input):
+    return f"""You are a medical triage assistant. Analyze the following symptom description and recommend the most appropriate medical specialty.
 
 Available specialties: {', '.join(SPECIALTIES)}
 
@@ -59,54 +300,89 @@ Reasoning: [brief explanation in one sentence]
 
 If the symptoms are unclear or too vague, recommend "Primary Care Doctor"."""
 
-        # Try Groq first
-        try:
-            if not groq_client: raise Exception("Groq client not initialized")
-            response = groq_client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
-            )
-            result_text = response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Groq failed, falling back to Gemini: {e}")
-            if not gemini_client: return fallback_keyword_match(user_input)
-            response = gemini_client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=prompt
-            )
-            result_text = response.text.strip()
-
-        # Parse the response
-        lines = result_text.split('\n')
-        specialty = None
-        confidence = "Medium"
-        reasoning = ""
-        
-        for line in lines:
-            if line.startswith("Specialty:"):
-                specialty = line.replace("Specialty:", "").strip()
-            elif line.startswith("Confidence:"):
-                confidence = line.replace("Confidence:", "").strip()
-            elif line.startswith("Reasoning:"):
-                reasoning = line.replace("Reasoning:", "").strip()
-        
-        # Validate specialty is in our list
-        if specialty not in SPECIALTIES:
-            specialty = "Primary Care Doctor"
-        
-        return {
-            "specialty": specialty,
-            "confidence": confidence,
-            "reasoning": reasoning,
-            "success": True
-        }
+def analyze_symptom(user_input):
+    """
+    Uses Gemini AI to analyze natural language symptom descriptions
+    and recommend the appropriate medical specialty.
+    """
+    cache_key = make_key(normalize_text(user_input, strip_punctuation=True))
+    cached = symptom_cache.get(cache_key)
+    if cached:
+        return cached
+
+    try:
+        result = _ask_llm(_triage_prompt(user_input), _parse_triage, temperature=0.1)
+        symptom_cache.set(cache_key, result)
+        return result
         
     except Exception as e:
         print(f"Error in AI symptom analysis: {e}")
         # Fallback to keyword matching
         return fallback_keyword_match(user_input)
 
+def analyze_symptom_stream(user_input):
+    """
+    Streaming variant of analyze_symptom for the chat UI.
+    Yields ("specialty", name) as soon as that line is complete, ("confidence", level),
+    ("reasoning", text) chunks as tokens arrive, and finally ("done", result) with
+    the same dict analyze_symptom returns.
+    Groq streams first; Gemini is tried only if Groq fails before the specialty is known.
+    Both share one LLM_DEADLINE budget, so a failover never extends the wait.
+    """
+    cache_key = make_key(normalize_text(user_input, strip_punctuation=True))
+    cached = symptom_cache.get(cache_key)
+    if cached:
+        yield from _triage_events(cached)
+        return
+
+    prompt = _triage_prompt(user_input)
+    providers = [
+        ("groq", GROQ_MODEL, lambda timeout: _stream_groq(prompt, timeout, temperature=0.1)),
+        ("gemini", GEMINI_MODEL, lambda timeout: _stream_gemini(prompt, timeout)),
+    ]
+    end = time.monotonic() + LLM_DEADLINE
+    for name, model, stream in providers:
+        parser = TriageStreamParser()
+        start = time.monotonic()
+        if start >= end:
+            break
+        first_token, chars, chunks = None, 0, None
+        try:
+            chunks = stream(end - start)
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    first_token = time.monotonic() - start
+                    llm_router.latency_stats.record(f"{name}-first-token", first_token, ok=True)
+                chars += len(chunk)
+                yield from parser.feed(chunk)
+                # The provider's timeout is per read; a slow trickle must still stop at the deadline
+                if time.monotonic() >= end:
+                    raise TimeoutError(f"no complete answer within {LLM_DEADLINE}s")
+            yield from parser.close()
+            result = parser.result()
+        except Exception as e:
+            print(f"Error in streaming symptom analysis ({name}): {e}")
+            llm_router.latency_stats.record(f"{name}-stream", time.monotonic() - start, ok=False)
+            tracing.record(f"llm.{name}.stream", time.monotonic() - start, error=e, provider=name, model=model,
+                           prompt_chars=len(prompt), response_chars=chars)
+            if parser.specialty is None:
+                continue
+            # Already shown to the user, so finish with what arrived instead of switching provider
+            yield ("done", parser.result())
+            return
+        finally:
+            if chunks is not None:
+                chunks.close()
+        llm_router.latency_stats.record(f"{name}-stream", time.monotonic() - start, ok=True)
+        tracing.record(f"llm.{name}.stream", time.monotonic() - start, provider=name, model=model,
+                       prompt_chars=len(prompt), response_chars=chars,
+                       first_token_ms=round(first_token * 1000, 1) if first_token is not None else None)
+        symptom_cache.set(cache_key, result)
+        yield ("done", result)
+        return
+
+    yield from _triage_events(fallback_keyword_match(user_input))
+
 def fallback_keyword_match(user_input):
     """Fallback to simple keyword matching if AI fails"""
     symptom_map = {
@@ -151,12 +427,28 @@ def fallback_keyword_match(user_input):
         "success": False
     }
 
+def _dated_key(text, current_context):
+    """
+    Cache key for a reply that depends on "now": the text plus today's date from the
+    context, so it hits all day but never on a later one. The full context, with the
+    time, only counts for phrases like "in 2 hours".
+    """
+    today = re.search(r"\d{4}-\d{2}-\d{2}", current_context or "")
+    if today and not date_parser.depends_on_time_of_day(text):
+        return make_key(text, today.group(0))
+    return make_key(text, current_context)
+
 def parse_datetime_ai(user_input, current_context):
     """
     Uses Gemini AI to parse natural language date/time descriptions.
     current_context: String describing the current date/time (e.g. "Today is Saturday, Jan 24, 2026, 4:30 PM")
     Returns: A dictionary with 'date' (YYYY-MM-DD) and 'time' (HH:MM AM/PM) or None.
     """
+    cache_key = _dated_key(normalize_text(user_input), current_context)
+    cached = datetime_cache.get(cache_key)
+    if cached:
+        return cached
+
     try:
         prompt = f"""You are a date and time parsing assistant.
 Current Context: {current_context}
@@ -171,31 +463,8 @@ Convert the User Input into a standard format.
 Respond ONLY with a valid JSON object:
 {{"date": "YYYY-MM-DD" or null, "time": "HH:MM AM/PM" or null}}"""
 
-        # Try Groq First
-        try:
-            if not groq_client: raise Exception("Groq client not initialized")
-            response = groq_client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"}
-            )
-            result = response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Groq failed, falling back to Gemini: {e}")
-            response = gemini_client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=prompt
-            )
-            result = response.text.strip()
-
-        import json
-        # Clean up possible markdown code blocks for Gemini fallback
-        if result.startswith("```json"):
-            result = result.split("```json")[1].split("```")[0].strip()
-        elif result.startswith("```"):
-            result = result.split("```")[1].split("```")[0].strip()
-            
-        data = json.loads(result)
+        data = _ask_llm(prompt, _parse_json, response_format={"type": "json_object"})
+        datetime_cache.set(cache_key, data)
         return data
         
     except Exception as e:
@@ -208,7 +477,19 @@ def extract_entities(user_input):
     Uses Gemini AI to extract multiple entities from a user message.
     Entities: name, email, mobile, age, gender, symptoms, date, time.
     Returns: A dictionary with found entities.
+    Email, mobile, age and gender are parsed locally first; the LLM is only
+    called when the message holds something those patterns can't resolve.
     """
+    local, residual = nlu.extract_local(user_input)
+    if not residual:
+        return local
+
+    # Dates like "tomorrow" depend on today's date, so it is part of the key
+    cache_key = make_key(" ".join(str(user_input).split()), datetime.now().strftime("%Y-%m-%d"))
+    cached = entity_cache.get(cache_key)
+    if cached:
+        return {**cached, **local}
+
     try:
         prompt = f"""You are a medical receptionist assistant. 
 Extract as many of the following fields as possible from the User Input.
@@ -229,34 +510,87 @@ User Input: "{user_input}"
 
 Respond ONLY with a valid JSON object."""
 
-        # Try Groq First
-        try:
-            if not groq_client: raise Exception("Groq client not initialized")
-            response = groq_client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"}
-            )
-            result = response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Groq failed, falling back to Gemini: {e}")
-            response = gemini_client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=prompt
-            )
-            result = response.text.strip()
-
-        import json
-        result = result.strip()
-        # Clean up possible markdown code blocks for Gemini
-        if result.startswith("```json"):
-            result = result.split("```json")[1].split("```")[0].strip()
-        elif result.startswith("```"):
-            result = result.split("```")[1].split("```")[0].strip()
-            
-        data = json.loads(result)
-        return data
+        data = _ask_llm(prompt, _parse_json, response_format={"type": "json_object"})
+        if data:
+            entity_cache.set(cache_key, data)
+        return {**data, **local}
         
     except Exception as e:
         print(f"Error in entity extraction: {e}")
-        return {}
+        return local
+
+
+ENTITY_FIELDS = ["name", "email", "mobile", "age", "gender", "symptoms"]
+
+def _parse_turn(result):
+    """Splits the combined JSON reply into entities, triage and date/time."""
+    data = _parse_json(result)
+    entities = {k: data[k] for k in ENTITY_FIELDS if data.get(k)}
+
+    triage = None
+    if entities.get("symptoms"):
+        specialty = data.get("specialty")
+        triage = {
+            "specialty": specialty if specialty in SPECIALTIES else "Primary Care Doctor",
+            "confidence": data.get("confidence") or "Medium",
+            "reasoning": data.get("reasoning") or "",
+            "success": True
+        }
+
+    when = None
+    if data.get("date") or data.get("time"):
+        when = {"date": data.get("date"), "time": data.get("time")}
+
+    return {"entities": entities, "triage": triage, "datetime": when}
+
+def _turn_cache_key(user_input, current_context):
+    """Keys a turn on its text (case kept, as names are extracted) and today's date."""
+    return _dated_key(" ".join(str(user_input).split()), current_context)
+
+def analyze_turn(user_input, current_context):
+    """
+    Extracts entities, recommends a specialty and normalizes the requested
+    date/time from one message with a single JSON-mode LLM call.
+    current_context: String describing the current date/time (as for parse_datetime_ai).
+    Returns: {"entities": {...}, "triage": dict or None, "datetime": {"date", "time"} or None}.
+    triage is only set when the message describes symptoms.
+    """
+    local, residual = nlu.extract_local(user_input)
+    if not residual:
+        return {"entities": local, "triage": None, "datetime": None}
+
+    cache_key = _turn_cache_key(user_input, current_context)
+    cached = turn_cache.get(cache_key)
+    if cached:
+        return {**cached, "entities": {**cached["entities"], **local}}
+
+    try:
+        prompt = f"""You are a medical receptionist and triage assistant.
+Current Context: {current_context}
+User Input: "{user_input}"
+
+Extract these fields from the User Input:
+- name, email, mobile, age, gender, symptoms
+- date (YYYY-MM-DD) and time (HH:MM AM/PM) of the requested appointment, resolving relative terms like "tomorrow", "next Monday" or "5pm" against the Current Context
+- specialty: if symptoms are described, the most appropriate one of: {', '.join(SPECIALTIES)} ("Primary Care Doctor" if unclear)
+- confidence: High/Medium/Low for the specialty
+- reasoning: one sentence explaining the specialty
+
+Rules:
+- If the user spells out a word (e.g., "R A J N I S H"), join the letters into a single word ("rajnish").
+- For 'email', convert "at" to "@" and "dot" to ".", lowercase, no spaces.
+- For 'mobile', remove all non-digits. For 'age', extract only the number.
+- For 'gender', normalize to "Male", "Female", or "Transgender".
+- Dates mentioned only as symptom history (e.g., "since yesterday") are not the appointment date.
+- Use null for anything not present.
+
+Respond ONLY with a valid JSON object with the keys: name, email, mobile, age, gender, symptoms, date, time, specialty, confidence, reasoning."""
+
+        result = _ask_llm(prompt, _parse_turn, response_format={"type": "json_object"})
+        turn_cache.set(cache_key, result)
+        return {**result, "entities": {**result["entities"], **local}}
+
+    except Exception as e:
+        print(f"Error in AI turn analysis: {e}")
+        # Local fallbacks; symptoms are left for the symptoms step to analyze
+        return {"entities": local, "triage": None, "datetime": date_parser.parse_datetime_local(residual)}
@@ -0,0 +1,66 @@
+"""
+Tests for the two-tier AI result cache.
+"""
+import pytest
+import ai_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = ai_cache.ResultCache("ttl", ttl=60)
+    cache.set("k", {"answer": 1})
+    clock[0] += 59
+    assert cache.get("k") == {"answer": 1}
+    clock[0] += 2
+    assert cache.get("k", "gone") == "gone"
+    assert cache.stats()["size"] == 0
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ai_cache.ResultCache("lru", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ai_cache.ResultCache("disk", db_path=path).set("k", [1, 2])
+
+    # A fresh cache (e.g. after a restart) finds it on disk, then in memory
+    cache = ai_cache.ResultCache("disk", db_path=path)
+    assert cache.get("k") == [1, 2]
+    assert cache.stats()["size"] == 1
+    assert cache.get("k") == [1, 2]
+    assert cache.stats()["disk_hits"] == 1
+    assert ai_cache.ResultCache("other", db_path=path).get("k") is None
+
+
+def test_counts_hits_and_misses():
+    cache = ai_cache.ResultCache("stats")
+    assert cache.get("k") is None
+    cache.set("k", "v")
+    value = cache.get("k")
+    value_again = cache.get("k")
+    assert value == value_again == "v"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.667)
+
+
+def test_disk_tier_is_trimmed_to_its_bound(tmp_path, clock):
+    cache = ai_cache.ResultCache("trim", max_entries=1, max_db_entries=10, db_path=str(tmp_path / "c.sqlite3"))
+    for n in range(64):
+        clock[0] += 1
+        cache.set(str(n), n)
+    assert cache.stats()["evictions"] == 63 + 54
+    assert cache.get("0") is None and cache.get("63") == 63
@@ -0,0 +1,85 @@
+"""
+Offline tests for analyze_turn: parsing the combined reply, fallbacks and caching.
+"""
+import json
+import pytest
+import date_parser
+import symptom_analyzer
+
+MONDAY_9AM = "Now is Monday, 2030-01-07 09:00 AM"
+MONDAY_4PM = "Now is Monday, 2030-01-07 04:00 PM"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Answers every turn with `reply` from Groq and counts the calls."""
+    state = {"reply": {}, "calls": 0}
+
+    def groq(prompt, timeout, **options):
+        state["calls"] += 1
+        return json.dumps(state["reply"])
+
+    def gemini(prompt, timeout):
+        raise ConnectionError("gemini down")
+
+    monkeypatch.setattr(symptom_analyzer, "_ask_groq", groq)
+    monkeypatch.setattr(symptom_analyzer, "_ask_gemini", gemini)
+    symptom_analyzer.turn_cache.clear()
+    symptom_analyzer.datetime_cache.clear()
+    return state
+
+
+def test_parses_entities_triage_and_datetime(llm):
+    llm["reply"] = {"name": "Asha Rao", "age": None, "symptoms": "chest pain", "specialty": "Cardiologist",
+                    "confidence": "High", "reasoning": "Heart check.", "date": "2030-01-08", "time": "10:00 AM"}
+    result = symptom_analyzer.analyze_turn("I'm Asha Rao, chest pain, tomorrow 10am", MONDAY_9AM)
+    assert result["entities"] == {"name": "Asha Rao", "symptoms": "chest pain"}
+    assert result["triage"]["specialty"] == "Cardiologist" and result["triage"]["success"]
+    assert result["datetime"] == {"date": "2030-01-08", "time": "10:00 AM"}
+
+
+def test_unknown_specialty_and_no_symptoms(llm):
+    llm["reply"] = {"symptoms": "odd feeling", "specialty": "Astrologer"}
+    assert symptom_analyzer.analyze_turn("odd feeling", MONDAY_9AM)["triage"]["specialty"] == "Primary Care Doctor"
+    llm["reply"] = {"name": "Ravi"}
+    assert symptom_analyzer.analyze_turn("call me Ravi", MONDAY_9AM)["triage"] is None
+
+
+def test_falls_back_to_local_parsing_when_the_llm_fails(monkeypatch):
+    def broken(*args, **kwargs):
+        raise TimeoutError("timed out")
+    monkeypatch.setattr(symptom_analyzer, "_ask_groq", broken)
+    monkeypatch.setattr(symptom_analyzer, "_ask_gemini", broken)
+    symptom_analyzer.turn_cache.clear()
+    result = symptom_analyzer.analyze_turn("my email is a@b.co, tomorrow at 5pm", MONDAY_9AM)
+    assert result["entities"] == {"email": "a@b.co"} and result["triage"] is None
+    assert result["datetime"]["time"] == "05:00 PM"
+    assert symptom_analyzer.turn_cache.stats()["size"] == 0
+
+
+def test_same_message_is_cached_for_the_day(llm):
+    llm["reply"] = {"symptoms": "rash", "specialty": "Dermatologist"}
+    first = symptom_analyzer.analyze_turn("itchy  rash on my arm", MONDAY_9AM)
+    assert symptom_analyzer.analyze_turn("itchy rash on my arm", MONDAY_4PM) == first
+    assert llm["calls"] == 1
+    symptom_analyzer.analyze_turn("itchy rash on my arm", "Now is Tuesday, 2030-01-08 09:00 AM")
+    assert llm["calls"] == 2
+
+
+def test_time_relative_messages_are_keyed_on_the_time(llm):
+    llm["reply"] = {"date": "2030-01-07", "time": "11:00 AM"}
+    symptom_analyzer.analyze_turn("book me in two hours", MONDAY_9AM)
+    symptom_analyzer.analyze_turn("book me in two hours", MONDAY_4PM)
+    assert llm["calls"] == 2
+    assert date_parser.depends_on_time_of_day("as soon as possible, ASAP")
+    assert not date_parser.depends_on_time_of_day("next monday at 10am")
+
+
+def test_parse_datetime_ai_is_cached_per_day(llm):
+    llm["reply"] = {"date": "2030-01-08", "time": None}
+    assert symptom_analyzer.parse_datetime_ai("Tomorrow", MONDAY_9AM) == {"date": "2030-01-08", "time": None}
+    symptom_analyzer.parse_datetime_ai("tomorrow", MONDAY_4PM)
+    assert llm["calls"] == 1
+    # "Tomorrow" means another day on Tuesday
+    symptom_analyzer.parse_datetime_ai("tomorrow", "Now is Tuesday, 2030-01-08 09:00 AM")
+    assert llm["calls"] == 2
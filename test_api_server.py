@@ -0,0 +1,189 @@
+"""
+Tests for the async booking API, served in-process against stub services.
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer
+import api_server
+from bench_engine import stub_services
+
+
+class StubTTS:
+    def get_audio_b64(self, text, lang="en", tld="co.in"):
+        return "bXAz"
+
+
+SECRET = "test-secret"
+BODY = {"email": "a@b.co", "name": "A", "mobile": "9876543210", "age": "30", "gender": "male",
+        "symptoms": "cough", "doctor": "Dr. Asha Rao", "date": "2030-01-07", "time": "10:00 AM"}
+
+
+def _auth(email="a@b.co"):
+    return {"Authorization": "Bearer " + api_server.issue_token(email, SECRET)}
+
+
+def _client(sent=None, appointments=True):
+    services = stub_services(sent)
+    api = api_server.BookingAPI(services, tts=StubTTS(), transcribe=lambda audio: audio.decode() or None,
+                                appointments=appointments, token_secret=SECRET)
+    # Requests act as patient a@b.co unless they pass other headers
+    return TestClient(TestServer(api_server.create_app(api)), headers=_auth()), services
+
+
+def _run(scenario, **options):
+    async def main():
+        client, services = _client(**options)
+        async with client:
+            await scenario(client, services)
+    asyncio.run(main())
+
+
+def test_conversation_over_http():
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    async def scenario(client, services):
+        resp = await client.post("/sessions?audio=1")
+        assert resp.status == 201
+        start = await resp.json()
+        assert start["step"] == "options" and start["audio_b64"] == "bXAz"
+        sid = start["session_id"]
+
+        for text in ["1", "Asha Rao", "asha@example.com", "9876543210", "34", "female", "fever", "1", tomorrow]:
+            resp = await client.post(f"/sessions/{sid}/turns", json={"text": text})
+            assert resp.status == 200
+        # Spoken answer for the offered slot, as raw audio
+        resp = await client.post(f"/sessions/{sid}/turns?audio=1", data=b"1", headers={"Content-Type": "audio/webm"})
+        reply = await resp.json()
+        assert reply["transcript"] == "1" and reply["step"] == "confirm_appointment" and reply["audio_b64"]
+
+        resp = await client.post(f"/sessions/{sid}/turns", json={"text": "yes"})
+        reply = await resp.json()
+        assert reply["messages"][0]["content"].startswith("Booked successfully!") and reply["step"] is None
+
+    _run(scenario)
+
+
+def test_websocket_turns_and_unknown_session():
+    async def scenario(client, services):
+        sid = (await (await client.post("/sessions")).json())["session_id"]
+        async with client.ws_connect(f"/sessions/{sid}/ws") as ws:
+            await ws.send_str("1")
+            reply = await ws.receive_json()
+            assert reply["step"] == "name" and reply["speak"] == "What's your full name?"
+            await ws.send_bytes(b"")
+            assert (await ws.receive_json())["error"] == "Could not understand the audio"
+        assert (await client.get("/sessions/nope")).status == 404
+
+    _run(scenario)
+
+
+def test_turn_text_must_be_a_string():
+    async def scenario(client, services):
+        sid = (await (await client.post("/sessions")).json())["session_id"]
+        for body in ({"text": 5}, {"text": ["x"]}, {"text": ""}, ["x"]):
+            assert (await client.post(f"/sessions/{sid}/turns", json=body)).status == 400
+        async with client.ws_connect(f"/sessions/{sid}/ws") as ws:
+            await ws.send_str('{"text": 5}')
+            assert "error" in await ws.receive_json()
+            await ws.send_str("1")
+            assert (await ws.receive_json())["step"] == "name"
+
+    _run(scenario)
+
+
+def test_websocket_reports_a_session_that_expires_while_open():
+    async def scenario(client, services):
+        conversations = client.server.app[api_server.API].conversations
+        sid = (await (await client.post("/sessions")).json())["session_id"]
+        async with client.ws_connect(f"/sessions/{sid}/ws") as ws:
+            conversations._sessions[sid][2] = 0  # idle past its TTL
+            conversations.expire()
+            await ws.send_str("1")
+            assert (await ws.receive_json())["error"] == "Unknown or expired session"
+            assert (await ws.receive()).type.name in ("CLOSE", "CLOSED")
+
+    _run(scenario)
+
+
+def test_book_endpoint_reports_conflicts():
+    body = BODY
+
+    async def scenario(client, services):
+        assert (await client.post("/appointments", json=body)).status == 201
+        resp = await client.post("/appointments", json={**body, "time": "10:10 AM"})
+        assert resp.status == 409
+        # Only the clashing slot, none of the other booking's patient details
+        assert (await resp.json())["conflict"] == {"doctor": "Dr. Asha Rao", "appointment_date": "2030-01-07", "appointment_time": "10:00 AM"}
+        resp = await client.get("/slots", params={"doctor": "Dr. Asha Rao", "date_from": "2030-01-07", "n": "1"})
+        assert await resp.json() == [{"date": "2030-01-07", "time": "09:00 AM"}]
+        assert (await client.post("/appointments", json={"email": "a@b.co"})).status == 400
+
+    _run(scenario)
+
+
+def test_reschedule_checks_conflicts():
+    body = BODY
+
+    async def scenario(client, services):
+        first = (await (await client.post("/appointments", json=body)).json())["appointment"]["id"]
+        await client.post("/appointments", json={**body, "time": "11:00 AM"})
+        resp = await client.patch(f"/appointments/{first}", json={"date": "2030-01-07", "time": "10:50 AM"})
+        assert resp.status == 409
+        # Moving within its own window is fine
+        resp = await client.patch(f"/appointments/{first}", json={"date": "2030-01-07", "time": "10:10 AM"})
+        assert resp.status == 200 and (await resp.json())["appointment"]["appointment_time"] == "10:10 AM"
+        assert (await client.patch(f"/appointments/{first}", json={"date": "2030-01-07", "time": "noon"})).status == 400
+        assert (await client.patch("/appointments/999", json={"date": "2030-01-07", "time": "09:00 AM"})).status == 404
+
+    _run(scenario)
+
+
+def test_malformed_dates_and_times_are_rejected():
+    body = BODY
+
+    async def scenario(client, services):
+        for bad in ({"time": "25:99"}, {"date": "07/01/2030"}):
+            resp = await client.post("/appointments", json={**body, **bad})
+            assert resp.status == 400
+        slots = {"doctor": "Dr. Asha Rao", "date_from": "2030-01-07"}
+        assert (await client.get("/slots", params={**slots, "date_to": "2031-01-07"})).status == 400
+        assert (await client.get("/slots", params={**slots, "date_to": "2030-01-06"})).status == 400
+        resp = await client.get("/slots", params={**slots, "n": "100000"})
+        assert len(await resp.json()) == api_server.MAX_SLOTS
+
+    _run(scenario)
+
+
+def test_appointments_need_the_patients_token():
+    async def scenario(client, services):
+        first = (await (await client.post("/appointments", json=BODY)).json())["appointment"]["id"]
+        assert len(await (await client.get("/appointments")).json()) == 1
+
+        assert (await client.get("/appointments", headers={"Authorization": ""})).status == 401
+        assert (await client.get("/appointments", headers={"Authorization": "Bearer forged.token"})).status == 401
+        expired = api_server.issue_token("a@b.co", SECRET, ttl=-1)
+        assert (await client.get("/appointments", headers={"Authorization": "Bearer " + expired})).status == 401
+        other = _auth("eve@example.com")
+        assert await (await client.get("/appointments", headers=other)).json() == []
+        assert (await client.get("/appointments", params={"email": "a@b.co"}, headers=other)).status == 403
+        assert (await client.post("/appointments", json={**BODY, "time": "03:00 PM"}, headers=other)).status == 403
+        patch = {"date": "2030-01-08", "time": "09:00 AM"}
+        assert (await client.patch(f"/appointments/{first}", json=patch, headers=other)).status == 404
+        assert (await client.delete(f"/appointments/{first}", headers=other)).status == 404
+        assert await (await client.delete(f"/appointments/{first}")).json() == {"cancelled": 1}
+
+    _run(scenario)
+
+
+def test_appointment_routes_are_off_by_default():
+    async def scenario(client, services):
+        assert (await client.get("/appointments")).status == 404
+        assert (await client.post("/appointments", json=BODY)).status in (404, 405)
+        assert (await client.get("/slots", params={"doctor": "Dr. Asha Rao", "date_from": "2030-01-07"})).status == 200
+
+    _run(scenario, appointments=False)
+    with pytest.raises(ValueError):
+        api_server.BookingAPI(stub_services(), appointments=True, token_secret=None)
@@ -0,0 +1,105 @@
+"""
+Tests for the book_if_free SQL function against a real Postgres.
+Set DATABASE_URL (e.g. postgresql://postgres@localhost/postgres) to run them;
+they create and drop their own schema. Skipped when unset.
+"""
+import os
+import json
+import threading
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+DATABASE_URL = os.environ.get("DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL not set")
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+SCHEMA = "book_if_free_test"
+
+# Mirrors the Supabase appointments table
+BASE_TABLE = """
+create table appointments (
+    id bigint generated by default as identity primary key,
+    created_at timestamptz default now(),
+    email text, name text, mobile text, age integer, gender text, symptoms text,
+    doctor text, appointment_date date, appointment_time text
+)
+"""
+
+
+def _connect():
+    conn = psycopg.connect(DATABASE_URL, autocommit=True)
+    conn.execute(f"set search_path to {SCHEMA}, public")
+    return conn
+
+
+@pytest.fixture
+def db():
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f"drop schema if exists {SCHEMA} cascade")
+        admin.execute(f"create schema {SCHEMA}")
+    conn = _connect()
+    conn.execute(BASE_TABLE)
+    for name in sorted(os.listdir(SQL_DIR)):
+        with open(os.path.join(SQL_DIR, name)) as f:
+            conn.execute(f.read())
+    yield conn
+    conn.close()
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f"drop schema {SCHEMA} cascade")
+
+
+def _book(conn, time, doctor="Dr. A", email="p@example.com", key=None):
+    appt = {"email": email, "name": "P", "mobile": "9876543210", "age": 30, "gender": "Female",
+            "symptoms": "fever", "doctor": doctor, "appointment_date": "2026-02-10",
+            "appointment_time": time, "idempotency_key": key or f"{email}|{doctor}|{time}"}
+    return conn.execute("select book_if_free(%s::jsonb)", [json.dumps(appt)]).fetchone()[0]
+
+
+def test_books_free_slot_and_reports_conflict(db):
+    first = _book(db, "10:00 AM")
+    assert first["status"] == "booked" and first["appointment"]["id"]
+
+    clash = _book(db, "10:10 AM", email="q@example.com")
+    assert clash["status"] == "conflict"
+    assert clash["conflict"]["id"] == first["appointment"]["id"]
+
+    assert _book(db, "10:20 AM", email="q@example.com")["status"] == "booked"
+    assert _book(db, "10:10 AM", doctor="Dr. B")["status"] == "booked"
+
+
+def test_retry_returns_the_same_row(db):
+    first = _book(db, "11:00 AM", key="k1")
+    again = _book(db, "11:00 AM", key="k1")
+    assert again == first
+
+
+def test_rebooking_a_rescheduled_slot_inserts_a_new_row(db):
+    first = _book(db, "03:00 PM", key="k2")
+    moved = db.execute("select bulk_reschedule(%s::jsonb)", [json.dumps([
+        {"id": first["appointment"]["id"], "appointment_date": "2026-02-11", "appointment_time": "03:00 PM"}])]).fetchone()[0]
+    assert moved[0]["status"] == "rescheduled"
+    again = _book(db, "03:00 PM", key="k2")
+    assert again["status"] == "booked" and again["appointment"]["id"] != first["appointment"]["id"]
+
+
+def test_exclusion_constraint_blocks_plain_inserts(db):
+    if not db.execute("select 1 from pg_extension where extname = 'btree_gist'").fetchone():
+        pytest.skip("btree_gist not installed on this server")
+    _book(db, "09:00 AM")
+    with pytest.raises(psycopg.errors.ExclusionViolation):
+        db.execute("insert into appointments (doctor, appointment_date, appointment_time) "
+                   "values ('Dr. A', '2026-02-10', '09:15 AM')")
+
+
+def test_concurrent_bookings_of_one_slot_yield_one_winner(db):
+    results, barrier = [], threading.Barrier(8)
+
+    def worker(i):
+        with _connect() as conn:
+            barrier.wait()
+            results.append(_book(conn, "02:00 PM", email=f"p{i}@example.com")["status"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert sorted(results) == ["booked"] + ["conflict"] * 7
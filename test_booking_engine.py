@@ -0,0 +1,92 @@
+"""
+Tests for the headless booking engine, driven with the stub services from bench_engine.
+"""
+from datetime import datetime, timedelta
+import booking_engine
+from bench_engine import stub_services
+
+
+def _play(session, services, turns):
+    return [booking_engine.handle(session, text, services) for text in turns]
+
+
+def _tomorrow():
+    return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def test_full_booking():
+    sent = []
+    services = stub_services(sent)
+    session = booking_engine.Session()
+    assert booking_engine.start(session) and session.step == "options"
+    replies = _play(session, services, ["1", "Asha Rao", "asha@example.com", "9876543210", "34", "female",
+                                        "fever and body ache", "1", _tomorrow(), "1"])
+    assert session.step == "confirm_appointment"
+    assert session.details["appointment_time"] == "09:00 AM"
+    assert replies[-1].speak == "Ready to book?"
+
+    reply = booking_engine.handle(session, "yes", services)
+    assert reply.messages[0]["content"].startswith("Booked successfully! ID: APPT-1")
+    assert session.step is None and session.details == {}
+    assert sent == [("asha@example.com", "Appointment Confirmation - APPT-1")]
+
+
+def test_invalid_mobile_is_an_error():
+    services = stub_services()
+    session = booking_engine.Session({"step": "mobile", "messages": [], "appointment_details": {"name": "A", "email": "a@b.co"}})
+    reply = booking_engine.handle(session, "12345", services)
+    assert reply.error == "Invalid mobile number." and session.step == "mobile"
+
+
+def test_conflict_at_confirm_offers_other_slots():
+    services = stub_services()
+    date = _tomorrow()
+    services.db.book_if_free("x@y.z", "X", "9999999999", 40, "male", "cough", "Dr. Asha Rao", date, "09:00 AM")
+    details = {"name": "A", "email": "a@b.co", "mobile": "9876543210", "age": "30", "gender": "male", "symptoms": "cough",
+               "selected_doctor": "Dr. Asha Rao", "appointment_date": date, "appointment_time": "09:10 AM"}
+    session = booking_engine.Session({"step": "confirm_appointment", "messages": [], "appointment_details": details})
+
+    reply = booking_engine.handle(session, "yes", services)
+    assert session.step == "appointment_time" and "appointment_time" not in session.details
+    assert reply.messages[0]["content"].startswith("Sorry, Dr. Asha Rao already has a booking at 09:00 AM. Next free slots:")
+    assert session.state["slot_offers"][0] == (date, "09:20 AM")
+
+
+def _offered_slots(services):
+    date = _tomorrow()
+    details = {"name": "A", "email": "a@b.co", "mobile": "9876543210", "age": "30", "gender": "male", "symptoms": "cough",
+               "selected_doctor": "Dr. Asha Rao", "appointment_date": date}
+    session = booking_engine.Session({"step": "appointment_time", "messages": [], "appointment_details": details})
+    booking_engine.offer_free_slots(booking_engine.Turn(session, services, ""))
+    return session
+
+
+def test_only_a_bare_pick_selects_an_offered_slot():
+    services = stub_services()
+    for text, expected in [("2", "09:20 AM"), ("option 3", "09:40 AM"), ("the second one", "09:20 AM"),
+                           ("at 5", "05:00 PM"), ("half past 4", "04:30 PM")]:
+        session = _offered_slots(services)
+        booking_engine.handle(session, text, services)
+        assert session.details.get("appointment_time") == expected, text
+
+    session = _offered_slots(services)
+    booking_engine.handle(session, "I want to cancel", services)
+    assert "appointment_time" not in session.details and session.step == "appointment_time"
+
+
+def test_ai_time_parsing_gets_the_date():
+    services = stub_services()
+    contexts = []
+    services.analyzer.parse_datetime_ai = lambda text, context: contexts.append(context)
+    session = _offered_slots(services)
+    booking_engine.handle(session, "sometime after lunch", services)
+    assert contexts and services.now().strftime("%Y-%m-%d") in contexts[0]
+
+
+if __name__ == "__main__":
+    test_full_booking()
+    test_invalid_mobile_is_an_error()
+    test_conflict_at_confirm_offers_other_slots()
+    test_only_a_bare_pick_selects_an_offered_slot()
+    test_ai_time_parsing_gets_the_date()
+    print("✅ Booking engine tests passed")
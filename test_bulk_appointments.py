@@ -0,0 +1,261 @@
+"""
+Offline tests for the bulk appointment helpers in database.py.
+FakeClient mimics the supabase-py query builder calls they use and counts round trips.
+"""
+from types import SimpleNamespace
+import database
+
+
+class OverlapError(Exception):
+    """What PostgREST raises when appointments_no_overlap refuses a statement."""
+    code = "23P01"
+
+
+class FakeQuery:
+    def __init__(self, client, action, payload=None, **options):
+        self.client, self.action, self.payload, self.options = client, action, payload, options
+        self.filters = []
+
+    def eq(self, col, val):
+        self.filters.append(lambda r: str(r.get(col)) == str(val)); return self
+
+    def gte(self, col, val):
+        self.filters.append(lambda r: r.get(col) >= val); return self
+
+    def lte(self, col, val):
+        self.filters.append(lambda r: r.get(col) <= val); return self
+
+    def in_(self, col, vals):
+        vals = {str(v) for v in vals}
+        self.filters.append(lambda r: str(r.get(col)) in vals); return self
+
+    def execute(self):
+        client = self.client
+        client.round_trips += 1
+        if client.fail_next:
+            client.fail_next -= 1
+            raise ConnectionError("connection reset")
+        items = self.payload["changes"] if self.action == "rpc" else self.payload or []
+        if any(item.get("appointment_time") in client.taken for item in items):
+            raise OverlapError("conflicting key value violates exclusion constraint \"appointments_no_overlap\"")
+        if self.action == "upsert":
+            keys = {r.get("idempotency_key") for r in client.rows}
+            created = []
+            for row in self.payload:
+                if row["idempotency_key"] not in keys:
+                    client.next_id += 1
+                    created.append(dict(row, id=client.next_id))
+                    keys.add(row["idempotency_key"])
+            client.rows += created
+            return SimpleNamespace(data=created)
+        if self.action == "delete":
+            hit = [r for r in client.rows if all(f(r) for f in self.filters)]
+            client.rows = [r for r in client.rows if r not in hit]
+            return SimpleNamespace(data=hit)
+        if self.action == "rpc":
+            out = []
+            for change in self.payload["changes"]:
+                row = next((r for r in client.rows if r["id"] == change["id"]), None)
+                if row:
+                    row.update(change)
+                    out.append({"id": row["id"], "status": "rescheduled", "doctor": row["doctor"],
+                                "appointment_date": row["appointment_date"], "appointment_time": row["appointment_time"]})
+                else:
+                    out.append({"id": change["id"], "status": "not_found", "doctor": None,
+                                "appointment_date": None, "appointment_time": None})
+            return SimpleNamespace(data=out)
+
+
+class FakeTable:
+    def __init__(self, client):
+        self.client = client
+
+    def upsert(self, rows, **options):
+        return FakeQuery(self.client, "upsert", rows, **options)
+
+    def delete(self):
+        return FakeQuery(self.client, "delete")
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows, self.next_id, self.round_trips, self.fail_next = [], 0, 0, 0
+        self.taken = set()  # appointment times the exclusion constraint refuses
+
+    def table(self, name):
+        return FakeTable(self)
+
+    def rpc(self, name, params):
+        return FakeQuery(self, "rpc", params)
+
+
+def _rows(n, doctor="Dr. A", date="2026-02-10"):
+    return [{"email": f"p{i}@example.com", "name": f"P{i}", "mobile": "9876543210", "age": 30, "gender": "Female",
+             "symptoms": "fever", "doctor": doctor, "appointment_date": date, "appointment_time": f"{9 + i % 8:02d}:00 AM"}
+            for i in range(n)]
+
+
+def _use_fake(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    database.slot_index.invalidate()
+    return client
+
+
+def test_bulk_insert_batches_and_is_idempotent(monkeypatch):
+    client = _use_fake(monkeypatch)
+    rows = _rows(1200)
+    results = database.add_appointments(rows)
+    assert [r["status"] for r in results] == ["created"] * 1200
+    assert client.round_trips == 3  # 500 + 500 + 200
+
+    # Retrying the same import creates nothing new
+    again = database.add_appointments(rows)
+    assert {r["status"] for r in again} == {"duplicate"}
+    assert len(client.rows) == 1200
+
+
+def test_bulk_insert_retries_and_reports_duplicates_in_input(monkeypatch):
+    client = _use_fake(monkeypatch)
+    client.fail_next = 1
+    rows = _rows(2)
+    results = database.add_appointments(rows + [rows[0]])
+    assert [r["status"] for r in results] == ["created", "created", "duplicate"]
+    assert len(client.rows) == 2
+
+
+def test_retries_back_off_exponentially_with_jitter(monkeypatch):
+    client = _use_fake(monkeypatch)
+    sleeps = []
+    monkeypatch.setattr(database.time, "sleep", sleeps.append)
+    monkeypatch.setattr(database.random, "uniform", lambda low, high: high)
+    client.fail_next = database.BULK_RETRIES
+    assert database.add_appointments(_rows(1))[0]["status"] == "created"
+    assert sleeps == [database.RETRY_BASE_DELAY, database.RETRY_BASE_DELAY * 2]
+
+    # Out of retries: no sleep after the last attempt
+    sleeps.clear()
+    client.fail_next = database.BULK_RETRIES + 1
+    assert database.add_appointments(_rows(2))[1]["status"] == "error"
+    assert len(sleeps) == database.BULK_RETRIES
+
+
+def test_constraint_errors_are_not_retried_and_split_the_batch(monkeypatch):
+    client = _use_fake(monkeypatch)
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    client.taken = {"10:00 AM"}
+    results = database.add_appointments(_rows(3))  # 09:00, 10:00 and 11:00
+    assert [r["status"] for r in results] == ["created", "conflict", "created"]
+    assert client.round_trips == 4  # the batch once, then one per row, no retries
+
+    client.round_trips = 0
+    ids = [r["id"] for r in results if r["id"]]
+    moved = database.reschedule_appointments([{"id": ids[0], "appointment_date": "2026-02-11", "appointment_time": "10:00 AM"},
+                                              {"id": ids[1], "appointment_date": "2026-02-11", "appointment_time": "02:00 PM"}])
+    assert [r["status"] for r in moved] == ["conflict", "rescheduled"]
+    assert client.round_trips == 3
+
+
+def test_cancel_by_filter_and_by_ids(monkeypatch):
+    client = _use_fake(monkeypatch)
+    database.add_appointments(_rows(5, date="2026-02-10") + _rows(5, doctor="Dr. B", date="2026-02-11"))
+    closed = database.cancel_appointments(doctor="Dr. B", date_from="2026-02-11", date_to="2026-02-12")
+    assert len(closed) == 5 and {r["status"] for r in closed} == {"cancelled"}
+
+    results = database.cancel_appointments(ids=[1, 2, 999])
+    assert [(r["id"], r["status"]) for r in results] == [(1, "cancelled"), (2, "cancelled"), (999, "not_found")]
+    assert len(client.rows) == 3
+
+
+def test_cancel_requires_a_filter(monkeypatch):
+    _use_fake(monkeypatch)
+    try:
+        database.cancel_appointments()
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_bulk_reschedule_reports_per_row(monkeypatch):
+    client = _use_fake(monkeypatch)
+    database.add_appointments(_rows(3))
+    results = database.reschedule_appointments([
+        {"id": 1, "appointment_date": "2026-02-12", "appointment_time": "11:00 AM", "doctor": "Dr. C"},
+        {"id": 42, "appointment_date": "2026-02-12", "appointment_time": "11:00 AM"},
+    ])
+    assert [r["status"] for r in results] == ["rescheduled", "not_found"]
+    assert client.rows[0]["doctor"] == "Dr. C"
+    assert client.round_trips == 2  # one insert, one RPC
+
+
+def test_reschedule_if_free_refuses_a_clash(monkeypatch):
+    from stand_ins import FakeSupabase
+    supabase = FakeSupabase()
+    monkeypatch.setattr(database, "get_client", lambda: supabase)
+    database.slot_index.invalidate()
+    for email, t in (("a@example.com", "10:00 AM"), ("b@example.com", "11:00 AM")):
+        supabase.insert_row("appointments", {"email": email, "doctor": "Dr. A", "appointment_date": "2099-01-01", "appointment_time": t})
+
+    assert database.reschedule_if_free(1, "2099-01-01", "10:50 AM")["status"] == "conflict"
+    assert database.reschedule_if_free(1, "2099-01-01", "10:10 AM", email="b@example.com") == {"status": "not_found"}
+    moved = database.reschedule_if_free(1, "2099-01-01", "10:10 AM", email="A@example.com")
+    assert moved["status"] == "rescheduled" and moved["appointment"]["appointment_time"] == "10:10 AM"
+
+
+def test_rebooking_a_vacated_slot_creates_a_new_booking(monkeypatch):
+    from stand_ins import FakeSupabase
+    supabase = FakeSupabase()
+    monkeypatch.setattr(database, "get_client", lambda: supabase)
+    database.slot_index.invalidate()
+    patient = ("a@example.com", "A", "9876543210", 30, "Female", "fever", "Dr. A", "2099-01-01")
+
+    for move in (lambda i: database.reschedule_if_free(i, "2099-01-02", "10:00 AM"),
+                 lambda i: database.reschedule_appointment(i, "2099-01-03", "10:00 AM"),
+                 lambda i: database.reschedule_appointments([{"id": i, "appointment_date": "2099-01-04",
+                                                              "appointment_time": "10:00 AM"}])):
+        first = database.book_if_free(*patient, "10:00 AM")
+        move(first["appointment"]["id"])
+        again = database.book_if_free(*patient, "10:00 AM")
+        assert again["status"] == "booked" and again["appointment"]["id"] != first["appointment"]["id"]
+    # Each round moves the previous round's new booking, so one row per round plus the first
+    assert len(supabase.tables["appointments"]) == 4
+
+
+def test_writes_keep_the_slot_index_current(monkeypatch):
+    from stand_ins import FakeSupabase
+    from slot_index import SlotIndex
+    supabase = FakeSupabase()
+    monkeypatch.setattr(database, "get_client", lambda: supabase)
+    # Cached days never age out, so only the writes themselves can refresh them
+    monkeypatch.setattr(database, "slot_index", SlotIndex(database._load_day_bookings, max_age=None))
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    day, other_day = "2099-01-01", "2099-01-02"
+    free = lambda date, t: database.check_availability(date, t, "Dr. A")
+    patient = ("a@example.com", "A", "9876543210", 30, "Female", "fever", "Dr. A")
+    assert free(day, "10:00 AM") and free(other_day, "10:00 AM")
+
+    booked = database.book_if_free(*patient, day, "10:00 AM")["appointment"]
+    assert not free(day, "10:00 AM")
+    database.book_if_free(*patient, day, "10:00 AM")  # a replay returns the same row
+    database.reschedule_if_free(booked["id"], other_day, "10:00 AM")
+    assert free(day, "10:00 AM") and not free(other_day, "10:00 AM")
+    database.reschedule_appointment(booked["id"], day, "11:00 AM")
+    assert free(other_day, "10:00 AM") and not free(day, "11:00 AM")
+    database.reschedule_appointments([{"id": booked["id"], "appointment_date": other_day, "appointment_time": "02:00 PM"}])
+    assert free(day, "11:00 AM") and not free(other_day, "02:00 PM")
+    database.cancel_appointment(booked["id"])
+    assert free(other_day, "02:00 PM")
+
+    created = database.add_appointments([dict(zip(database.APPOINTMENT_FIELDS, (*patient, day, "03:00 PM")))])
+    assert not free(day, "03:00 PM")
+    database.cancel_appointments(ids=[created[0]["id"]])
+    assert free(day, "03:00 PM")
+
+    # A booking whose response was lost may still have landed: the day is reloaded
+    supabase.insert_row("appointments", {"email": "b@example.com", "doctor": "Dr. A", "appointment_date": day,
+                                         "appointment_time": "04:00 PM"})
+    def lost(name, params):
+        raise ConnectionError("connection reset")
+    monkeypatch.setattr(supabase, "rpc", lost)
+    assert database.book_if_free(*patient, day, "09:00 AM") is None
+    assert not free(day, "04:00 PM")
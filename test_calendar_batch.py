@@ -0,0 +1,113 @@
+"""
+Offline tests for calendar_utils using a fake HTTP transport.
+FakeCalendarHttp answers single and batch event inserts like the Calendar API would.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import Parser
+import calendar_utils
+
+
+class FakeResponse(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = "OK" if status < 300 else "Error"
+        self["status"] = str(status)
+
+
+class FakeCalendarHttp:
+    """Stands in for httplib2.Http; records every round trip."""
+
+    def __init__(self, fail_summaries=()):
+        self.round_trips = 0
+        self.inserted = []
+        self.fail_summaries = set(fail_summaries)
+
+    def _insert(self, body):
+        event = json.loads(body)
+        if event["summary"] in self.fail_summaries:
+            return 403, {"error": {"code": 403, "message": "accessNotConfigured"}}
+        event["id"] = f"evt{len(self.inserted)}"
+        event["htmlLink"] = f"https://calendar.example/{event['id']}"
+        self.inserted.append(event)
+        return 200, event
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        self.round_trips += 1
+        headers = headers or {}
+        if "/batch/" not in uri:
+            status, payload = self._insert(body)
+            return FakeResponse(status, {"content-type": "application/json"}), json.dumps(payload).encode()
+
+        message = Parser().parsestr(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        boundary = "fake_batch_boundary"
+        parts = []
+        for part in message.get_payload():
+            inner = part.get_payload()
+            inner_body = inner.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in inner else inner.split("\n\n", 1)[1]
+            status, payload = self._insert(inner_body)
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Forbidden'}\r\n"
+                f"Content-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--"
+        resp = FakeResponse(200, {"content-type": f'multipart/mixed; boundary="{boundary}"'})
+        return resp, content.encode()
+
+
+def _appointments(n):
+    return [
+        {"doctor_name": f"Dr. {i}", "patient_email": f"p{i}@example.com",
+         "appointment_date": "2026-02-10", "appointment_time": "10:00 AM"}
+        for i in range(n)
+    ]
+
+
+def test_batch_insert_uses_few_round_trips():
+    http = FakeCalendarHttp()
+    service = calendar_utils.get_calendar_service(http=http)
+    results = calendar_utils.create_appointment_events(_appointments(120), service=service)
+    assert results == [True] * 120
+    assert len(http.inserted) == 120
+    assert http.round_trips == 3  # 50 + 50 + 20
+
+
+def test_batch_reports_per_event_errors():
+    http = FakeCalendarHttp(fail_summaries={"Appointment with Dr. 1"})
+    service = calendar_utils.get_calendar_service(http=http)
+    appts = _appointments(3) + [dict(_appointments(1)[0], appointment_time="not a time")]
+    results = calendar_utils.create_appointment_events(appts, service=service)
+    assert results == [True, "API_DISABLED", True, False]
+
+
+def test_service_is_cached_per_thread_until_reset(monkeypatch, tmp_path):
+    from googleapiclient import discovery
+    credentials_file = tmp_path / "credentials.json"
+    credentials_file.write_text("{}")
+    monkeypatch.setattr(calendar_utils, "SERVICE_ACCOUNT_FILE", str(credentials_file))
+    monkeypatch.setattr(calendar_utils, "_get_credentials", lambda: None)
+    monkeypatch.setattr(discovery, "build_from_document", lambda doc, **kwargs: object())
+    worker = ThreadPoolExecutor(max_workers=1)
+    try:
+        calendar_utils.reset_calendar_service()
+        mine = calendar_utils.get_calendar_service()
+        theirs = worker.submit(calendar_utils.get_calendar_service).result()
+        assert calendar_utils.get_calendar_service() is mine and theirs is not mine
+        assert worker.submit(calendar_utils.get_calendar_service).result() is theirs
+
+        # A reset from one thread makes every thread rebuild
+        calendar_utils.reset_calendar_service()
+        assert worker.submit(calendar_utils.get_calendar_service).result() is not theirs
+        assert calendar_utils.get_calendar_service() is not mine
+    finally:
+        worker.shutdown()
+        calendar_utils.reset_calendar_service()
+
+
+if __name__ == "__main__":
+    test_batch_insert_uses_few_round_trips()
+    test_batch_reports_per_event_errors()
+    print("✅ Calendar batch tests passed")
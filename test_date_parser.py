@@ -0,0 +1,90 @@
+from datetime import datetime
+import date_parser
+
+# Reference "now": Saturday, 24 Jan 2026, 4:30 PM
+NOW = datetime(2026, 1, 24, 16, 30)
+
+# (input, expected date, expected time); None/None means the parser should defer to the LLM
+CASES = [
+    ("tomorrow", "2026-01-25", None),
+    ("Tomorrow please", "2026-01-25", None),
+    ("today", "2026-01-24", None),
+    ("day after tomorrow", "2026-01-26", None),
+    ("next Monday", "2026-01-26", None),
+    ("monday", "2026-01-26", None),
+    ("this saturday", "2026-01-24", None),
+    ("on friday", "2026-01-30", None),
+    ("coming wednesday", "2026-01-28", None),
+    ("in 3 days", "2026-01-27", None),
+    ("in a week", "2026-01-31", None),
+    ("after two days", "2026-01-26", None),
+    ("25th january", "2026-01-25", None),
+    ("20th january", "2027-01-20", None),
+    ("30th Jan", "2026-01-30", None),
+    ("jan 30", "2026-01-30", None),
+    ("February 2nd 2026", "2026-02-02", None),
+    ("the 28th", "2026-01-28", None),
+    ("5th", "2026-02-05", None),
+    ("28/01", "2026-01-28", None),
+    ("2026-02-10", "2026-02-10", None),
+    ("30th february", None, None),
+    ("in 2 hours", "2026-01-24", "06:30 PM"),
+    ("in 45 minutes", "2026-01-24", "05:15 PM"),
+    ("in half an hour", "2026-01-24", "05:00 PM"),
+    ("5 in the evening", None, "05:00 PM"),
+    ("five in the evening", None, "05:00 PM"),
+    ("10 in the morning", None, "10:00 AM"),
+    ("noon", None, "12:00 PM"),
+    ("at noon", None, "12:00 PM"),
+    ("midnight", None, "12:00 AM"),
+    ("5pm", None, "05:00 PM"),
+    ("5 p.m.", None, "05:00 PM"),
+    ("10:30 am", None, "10:30 AM"),
+    ("17:30", None, "05:30 PM"),
+    ("at 4", None, "04:00 PM"),
+    ("at 10", None, "10:00 AM"),
+    ("3 o'clock", None, "03:00 PM"),
+    ("half past 4", None, "04:30 PM"),
+    ("quarter to 11 in the morning", None, "10:45 AM"),
+    ("tomorrow at 5pm", "2026-01-25", "05:00 PM"),
+    ("next monday at 10 in the morning", "2026-01-26", "10:00 AM"),
+    ("can I come tomorrow at noon", "2026-01-25", "12:00 PM"),
+    ("25th jan at 3:15 pm", "2026-01-25", "03:15 PM"),
+    ("13 pm", None, None),
+    ("next week", None, None),
+    ("after my office hours", None, None),
+    ("sometime when the doctor is free", None, None),
+    ("tomorrow after lunch", None, None),
+    ("early morning on the first weekday", None, None),
+]
+
+
+def run_cases():
+    correct = deferred = wrong = 0
+    failures = []
+    for text, exp_date, exp_time in CASES:
+        got = date_parser.parse_datetime_local(text, NOW)
+        expected = None if exp_date is None and exp_time is None else {"date": exp_date, "time": exp_time}
+        if got == expected:
+            correct += 1
+        elif got is None:
+            deferred += 1
+            failures.append((text, expected, got))
+        else:
+            wrong += 1
+            failures.append((text, expected, got))
+    return correct, deferred, wrong, failures
+
+
+def test_date_parser_accuracy():
+    correct, deferred, wrong, failures = run_cases()
+    # A confident wrong answer is worse than deferring to the LLM.
+    assert wrong == 0, failures
+    assert correct / len(CASES) >= 0.95, failures
+
+
+if __name__ == "__main__":
+    correct, deferred, wrong, failures = run_cases()
+    for text, expected, got in failures:
+        print(f"MISS {text!r}: expected {expected}, got {got}")
+    print(f"Accuracy: {correct}/{len(CASES)} ({correct / len(CASES):.0%}), deferred {deferred}, wrong {wrong}")
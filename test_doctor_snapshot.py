@@ -0,0 +1,59 @@
+"""
+Tests for the doctor directory snapshot: round trip, and stale or corrupt files.
+"""
+import struct
+import doctor_snapshot
+
+DIRECTORY = {
+    "Cardiologist": ["Dr. Rao", "Dr. Iyer"],
+    "Dermatologist": ["Dr. Shah"],
+    "Primary Care Doctor": ["Dr. Rao", "Dr. Müller"],
+}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "doctors.snap")
+    doctor_snapshot.write_snapshot(DIRECTORY, path, data_version=0xC0FFEE)
+    loaded = doctor_snapshot.load_snapshot(path)
+    assert dict(loaded.items()) == DIRECTORY
+    assert loaded.data_version == 0xC0FFEE and len(loaded) == 3
+    assert "Dentist" not in loaded and loaded.get("Dentist", []) == []
+    # Shared names are stored once and come back as the same object
+    assert loaded["Cardiologist"][0] is loaded["Primary Care Doctor"][0]
+
+
+def test_reads_the_kaggle_csv(tmp_path):
+    csv_path = tmp_path / "doctors.csv"
+    csv_path.write_text("Doctor's Name,speciality\nDr. Rao,Cardiologist\n,Dentist\nDr. Shah,Dermatologist\n",
+                        encoding="utf-8")
+    assert doctor_snapshot.read_csv_directory(str(csv_path)) == {"Cardiologist": ["Dr. Rao"],
+                                                                  "Dermatologist": ["Dr. Shah"]}
+
+
+def test_rebuild_leaves_open_views_intact(tmp_path):
+    path = str(tmp_path / "doctors.snap")
+    doctor_snapshot.write_snapshot(DIRECTORY, path, data_version=1)
+    old = doctor_snapshot.load_snapshot(path)
+    doctor_snapshot.write_snapshot({"Dentist": ["Dr. New"]}, path, data_version=2)
+    # A running worker keeps its mapping of the old file until it reloads
+    assert old["Dermatologist"] == ["Dr. Shah"] and old.data_version == 1
+    assert list(doctor_snapshot.load_snapshot(path)) == ["Dentist"]
+
+
+def test_missing_old_format_or_corrupt_files_are_ignored(tmp_path):
+    path = str(tmp_path / "doctors.snap")
+    assert doctor_snapshot.load_snapshot(path) is None
+
+    doctor_snapshot.write_snapshot(DIRECTORY, path)
+    with open(path, "r+b") as f:
+        f.seek(len(doctor_snapshot.MAGIC))
+        f.write(struct.pack("<H", doctor_snapshot.FORMAT_VERSION + 1))
+    assert doctor_snapshot.load_snapshot(path) is None
+
+    with open(path, "wb") as f:
+        f.write(b"DOCSNAP\x00\x01")  # Truncated header
+    assert doctor_snapshot.load_snapshot(path) is None
+
+    with open(path, "wb") as f:
+        f.write(b"")
+    assert doctor_snapshot.load_snapshot(path) is None
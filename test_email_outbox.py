@@ -0,0 +1,140 @@
+"""
+Exercises the email outbox against a local SMTP stand-in.
+Requires aiosmtpd (pip install aiosmtpd); no real mail is sent.
+"""
+import os
+import smtplib
+import socket
+import tempfile
+import time
+import pytest
+import email_outbox
+
+Controller = pytest.importorskip("aiosmtpd.controller").Controller
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode("utf-8", "replace")))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _outbox(port, **kwargs):
+    path = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+    return email_outbox.EmailOutbox(path, "127.0.0.1", port, "clinic@example.com", use_ssl=False, **kwargs)
+
+
+def test_batch_reuses_one_connection():
+    handler = RecordingHandler()
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        outbox = _outbox(port)
+        for i in range(5):
+            outbox.enqueue(f"patient{i}@example.com", f"Appointment {i}", "Booked.")
+        assert outbox.drain_once() == 5
+        assert len(handler.messages) == 5
+        assert outbox.connections_opened == 1
+        assert outbox.stats() == {"sent": 5}
+    finally:
+        controller.stop()
+
+
+def test_background_worker_delivers():
+    handler = RecordingHandler()
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    outbox = _outbox(port, poll_interval=0.1).start()
+    try:
+        outbox.enqueue("patient@example.com", "Appointment Confirmation", "Booked.")
+        deadline = time.monotonic() + 5
+        while not handler.messages and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert handler.messages and handler.messages[0][0] == ["patient@example.com"]
+    finally:
+        outbox.stop()
+        controller.stop()
+
+
+def test_unreachable_server_backs_off():
+    outbox = _outbox(_free_port(), max_attempts=2)
+    msg_id = outbox.enqueue("patient@example.com", "Appointment", "Booked.")
+    assert outbox.drain_once() == 0
+    status, attempts, next_attempt_at = outbox._db().execute(
+        "SELECT status, attempts, next_attempt_at FROM outbox WHERE id = ?", (msg_id,)
+    ).fetchone()
+    assert status == "pending" and attempts == 1 and next_attempt_at > time.time()
+    # Not due yet, so nothing is retried immediately.
+    assert outbox.drain_once() == 0
+    outbox._db().execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (msg_id,))
+    outbox.drain_once()
+    assert outbox.stats() == {"failed": 1}
+
+
+class RefusingHandler:
+    """Answers RCPT TO with `rcpt_reply` for addresses starting with "bad"."""
+
+    def __init__(self, rcpt_reply):
+        self.rcpt_reply = rcpt_reply
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bad"):
+            return self.rcpt_reply
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        return "250 OK"
+
+
+@pytest.mark.parametrize("reply, status", [
+    ("451 4.7.1 Greylisted, try again later", "pending"),
+    ("550 5.1.1 No such user", "failed"),
+])
+def test_temporary_refusals_are_retried_and_permanent_ones_dead_lettered(reply, status):
+    port = _free_port()
+    controller = Controller(RefusingHandler(reply), hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        outbox = _outbox(port)
+        msg_id = outbox.enqueue("bad@example.com", "Appointment", "Booked.")
+        assert outbox.drain_once() == 0
+        row = outbox._db().execute("SELECT status, attempts FROM outbox WHERE id = ?", (msg_id,)).fetchone()
+        assert row == (status, 1)
+    finally:
+        controller.stop()
+
+
+def test_smtp_code_decides_permanence():
+    assert email_outbox.is_permanent(smtplib.SMTPDataError(554, b"rejected"))
+    assert not email_outbox.is_permanent(smtplib.SMTPSenderRefused(421, b"closing", "clinic@example.com"))
+    assert not email_outbox.is_permanent(smtplib.SMTPRecipientsRefused({"a@b.co": (550, b"no"), "c@d.co": (452, b"full")}))
+    assert not email_outbox.is_permanent(ConnectionRefusedError())
+
+
+def test_shared_outbox_needs_smtp_credentials():
+    with pytest.raises(RuntimeError, match="SMTP_USER and SMTP_PASSWORD"):
+        email_outbox.shared_outbox(lambda key, default=None: None if key.startswith("SMTP_") else default)
+
+
+if __name__ == "__main__":
+    test_batch_reuses_one_connection()
+    test_background_worker_delivers()
+    test_unreachable_server_backs_off()
@@ -0,0 +1,47 @@
+"""
+Tests for HealthMonitor: cached reads, immediate degrade and background recovery.
+"""
+import time
+from health_monitor import HealthMonitor, is_transport_error
+
+
+def test_status_is_cached_between_probes():
+    calls = []
+    monitor = HealthMonitor(lambda: calls.append(1) or (True, None), interval=60)
+    for _ in range(100):
+        assert monitor.status() == (True, None)
+    assert len(calls) == 1
+
+
+def test_failure_degrades_then_recovers():
+    monitor = HealthMonitor(lambda: (True, None), interval=60, degraded_interval=0.05)
+    monitor.start()
+    monitor.report_failure(ConnectionError("connection refused"))
+    assert monitor.status() == (False, "connection refused")
+    deadline = time.time() + 2
+    while not monitor.status()[0] and time.time() < deadline:
+        time.sleep(0.01)
+    assert monitor.status() == (True, None)
+
+
+def test_probe_exception_counts_as_down():
+    def probe():
+        raise TimeoutError("timed out")
+    monitor = HealthMonitor(probe, interval=60)
+    assert monitor.status() == (False, "timed out")
+
+
+def test_only_transport_errors_count_as_down():
+    assert is_transport_error(ConnectionRefusedError("connection refused"))
+    assert is_transport_error(TimeoutError("timed out"))
+    # A bad time string or a constraint violation comes from a healthy database
+    assert not is_transport_error(ValueError("Bad time: 25:99"))
+    assert not is_transport_error(Exception("duplicate key value violates unique constraint"))
+
+
+if __name__ == "__main__":
+    test_status_is_cached_between_probes()
+    test_failure_degrades_then_recovers()
+    test_probe_exception_counts_as_down()
+    test_only_transport_errors_count_as_down()
+    print("✅ Health monitor tests passed")
@@ -0,0 +1,137 @@
+"""
+Offline tests for database.iter_appointments keyset pagination.
+FakeSelect evaluates the select/eq/gte/lte/or_/order/limit calls it issues.
+"""
+import re
+from types import SimpleNamespace
+import pytest
+import database
+
+_TERM = re.compile(r'and\(|\)|,|([a-z_]+)\.(eq|gt)\."((?:[^"\\]|\\.)*)"')
+
+
+def _parse_or(expr):
+    """Parses the or_() expression iter_appointments builds into [[(col, op, value)]]."""
+    groups, current, depth = [], [], 0
+    for m in _TERM.finditer(expr):
+        token = m.group(0)
+        if token == "and(":
+            depth, current = 1, []
+        elif token == ")":
+            depth = 0
+            groups.append(current)
+        elif token == ",":
+            continue
+        else:
+            cond = (m.group(1), m.group(2), m.group(3).replace('\\"', '"'))
+            if depth:
+                current.append(cond)
+            else:
+                groups.append([cond])
+    return groups
+
+
+class FakeSelect:
+    def __init__(self, client, columns):
+        self.client, self.columns = client, [c.strip() for c in columns.split(",")]
+        self.filters, self.orders, self.size = [], [], None
+
+    def eq(self, col, val):
+        self.filters.append(lambda r: r[col] == val); return self
+
+    def gte(self, col, val):
+        self.filters.append(lambda r: r[col] >= val); return self
+
+    def lte(self, col, val):
+        self.filters.append(lambda r: r[col] <= val); return self
+
+    def or_(self, expr):
+        def test(cond, r):
+            col, op, val = cond
+            have = str(r[col]) if col != "id" else r[col]
+            val = val if col != "id" else int(val)
+            return have == val if op == "eq" else have > val
+        groups = _parse_or(expr)
+        self.filters.append(lambda r: any(all(test(c, r) for c in g) for g in groups)); return self
+
+    def order(self, col):
+        self.orders.append(col); return self
+
+    def limit(self, n):
+        self.size = n; return self
+
+    def execute(self):
+        self.client.round_trips += 1
+        rows = [r for r in self.client.rows if all(f(r) for f in self.filters)]
+        rows.sort(key=lambda r: tuple(r[c] for c in self.orders))
+        rows = rows[:self.size]
+        return SimpleNamespace(data=[{c: r[c] for c in self.columns} for r in rows])
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows, self.round_trips = rows, 0
+
+    def table(self, name):
+        return SimpleNamespace(select=lambda columns: FakeSelect(self, columns))
+
+
+def _rows():
+    rows, i = [], 0
+    for day in ("2026-02-10", "2026-02-11", "2026-02-12"):
+        for time in ("09:00 AM", "09:00 AM", "10:30 AM", "02:00 PM", "04:40 PM"):
+            i += 1
+            rows.append({"id": i, "email": "a@example.com" if i % 2 else "b@example.com", "doctor": "Dr. A",
+                         "appointment_date": day, "appointment_time": time, "symptoms": "x" * 100})
+    return rows
+
+
+def test_pages_cover_every_row_once(monkeypatch):
+    client = FakeClient(_rows())
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    seen = [r["id"] for r in database.iter_appointments("id", page_size=4)]
+    assert sorted(seen) == list(range(1, 16)) and len(seen) == 15
+    assert client.round_trips == 4
+
+
+def test_projection_filters_and_laziness(monkeypatch):
+    client = FakeClient(_rows())
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    rows = database.iter_appointments("id, doctor", page_size=2, date_from="2026-02-11", email="a@example.com")
+    first = next(rows)
+    assert client.round_trips == 1
+    assert set(first) == {"id", "doctor", "appointment_date", "appointment_time"}
+    rest = list(rows)
+    assert all(r["appointment_date"] >= "2026-02-11" for r in [first] + rest)
+    assert len(rest) + 1 == sum(1 for r in _rows() if r["email"] == "a@example.com" and r["appointment_date"] >= "2026-02-11")
+
+
+def test_find_free_slots_uses_one_range_query(monkeypatch):
+    full_day = [f"{h:02d}:{m:02d} {'AM' if h24 < 12 else 'PM'}"
+                for h24 in range(9, 17) for m in (0, 20, 40) for h in [h24 % 12 or 12]]
+    rows = [{"id": i, "doctor": "Dr. A", "appointment_date": "2099-01-01", "appointment_time": t}
+            for i, t in enumerate(full_day)]
+    rows += [{"id": 100, "doctor": "Dr. A", "appointment_date": "2099-01-02", "appointment_time": "09:00 AM"},
+             {"id": 101, "doctor": "Dr. A", "appointment_date": "2099-01-02", "appointment_time": "10:00 AM"},
+             {"id": 102, "doctor": "Dr. B", "appointment_date": "2099-01-02", "appointment_time": "09:20 AM"}]
+    client = FakeClient(rows)
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    database.slot_index.invalidate()
+
+    slots = database.find_free_slots("Dr. A", "2099-01-01", "2099-01-05", n=3)
+    assert slots == [("2099-01-02", "09:20 AM"), ("2099-01-02", "09:40 AM"), ("2099-01-02", "10:20 AM")]
+    assert client.round_trips == 1
+
+    # The range query warmed the slot index, including empty days
+    assert not database.check_availability("2099-01-02", "10:10 AM", "Dr. A")
+    assert database.check_availability("2099-01-04", "10:10 AM", "Dr. A")
+    assert client.round_trips == 1
+
+
+def test_find_free_slots_bounds_the_range(monkeypatch):
+    client = FakeClient([])
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    for date_to in ("2099-02-01", "2098-12-31"):
+        with pytest.raises(ValueError):
+            database.find_free_slots("Dr. A", "2099-01-01", date_to)
+    assert client.round_trips == 0
@@ -0,0 +1,108 @@
+"""
+Tests for hedged LLM calls: hedging, failover, the deadline and win accounting.
+"""
+import threading
+import time
+import pytest
+import llm_router
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = llm_router.LatencyStats()
+    monkeypatch.setattr(llm_router, "latency_stats", stats)
+    return stats
+
+
+@pytest.fixture
+def release():
+    # Blocked providers wait on this; set at the end so no pool thread is left hanging
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def _answer(text, calls):
+    def fn(timeout):
+        calls.append(text)
+        return text
+    return fn
+
+
+def test_fast_primary_is_not_hedged(stats):
+    calls = []
+    providers = [("groq", _answer("groq", calls)), ("gemini", _answer("gemini", calls))]
+    assert llm_router.hedged_call(providers, 1.0, 5.0) == "groq"
+    assert calls == ["groq"]
+    assert stats.snapshot()["groq"]["wins"] == 1 and "gemini" not in stats.snapshot()
+
+
+def test_slow_primary_is_hedged_after_the_delay(stats, release):
+    def slow(timeout):
+        release.wait(timeout)
+        return "groq"
+    start = time.monotonic()
+    assert llm_router.hedged_call([("groq", slow), ("gemini", _answer("gemini", []))], 0.05, 5.0) == "gemini"
+    assert 0.05 <= time.monotonic() - start < 1.0
+    snapshot = stats.snapshot()
+    assert snapshot["gemini"]["wins"] == 1 and snapshot["groq"]["abandoned"] == 1
+
+
+def test_fails_over_at_once_on_error_or_invalid_output(stats):
+    def broken(timeout):
+        raise ConnectionError("down")
+
+    def validate(raw):
+        if raw == "garbage":
+            raise ValueError("not JSON")
+        return raw
+
+    providers = [("groq", broken), ("gemini", lambda t: "garbage"), ("local", lambda t: "ok")]
+    start = time.monotonic()
+    # The hedge delay is long, so only failures can have moved the call along
+    assert llm_router.hedged_call(providers, 10.0, 5.0, validate) == "ok"
+    assert time.monotonic() - start < 1.0
+    assert stats.snapshot()["groq"]["errors"] == 1 and stats.snapshot()["local"]["wins"] == 1
+
+
+def test_gives_up_at_the_deadline(stats, release):
+    def stuck(timeout):
+        release.wait()
+        return "late"
+    start = time.monotonic()
+    with pytest.raises(llm_router.LLMUnavailable, match="no answer within 0.2s"):
+        llm_router.hedged_call([("groq", stuck), ("gemini", stuck)], 0.05, 0.2)
+    assert 0.2 <= time.monotonic() - start < 1.0
+    assert stats.snapshot()["groq"]["abandoned"] == 1 and stats.snapshot()["gemini"]["abandoned"] == 1
+
+
+def test_a_losing_hedge_does_not_block_the_next_request(stats, release, monkeypatch):
+    # One worker in each pool: a stuck hedge must neither hold up the next
+    # primary call nor be joined by another hedge
+    monkeypatch.setattr(llm_router, "_executor", llm_router.ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(llm_router, "_hedge_executor", llm_router.ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(llm_router, "_hedge_slots", threading.BoundedSemaphore(1))
+    hedges = []
+
+    def slow(timeout):
+        time.sleep(0.1)
+        return "groq"
+
+    def stuck(timeout):
+        hedges.append(timeout)
+        release.wait()
+        return "late"
+
+    providers = [("groq", slow), ("gemini", stuck)]
+    assert llm_router.hedged_call(providers, 0.02, 5.0) == "groq"
+    start = time.monotonic()
+    assert llm_router.hedged_call(providers, 0.02, 5.0) == "groq"
+    assert time.monotonic() - start < 1.0
+    assert len(hedges) == 1
+
+
+def test_reports_every_failure():
+    def broken(timeout):
+        raise ConnectionError("down")
+    with pytest.raises(llm_router.LLMUnavailable, match="groq: down; gemini: down"):
+        llm_router.hedged_call([("groq", broken), ("gemini", broken)], 1.0, 5.0)
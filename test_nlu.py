@@ -0,0 +1,90 @@
+"""
+Table-driven tests for the local, rule-based input parsing.
+"""
+import pytest
+import nlu
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1", "1"),
+    ("Option 2 please", "2"),
+    ("I want to book", "1"),
+    ("reschedule my visit", "2"),
+    ("three", "3"),
+    ("my phone broke", "my phone broke"),  # "one" inside "phone" is not a choice
+    ("", ""),
+])
+def test_normalize_choice(text, expected):
+    assert nlu.normalize_choice(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2", 2),
+    ("Option 2.", 2),
+    ("#3", 3),
+    ("the second one", 2),
+    ("1st please", 1),
+    ("at 5", None),
+    ("half past 4", None),
+    ("3 o'clock", None),
+    ("cancel", None),
+    ("tomorrow at 4", None),
+])
+def test_parse_pick(text, expected):
+    assert nlu.parse_pick(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("my email is Asha.Rao@Example.com", "asha.rao@example.com"),
+    ("asha dot rao at gmail dot com", "asha.rao@gmail.com"),
+    ("email is ravi underscore k at the rate yahoo dot co dot in", "ravi_k@yahoo.co.in"),
+    ("meet me at noon", None),
+    ("no email here", None),
+])
+def test_extract_email(text, expected):
+    assert nlu.extract_email(text)[0] == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("9876543210", "9876543210"),
+    ("call +91 98765 43210", "9876543210"),
+    ("my number is 098765-43210", "9876543210"),
+    ("12345", None),
+    ("98765432101234", None),
+])
+def test_extract_mobile(text, expected):
+    assert nlu.extract_mobile(text)[0] == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("34 years old", "34"),
+    ("age: 7", "7"),
+    ("i'm 45", "45"),
+    ("29, female", "29"),
+    ("i'm 5 pm free", None),
+    ("200 years", None),
+])
+def test_extract_age(text, expected):
+    assert nlu.extract_age(text)[0] == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Female", "Female"),
+    ("i am a man", "Male"),
+    ("mail", "Male"),       # speech-to-text homophone
+    ("my mail id is", None),
+    ("trans", "Transgender"),
+    ("human", None),
+])
+def test_extract_gender(text, expected):
+    assert nlu.extract_gender(text)[0] == expected
+
+
+@pytest.mark.parametrize("text, fields, residual", [
+    ("my email is a@b.co and I'm 30, male", {"email": "a@b.co", "age": "30", "gender": "Male"}, ""),
+    ("nine eight seven six five four three two one zero", {"mobile": "9876543210"}, ""),
+    ("Asha, 9876543210, headache since monday", {"mobile": "9876543210"}, "asha headache since monday"),
+    ("", {}, ""),
+])
+def test_extract_local(text, fields, residual):
+    assert nlu.extract_local(text) == (fields, residual)
@@ -0,0 +1,60 @@
+"""
+Tests for the client-side LLM rate limiter.
+"""
+import threading
+import time
+import pytest
+import rate_limiter
+from stand_ins import FakeRateLimitError
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = rate_limiter.TokenBucket(60, now=0.0)
+    bucket.take(60, 0.0)
+    assert bucket.wait_time(1, 0.0) == pytest.approx(1.0)
+    assert bucket.wait_time(1, 1.0) == 0
+    # Bigger than the bucket: waits for a full one rather than forever
+    assert bucket.wait_time(500, 1.0) == pytest.approx(59.0)
+
+
+def test_rejects_fast_when_tokens_per_minute_are_spent():
+    limiter = rate_limiter.ProviderLimiter("groq", rpm=100, tpm=1000, max_wait=0.5)
+    with limiter.acquire(600) as permit:
+        permit.used(900)  # reported usage is charged instead of the estimate
+    start = time.monotonic()
+    with pytest.raises(rate_limiter.RateLimited):
+        limiter.acquire(600)
+    assert time.monotonic() - start < 0.1
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_429_halves_concurrency_and_pauses():
+    limiter = rate_limiter.ProviderLimiter("groq", max_concurrency=8, max_wait=0.05)
+    with pytest.raises(FakeRateLimitError):
+        with limiter.acquire(100):
+            raise FakeRateLimitError(0.3)
+    stats = limiter.stats()
+    assert stats["throttled"] == 1 and stats["concurrency_limit"] == 4
+    with pytest.raises(rate_limiter.RateLimited, match="paused after 429"):
+        limiter.acquire(100)
+
+    time.sleep(0.3)
+    with limiter.acquire(100):
+        pass
+    assert limiter.stats()["concurrency_limit"] == 4.25
+
+
+def test_queued_call_runs_when_a_slot_frees():
+    limiter = rate_limiter.ProviderLimiter("gemini", max_concurrency=1, max_wait=2.0)
+    first = limiter.acquire(10)
+    threading.Timer(0.1, first.__exit__, (None, None, None)).start()
+    with limiter.acquire(10) as second:
+        assert second.waited >= 0.05
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_estimates_scale_with_prompt_size():
+    short, long = rate_limiter.estimate_tokens("chest pain"), rate_limiter.estimate_tokens("chest pain " * 100)
+    assert 4 < short < 10 and 250 < long < 300
+    assert rate_limiter.estimate_request("chest pain", max_tokens=50) == short + 50
+    assert rate_limiter.is_rate_limit(FakeRateLimitError(1)) and rate_limiter.retry_after(FakeRateLimitError(1.5)) == 1.5
@@ -0,0 +1,88 @@
+"""
+Tests for the shared session store, on SQLite and on the FakeRedis stand-in.
+"""
+import time
+import pytest
+import prompts
+import session_store
+from stand_ins import FakeRedis
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_store(request, tmp_path):
+    redis = FakeRedis()
+
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return session_store.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), **kwargs)
+        return session_store.RedisSessionStore(redis, **kwargs)
+    return make
+
+
+def _state():
+    return {"step": "options", "audio_key_index": 0, "appointment_details": {},
+            "messages": [{"role": "assistant", "content": prompts.WELCOME_MSG},
+                         {"role": "assistant", "content": prompts.OPTIONS_MSG}]}
+
+
+def test_saves_only_deltas_and_rehydrates_elsewhere(make_store):
+    store = make_store()
+    state = _state()
+    assert store.save("s1", state) == {"fields": True, "appended": 0, "rewritten": True}
+    assert store.save("s1", state) == {"fields": False, "appended": 0, "rewritten": False}
+
+    state["messages"].append({"role": "user", "content": "1"})
+    state["step"] = "name"
+    state["slot_offers"] = [("2030-01-07", "09:00 AM")]
+    assert store.save("s1", state) == {"fields": True, "appended": 1, "rewritten": False}
+
+    # Another worker picks the session up, carries on, and the first sees its turn
+    other = make_store()
+    loaded = other.load("s1")
+    assert loaded == {**state, "messages_dropped": 0}
+    loaded["messages"].append({"role": "user", "content": "Asha Rao"})
+    assert other.save("s1", loaded)["appended"] == 1
+    assert store.load("s1")["messages"][-1]["content"] == "Asha Rao"
+
+    # A reset replaces the log
+    state["messages"] = [{"role": "assistant", "content": "hi"}]
+    assert store.save("s1", state)["rewritten"]
+    assert other.load("s1")["messages"] == state["messages"]
+
+
+def test_trims_memory_but_keeps_the_full_log(make_store):
+    store = make_store(keep_messages=3)
+    state = _state()
+    for n in range(5):
+        state["messages"].append({"role": "user", "content": str(n)})
+        store.save("s1", state)
+    assert [m["content"] for m in state["messages"]] == ["2", "3", "4"] and state["messages_dropped"] == 4
+
+    state["messages"].append({"role": "user", "content": "5"})
+    assert store.save("s1", state)["appended"] == 1
+    loaded = make_store(keep_messages=3).load("s1")
+    assert [m["content"] for m in loaded["messages"]] == ["3", "4", "5"] and loaded["messages_dropped"] == 5
+
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(ttl=1)
+    store.save("s1", _state())
+    assert store.load("s1") is not None
+    time.sleep(1.1)
+    store.purge_expired()
+    assert make_store(ttl=1).load("s1") is None
+
+
+def test_fixed_prompts_are_stored_by_id():
+    welcome = session_store.encode_message({"role": "assistant", "content": prompts.WELCOME_MSG})
+    assert welcome == '["a",0]'
+    assert session_store.decode_message(welcome)["content"] == prompts.WELCOME_MSG
+
+
+def test_prompt_ids_are_stable_and_unknown_ids_degrade():
+    assert session_store.encode_message({"role": "assistant", "content": prompts.STEP_QUESTIONS["confirm_appointment"]}) \
+        == '["a",12]'
+    with pytest.raises(TypeError):
+        session_store._PROMPTS[13] = "new prompt"
+    assert session_store.decode_message('["a",999]') == {"role": "assistant",
+                                                         "content": session_store.UNKNOWN_PROMPT}
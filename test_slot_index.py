@@ -0,0 +1,103 @@
+"""
+Tests for the in-memory slot index: conflict boundaries, updates, staleness and free-slot search.
+"""
+from slot_index import CONFLICT_MINUTES, SlotIndex, minute_to_time, time_to_minute
+
+DAY, NEXT_DAY = "2030-01-07", "2030-01-08"
+
+
+def _index(bookings=None, max_age=None):
+    """Index over {(doctor, date): [(id, time), ...]} that counts its loads."""
+    bookings = bookings if bookings is not None else {("Dr A", DAY): [(1, "10:00 AM")]}
+    loads = []
+
+    def loader(doctor, date):
+        loads.append((doctor, date))
+        return bookings.get((doctor, date), [])
+    return SlotIndex(loader, max_age=max_age), loads
+
+
+def _shift(time_str, minutes):
+    return minute_to_time(time_to_minute(time_str) + minutes)
+
+
+def test_conflict_boundaries():
+    index, _ = _index()
+    assert index.has_conflict("Dr A", DAY, "10:00 AM")
+    assert index.has_conflict("Dr A", DAY, _shift("10:00 AM", CONFLICT_MINUTES - 1))
+    assert index.has_conflict("Dr A", DAY, _shift("10:00 AM", 1 - CONFLICT_MINUTES))
+    assert not index.has_conflict("Dr A", DAY, _shift("10:00 AM", CONFLICT_MINUTES))
+    assert not index.has_conflict("Dr A", DAY, _shift("10:00 AM", -CONFLICT_MINUTES))
+    assert not index.has_conflict("Dr B", DAY, "10:00 AM")
+    assert not index.has_conflict("Dr A", NEXT_DAY, "10:00 AM")
+
+
+def test_add_remove_and_move():
+    index, loads = _index()
+    assert not index.has_conflict("Dr A", DAY, "02:00 PM")
+    index.add(2, "Dr A", DAY, "02:00 PM")
+    assert index.has_conflict("Dr A", DAY, "02:00 PM")
+
+    assert index.remove(2) == ("Dr A", DAY)
+    assert not index.has_conflict("Dr A", DAY, "02:00 PM")
+    assert index.remove(2) is None
+
+    index.has_conflict("Dr A", NEXT_DAY, "09:00 AM")
+    index.move(1, NEXT_DAY, "11:00 AM")
+    assert not index.has_conflict("Dr A", DAY, "10:00 AM")
+    assert index.has_conflict("Dr A", NEXT_DAY, "11:00 AM")
+    assert len(loads) == 2  # Updates were applied in place, not refetched
+
+
+def test_adding_a_known_id_again_moves_it():
+    index, _ = _index()
+    index.has_conflict("Dr A", DAY, "10:00 AM")
+    index.add(1, "Dr A", DAY, "10:00 AM")  # e.g. a replayed booking
+    index.move(1, DAY, "02:00 PM")
+    assert not index.has_conflict("Dr A", DAY, "10:00 AM")
+    assert index.has_conflict("Dr A", DAY, "02:00 PM")
+
+
+def test_add_to_an_uncached_day_is_left_to_the_loader():
+    bookings = {("Dr A", DAY): []}
+    index, loads = _index(bookings)
+    index.add(5, "Dr A", DAY, "10:00 AM")  # Not cached yet: ignored
+    bookings[("Dr A", DAY)] = [(5, "10:00 AM")]
+    assert index.has_conflict("Dr A", DAY, "10:00 AM") and len(loads) == 1
+
+
+def test_stale_days_are_refetched():
+    bookings = {("Dr A", DAY): []}
+    index, loads = _index(bookings, max_age=0)
+    assert not index.has_conflict("Dr A", DAY, "10:00 AM")
+    # Booked by another process
+    bookings[("Dr A", DAY)] = [(9, "10:00 AM")]
+    assert index.has_conflict("Dr A", DAY, "10:00 AM") and len(loads) == 2
+
+
+def test_invalidate_forgets_matching_days():
+    bookings = {("Dr A", DAY): [], ("Dr B", DAY): []}
+    index, loads = _index(bookings)
+    for doctor in ("Dr A", "Dr B"):
+        index.has_conflict(doctor, DAY, "10:00 AM")
+    bookings[("Dr A", DAY)] = [(9, "10:00 AM")]
+    bookings[("Dr B", DAY)] = [(8, "10:00 AM")]
+
+    index.invalidate(doctor="Dr A")
+    assert index.has_conflict("Dr A", DAY, "10:00 AM")
+    assert not index.has_conflict("Dr B", DAY, "10:00 AM")
+    index.invalidate()
+    assert index.has_conflict("Dr B", DAY, "10:00 AM") and len(loads) == 4
+
+
+def test_free_slots_skip_bookings():
+    index, _ = _index()
+    free = index.free_slots("Dr A", DAY, start="09:00 AM", end="11:00 AM")
+    assert free == ["09:00 AM", "09:20 AM", "09:40 AM", "10:20 AM", "10:40 AM"]
+
+
+def test_next_free_slots_spans_days_and_skips_the_past():
+    index, _ = _index({("Dr A", DAY): [(1, "09:00 AM")], ("Dr A", NEXT_DAY): []})
+    found = index.next_free_slots("Dr A", [DAY, NEXT_DAY], 3, start="09:00 AM", end="10:00 AM",
+                                  not_before=(DAY, time_to_minute("09:25 AM")))
+    assert found == [(DAY, "09:40 AM"), (NEXT_DAY, "09:00 AM"), (NEXT_DAY, "09:20 AM")]
@@ -0,0 +1,84 @@
+"""
+Tests for tracing: nested spans, JSONL export, Prometheus text and the disabled no-op.
+"""
+import json
+import os
+import tempfile
+import llm_router
+import tracing
+
+
+def _read_spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_disabled_span_is_shared_noop():
+    tracing.configure(enabled=False)
+    assert tracing.span("turn", step="options") is tracing.NOOP
+    with tracing.span("db.insert") as span:
+        span.set(rows=1)
+
+
+def test_nested_spans_export_to_jsonl():
+    path = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    tracing.configure(enabled=True, jsonl_path=path)
+    try:
+        with tracing.span("turn", session="s1"):
+            tracing.annotate(step="symptoms")
+            with tracing.span("db.select_page") as span:
+                span.set(rows=3)
+            try:
+                with tracing.span("email.send"):
+                    raise ConnectionError("refused")
+            except ConnectionError:
+                pass
+    finally:
+        tracing.configure(enabled=False)
+
+    db, email, turn = _read_spans(path)
+    assert turn["parent_id"] is None and turn["attrs"] == {"session": "s1", "step": "symptoms"}
+    assert db["parent_id"] == turn["span_id"] and db["trace_id"] == turn["trace_id"]
+    assert db["attrs"]["rows"] == 3
+    assert email["status"] == "error" and "refused" in email["attrs"]["error"]
+
+
+def test_hedged_call_spans_nest_under_caller():
+    path = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    tracing.configure(enabled=True, jsonl_path=path)
+    try:
+        def provider(timeout):
+            with tracing.span("llm.fake", provider="fake"):
+                return "ok"
+        with tracing.span("turn"):
+            assert llm_router.hedged_call([("fake", provider)], 1.0, 5.0) == "ok"
+    finally:
+        tracing.configure(enabled=False)
+
+    llm, turn = _read_spans(path)
+    assert llm["name"] == "llm.fake" and llm["parent_id"] == turn["span_id"]
+
+
+def test_prometheus_histogram():
+    tracing.metrics.reset()
+    tracing.configure(enabled=True)
+    try:
+        with tracing.span("tts.speak"):
+            pass
+        tracing.record("llm.groq.stream", 0.3, provider="groq")
+    finally:
+        tracing.configure(enabled=False)
+
+    text = tracing.render_prometheus()
+    assert 'medassist_span_duration_seconds_count{span="tts.speak"} 1' in text
+    assert 'medassist_span_duration_seconds_bucket{span="llm.groq.stream",le="0.25"} 0' in text
+    assert 'medassist_span_duration_seconds_bucket{span="llm.groq.stream",le="0.5"} 1' in text
+    assert 'medassist_span_errors_total{span="tts.speak"} 0' in text
+
+
+if __name__ == "__main__":
+    test_disabled_span_is_shared_noop()
+    test_nested_spans_export_to_jsonl()
+    test_hedged_call_spans_nest_under_caller()
+    test_prometheus_histogram()
+    print("✅ Tracing tests passed")
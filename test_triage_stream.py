@@ -0,0 +1,89 @@
+"""
+Offline tests for streamed triage: incremental parsing and provider fallback.
+"""
+import time
+import pytest
+import symptom_analyzer
+
+REPLY = "Specialty: Cardiologist\nConfidence: High\nReasoning: Chest pain with breathlessness needs a heart check."
+
+
+def _chunks(text, size=5):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_emits_specialty_before_reasoning_ends():
+    parser = symptom_analyzer.TriageStreamParser()
+    events = []
+    for chunk in _chunks(REPLY):
+        events.append(parser.feed(chunk))
+    events.append(parser.close())
+    flat = [e for batch in events for e in batch]
+    assert flat[0] == ("specialty", "Cardiologist")
+    assert flat[1] == ("confidence", "High")
+    reasoning = [v for k, v in flat if k == "reasoning"]
+    assert len(reasoning) > 1
+    assert "".join(reasoning) == "Chest pain with breathlessness needs a heart check."
+    assert parser.result()["specialty"] == "Cardiologist"
+
+
+def test_unknown_specialty_maps_to_primary_care():
+    parser = symptom_analyzer.TriageStreamParser()
+    parser.feed("Specialty: Astrologer\n")
+    assert parser.specialty == "Primary Care Doctor"
+
+
+def test_stream_falls_back_to_gemini_and_caches(monkeypatch):
+    def broken_groq(prompt, timeout, **options):
+        raise ConnectionError("groq down")
+        yield
+
+    monkeypatch.setattr(symptom_analyzer, "_stream_groq", broken_groq)
+    monkeypatch.setattr(symptom_analyzer, "_stream_gemini", lambda prompt, timeout: (c for c in _chunks(REPLY)))
+    symptom_analyzer.symptom_cache.clear()
+
+    events = list(symptom_analyzer.analyze_symptom_stream("tight chest, short of breath"))
+    assert events[0] == ("specialty", "Cardiologist")
+    assert events[-1][0] == "done" and events[-1][1]["success"]
+
+    # Second call is served from the cache without any provider
+    monkeypatch.setattr(symptom_analyzer, "_stream_gemini", broken_groq)
+    assert list(symptom_analyzer.analyze_symptom_stream("Tight chest, short of breath!"))[-1] == events[-1]
+
+
+def test_stream_uses_keyword_fallback_when_all_providers_fail(monkeypatch):
+    def broken(*args, **kwargs):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(symptom_analyzer, "_stream_groq", broken)
+    monkeypatch.setattr(symptom_analyzer, "_stream_gemini", broken)
+    symptom_analyzer.symptom_cache.clear()
+    *_, (event, result) = symptom_analyzer.analyze_symptom_stream("itchy skin rash")
+    assert event == "done" and result["specialty"] == "Dermatologist" and not result["success"]
+
+
+def test_providers_share_one_deadline(monkeypatch):
+    budgets = []
+
+    def slow_groq(prompt, timeout, **options):
+        budgets.append(timeout)
+        time.sleep(0.2)
+        raise TimeoutError("groq timed out")
+        yield
+
+    def trickling_gemini(prompt, timeout):
+        budgets.append(timeout)
+        while True:
+            time.sleep(0.05)
+            yield "Reasoning: still thinking "
+
+    monkeypatch.setattr(symptom_analyzer, "LLM_DEADLINE", 0.5)
+    monkeypatch.setattr(symptom_analyzer, "_stream_groq", slow_groq)
+    monkeypatch.setattr(symptom_analyzer, "_stream_gemini", trickling_gemini)
+    symptom_analyzer.symptom_cache.clear()
+
+    start = time.monotonic()
+    *_, (event, result) = symptom_analyzer.analyze_symptom_stream("sore knee")
+    assert time.monotonic() - start < 0.8
+    assert budgets[0] == pytest.approx(0.5, abs=0.05) and budgets[1] == pytest.approx(0.3, abs=0.05)
+    assert event == "done" and not result["success"]
@@ -0,0 +1,82 @@
+"""
+Tests for the speech cache tiers: memory LRU, disk for fixed prompts, and synthesis only on a full miss.
+"""
+import base64
+import tts_cache
+
+STATIC = ["Hello", "one", "two", "three"]
+
+
+class Synth:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text, lang, tld):
+        self.calls.append(text)
+        return f"mp3:{text}".encode()
+
+
+def test_synthesizes_once_then_serves_from_memory(tmp_path):
+    synth = Synth()
+    cache = tts_cache.TTSCache(str(tmp_path), synthesizer=synth)
+    audio = cache.get_audio_b64("1. Book an appointment")
+    assert base64.b64decode(audio) == b"mp3:Book an appointment"
+    # Menu numbering and spacing don't change the key
+    assert cache.get_audio_b64("Book  an appointment") == audio
+    assert synth.calls == ["Book an appointment"]
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "synthesized": 1, "memory_items": 1}
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    tts_cache.TTSCache(str(tmp_path), synthesizer=Synth(), static_texts=STATIC).get_audio_b64("Hello")
+    synth = Synth()
+    cache = tts_cache.TTSCache(str(tmp_path), synthesizer=synth, static_texts=STATIC)
+    assert base64.b64decode(cache.get_audio_b64("Hello")) == b"mp3:Hello"
+    assert synth.calls == [] and cache.stats()["disk_hits"] == 1
+    assert not [p for p in tmp_path.iterdir() if p.suffix == ".tmp"]
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    synth = Synth()
+    cache = tts_cache.TTSCache(str(tmp_path), max_memory_items=2, synthesizer=synth, static_texts=STATIC)
+    for text in ("one", "two", "three"):
+        cache.get_audio_b64(text)
+    assert cache.stats()["memory_items"] == 2
+    cache.get_audio_b64("one")  # Evicted from memory, still on disk
+    assert cache.stats()["disk_hits"] == 1 and len(synth.calls) == 3
+
+
+def test_dynamic_messages_stay_in_memory(tmp_path):
+    synth = Synth()
+    cache = tts_cache.TTSCache(str(tmp_path), max_memory_items=1, synthesizer=synth, static_texts=STATIC)
+    cache.get_audio_b64("Booked! Asha Rao with Dr. Iyer on 2030-01-08 at 10:00 AM.")
+    cache.get_audio_b64("Hello")
+    assert [p.name for p in tmp_path.iterdir()] == [f"{tts_cache.TTSCache.key('Hello')}.mp3"]
+    # Evicted from memory and never on disk: synthesized again
+    cache.get_audio_b64("Booked! Asha Rao with Dr. Iyer on 2030-01-08 at 10:00 AM.")
+    assert len(synth.calls) == 3 and cache.stats()["disk_hits"] == 0
+
+
+def test_fixed_prompts_are_on_disk_by_default(tmp_path):
+    import prompts
+    cache = tts_cache.TTSCache(str(tmp_path), synthesizer=Synth())
+    assert cache.prewarm(prompts.STATIC_PROMPTS) == len(prompts.STATIC_PROMPTS)
+    assert len(list(tmp_path.iterdir())) == len(prompts.STATIC_PROMPTS)
+
+
+def test_memory_only_cache_and_voice_in_the_key():
+    synth = Synth()
+    cache = tts_cache.TTSCache(None, synthesizer=synth)
+    cache.get_audio_b64("Hello")
+    cache.get_audio_b64("Hello", tld="com")
+    assert len(synth.calls) == 2 and cache.stats()["memory_items"] == 2
+
+
+def test_prewarm_skips_failures(tmp_path):
+    def flaky(text, lang, tld):
+        if text == "bad":
+            raise ConnectionError("gTTS down")
+        return b"mp3"
+    cache = tts_cache.TTSCache(str(tmp_path), synthesizer=flaky)
+    assert cache.prewarm(["good", "bad", "fine"]) == 2
+    assert cache.stats()["synthesized"] == 2
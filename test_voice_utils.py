@@ -0,0 +1,54 @@
+"""
+Tests for decode_to_pcm, with small shell scripts standing in for ffmpeg
+(and the real one when it is installed).
+"""
+import io
+import os
+import shutil
+import wave
+import pytest
+import voice_utils
+
+AudioSegment = pytest.importorskip("pydub").AudioSegment
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Points pydub at a shell script with the given body."""
+    def install(body):
+        path = tmp_path / "ffmpeg"
+        path.write_text("#!/bin/sh\n" + body + "\n")
+        path.chmod(0o755)
+        monkeypatch.setattr(AudioSegment, "converter", str(path))
+    return install
+
+
+def test_returns_what_ffmpeg_writes(fake_ffmpeg):
+    fake_ffmpeg("cat")
+    assert voice_utils.decode_to_pcm(b"\x01\x02" * 10) == b"\x01\x02" * 10
+
+
+def test_reports_ffmpeg_errors(fake_ffmpeg):
+    fake_ffmpeg("echo 'Invalid data found' >&2; exit 1")
+    with pytest.raises(RuntimeError, match="Invalid data found"):
+        voice_utils.decode_to_pcm(b"not audio")
+
+
+def test_gives_up_on_a_hung_ffmpeg(fake_ffmpeg, monkeypatch):
+    fake_ffmpeg("exec sleep 5")
+    monkeypatch.setattr(voice_utils, "DECODE_TIMEOUT", 0.2)
+    with pytest.raises(RuntimeError, match="did not finish within 0.2s"):
+        voice_utils.decode_to_pcm(b"audio")
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+def test_resamples_wav_to_16k_mono(monkeypatch):
+    monkeypatch.setattr(AudioSegment, "converter", shutil.which("ffmpeg"))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(os.urandom(44100 * 4))  # one second of stereo noise
+    pcm = voice_utils.decode_to_pcm(buffer.getvalue())
+    assert abs(len(pcm) - voice_utils.SAMPLE_RATE * voice_utils.SAMPLE_WIDTH) < 100
@@ -0,0 +1,251 @@
+"""
+Lightweight per-turn tracing: nested spans with attributes, exported to a
+JSONL file and as Prometheus text metrics.
+
+    with tracing.span("db.book_if_free", doctor=doctor) as s:
+        ...
+        s.set(rows=1)
+
+Spans nest through contextvars, so work on the same thread (or a copied
+context, see llm_router) becomes a child of the current span. When tracing
+is off, span() returns a shared no-op object after a single flag check.
+
+Configure once per process with configure(enabled, jsonl_path, metrics_port).
+"""
+import contextvars
+import http.server
+import itertools
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_current = contextvars.ContextVar("tracing_span", default=None)
+_ids = itertools.count(1)
+_pid = os.getpid()
+
+# Histogram buckets (seconds) for span durations
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Raised by st.rerun()/st.stop(); they end a turn normally
+_CONTROL_FLOW = ("RerunException", "StopException")
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration", "status", "_token", "_t0")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+        self.span_id = f"{_pid:x}-{next(_ids):x}"
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc_type is not None and not any(c.__name__ in _CONTROL_FLOW for c in exc_type.__mro__):
+            self.status = "error"
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"[:300]
+        _export(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "start": round(self.start, 6), "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status, "attrs": self.attrs,
+        }
+
+
+def span(name, **attrs):
+    """Starts a span (use as a context manager); a no-op when tracing is disabled."""
+    if not _enabled:
+        return NOOP
+    return Span(name, attrs)
+
+
+def annotate(**attrs):
+    """Adds attributes to the innermost open span, if any."""
+    if _enabled:
+        current = _current.get()
+        if current is not None:
+            current.attrs.update(attrs)
+
+
+def record(name, seconds, error=None, **attrs):
+    """
+    Exports an already-timed operation as a child of the current span. For work
+    that can't sit inside a with block, e.g. a stream consumed across yields.
+    """
+    if not _enabled:
+        return
+    s = Span(name, attrs)
+    parent = _current.get()
+    s.parent_id = parent.span_id if parent else None
+    s.trace_id = parent.trace_id if parent else s.span_id
+    s.start, s.duration = time.time() - seconds, seconds
+    if error is not None:
+        s.status = "error"
+        s.attrs["error"] = str(error)[:300]
+    _export(s)
+
+
+def traced(name):
+    """Decorator form of span(name)."""
+    def wrap(fn):
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        inner.__name__, inner.__doc__, inner.__wrapped__ = fn.__name__, fn.__doc__, fn
+        return inner
+    return wrap
+
+
+# --- Exporters ---------------------------------------------------------------
+
+class _Metrics:
+    """Per-span-name duration histograms and error counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # name -> [bucket counts..., count, sum, errors]
+
+    def observe(self, name, seconds, error):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = [0] * (len(BUCKETS) + 3)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-3] += 1
+            series[-2] += seconds
+            if error:
+                series[-1] += 1
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = [
+            "# HELP medassist_span_duration_seconds Duration of traced operations.",
+            "# TYPE medassist_span_duration_seconds histogram",
+        ]
+        errors = ["# HELP medassist_span_errors_total Traced operations that raised.",
+                  "# TYPE medassist_span_errors_total counter"]
+        with self._lock:
+            for name, series in sorted(self._series.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                for bound, count in zip(BUCKETS, series):
+                    lines.append(f'medassist_span_duration_seconds_bucket{{span="{label}",le="{bound}"}} {count}')
+                lines.append(f'medassist_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {series[-3]}')
+                lines.append(f'medassist_span_duration_seconds_sum{{span="{label}"}} {series[-2]:.6f}')
+                lines.append(f'medassist_span_duration_seconds_count{{span="{label}"}} {series[-3]}')
+                errors.append(f'medassist_span_errors_total{{span="{label}"}} {series[-1]}')
+        return "\n".join(lines + errors) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+metrics = _Metrics()
+_jsonl = {"path": None, "file": None, "lock": threading.Lock()}
+
+
+def _export(s):
+    metrics.observe(s.name, s.duration, s.status == "error")
+    if _jsonl["file"] is not None:
+        line = json.dumps(s.to_dict(), default=str)
+        with _jsonl["lock"]:
+            _jsonl["file"].write(line + "\n")
+
+
+# Callables returning extra Prometheus text (gauges and counters kept by other modules)
+_collectors = []
+
+
+def add_collector(fn):
+    """Adds fn() -> Prometheus text to what /metrics serves."""
+    _collectors.append(fn)
+
+
+def render_prometheus():
+    return metrics.render() + "".join(fn() for fn in _collectors)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = {"instance": None}
+_config_lock = threading.Lock()
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves /metrics on a daemon thread (once per process). Returns the server."""
+    with _config_lock:
+        if _server["instance"] is None:
+            server = http.server.ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="tracing-metrics", daemon=True).start()
+            _server["instance"] = server
+        return _server["instance"]
+
+
+def configure(enabled=True, jsonl_path=None, metrics_port=None):
+    """Turns tracing on/off and sets up the JSONL file and metrics endpoint (both optional)."""
+    global _enabled
+    with _config_lock:
+        if _jsonl["path"] != jsonl_path:
+            if _jsonl["file"] is not None:
+                _jsonl["file"].close()
+            # Line-buffered so each span is on disk as soon as it ends
+            _jsonl["file"] = open(jsonl_path, "a", buffering=1, encoding="utf-8") if jsonl_path else None
+            _jsonl["path"] = jsonl_path
+    if enabled and metrics_port:
+        serve_metrics(metrics_port)
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
@@ -0,0 +1,128 @@
+"""
+Content-addressed cache of synthesized speech.
+Audio is keyed by (normalized text, lang, tld) and kept in a bounded memory
+tier (base64, ready to embed) and, for the fixed prompts only, a disk tier (mp3
+files), so only new dynamic messages ever reach gTTS. Dynamic messages carry
+patient names, dates and doctors, so they are never written to disk.
+
+Pre-synthesize the fixed prompts at build time with:
+    python tts_cache.py
+"""
+import base64
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+import prompts
+import tracing
+from collections import OrderedDict
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+
+
+def clean_for_speech(text):
+    """Drops menu numbering ("1. Book") and collapses whitespace before synthesis."""
+    text = re.sub(r'^\d+\.\s*', '', text, flags=re.MULTILINE)
+    return " ".join(text.split())
+
+
+def synthesize(text, lang="en", tld="co.in"):
+    """Calls gTTS and returns mp3 bytes, entirely in memory."""
+    from gtts import gTTS
+    buf = io.BytesIO()
+    gTTS(text=text, lang=lang, tld=tld).write_to_fp(buf)
+    return buf.getvalue()
+
+
+class TTSCache:
+    def __init__(self, cache_dir=DEFAULT_DIR, max_memory_items=256, synthesizer=synthesize,
+                 static_texts=prompts.STATIC_PROMPTS):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self._synthesize = synthesizer
+        # Only these texts go to the disk tier
+        self._static = frozenset(clean_for_speech(t) for t in static_texts)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "synthesized": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text, lang="en", tld="co.in"):
+        return hashlib.sha256(f"{lang}\x00{tld}\x00{clean_for_speech(text)}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _remember(self, key, b64):
+        with self._lock:
+            self._memory[key] = b64
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get_audio_b64(self, text, lang="en", tld="co.in"):
+        """Returns base64-encoded mp3 for `text`, synthesizing it only on a full miss."""
+        key = self.key(text, lang, tld)
+        with self._lock:
+            b64 = self._memory.get(key)
+            if b64 is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                tracing.annotate(tts_cache="memory")
+                return b64
+
+        data = None
+        on_disk = bool(self.cache_dir) and clean_for_speech(text) in self._static
+        if on_disk and os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            tracing.annotate(tts_cache="disk")
+        if data is None:
+            spoken = clean_for_speech(text)
+            with tracing.span("tts.synthesize", provider="gtts", text_chars=len(spoken)) as span:
+                data = self._synthesize(spoken, lang, tld)
+                span.set(audio_bytes=len(data))
+            with self._lock:
+                self._stats["synthesized"] += 1
+            if on_disk:
+                tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+
+        b64 = base64.b64encode(data).decode()
+        self._remember(key, b64)
+        return b64
+
+    def prewarm(self, texts, lang="en", tld="co.in"):
+        """Loads (or synthesizes) audio for known prompts. Returns how many succeeded."""
+        done = 0
+        for text in texts:
+            try:
+                self.get_audio_b64(text, lang, tld)
+                done += 1
+            except Exception as e:
+                print(f"TTS prewarm failed for {text!r}: {e}")
+        return done
+
+    def prewarm_async(self, texts, lang="en", tld="co.in"):
+        thread = threading.Thread(target=self.prewarm, args=(texts, lang, tld), name="tts-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, memory_items=len(self._memory))
+
+
+if __name__ == "__main__":
+    import prompts
+    cache = TTSCache(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DIR)
+    count = cache.prewarm(prompts.STATIC_PROMPTS)
+    print(f"Pre-synthesized {count}/{len(prompts.STATIC_PROMPTS)} prompts into {cache.cache_dir}: {cache.stats()}")
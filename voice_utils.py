@@ -1,57 +1,109 @@
-import speech_recognition as sr
-import io
-import tempfile
-import os
-from pydub import AudioSegment
+import subprocess
+import threading
+import time
+import tracing
 
-def transcribe_audio(audio_bytes):
+# Recognizer input: 16 kHz, mono, 16-bit PCM
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+# A clip that takes longer than this to decode is treated as undecodable (seconds)
+DECODE_TIMEOUT = 15
+
+_stats_lock = threading.Lock()
+_stage_totals = {}
+last_timings = {}
+
+def _record_timings(timings):
+    global last_timings
+    with _stats_lock:
+        last_timings = dict(timings)
+        for stage, seconds in timings.items():
+            count, total = _stage_totals.get(stage, (0, 0.0))
+            _stage_totals[stage] = (count + 1, total + seconds)
+
+def stage_stats():
+    """Returns {stage: {"count", "mean_ms"}} for decode and recognition across all calls."""
+    with _stats_lock:
+        return {
+            stage: {"count": count, "mean_ms": round(total / count * 1000, 2)}
+            for stage, (count, total) in _stage_totals.items()
+        }
+
+def decode_to_pcm(audio_bytes):
+    """
+    Decodes any browser audio (WebM/Ogg/MP4/WAV...) straight to 16 kHz mono 16-bit PCM.
+    ffmpeg reads from stdin and writes raw samples to stdout, so nothing touches disk.
+    Raises RuntimeError if ffmpeg fails or runs past DECODE_TIMEOUT.
+    """
+    # pydub knows where ffmpeg lives on this machine
+    from pydub import AudioSegment
+    cmd = [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0", "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(cmd, input=audio_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=DECODE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        # run() has already killed ffmpeg
+        raise RuntimeError(f"ffmpeg did not finish within {DECODE_TIMEOUT}s")
+    if proc.returncode != 0 or not proc.stdout:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip() or "ffmpeg produced no audio")
+    return proc.stdout
+
+def transcribe_audio(audio_bytes, timings=None):
     """
     Transcribes audio bytes to text using Google Web Speech API.
-    Converts input bytes (WebM/MP4/etc) to WAV using pydub for compatibility.
+    Decodes and resamples in memory (no temp files) before recognition.
+    timings: optional dict, filled with per-stage seconds ("decode", "recognize").
     Returns: The transcribed text string, or None if failed.
     """
     if not audio_bytes:
         return None
-        
+
+    # Imported on first use to keep app startup fast
+    import speech_recognition as sr
+    timings = {} if timings is None else timings
     recognizer = sr.Recognizer()
-    
-    try:
-        # 1. Use pydub to read the audio bytes and convert to WAV
-        audio_stream = io.BytesIO(audio_bytes)
-        try:
-            audio_segment = AudioSegment.from_file(audio_stream)
-        except Exception as e:
-            print(f"DEBUG: Pydub could not read audio file: {e}")
-            return None
 
-        # 2. Export to a temporary WAV file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_wav:
-            audio_segment.export(temp_wav.name, format="wav")
-            temp_filename = temp_wav.name
-            
-        # 3. Read the WAV file with SpeechRecognition
+    with tracing.span("voice.transcribe", audio_bytes=len(audio_bytes)) as span:
         try:
-            with sr.AudioFile(temp_filename) as source:
-                audio_data = recognizer.record(source)
-                
-            # Transcribe with language support for India
-            text = recognizer.recognize_google(audio_data, language="en-IN")
-            
-            # Cleanup
-            os.remove(temp_filename)
-            return text
-            
-        except sr.UnknownValueError:
-            if os.path.exists(temp_filename): os.remove(temp_filename)
-            return None
+            # 1. Decode + resample to 16 kHz mono PCM in a single ffmpeg pass
+            start = time.perf_counter()
+            try:
+                with tracing.span("voice.decode", audio_bytes=len(audio_bytes)) as decode:
+                    pcm = decode_to_pcm(audio_bytes)
+                    decode.set(pcm_bytes=len(pcm))
+            except Exception as e:
+                print(f"Could not decode audio: {e}")
+                span.set(outcome="decode_failed")
+                return None
+            finally:
+                timings["decode"] = time.perf_counter() - start
+
+            # 2. Hand the samples to SpeechRecognition without re-encoding
+            audio_data = sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+            start = time.perf_counter()
+            try:
+                # Transcribe with language support for India
+                with tracing.span("voice.recognize", provider="google", seconds_of_audio=round(len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH), 2)):
+                    text = recognizer.recognize_google(audio_data, language="en-IN")
+                span.set(outcome="ok", text_chars=len(text))
+                return text
+            except sr.UnknownValueError:
+                span.set(outcome="unintelligible")
+                return None
+            except Exception as e:
+                print(f"Error during speech recognition: {e}")
+                span.set(outcome="recognize_failed")
+                return None
+            finally:
+                timings["recognize"] = time.perf_counter() - start
+
         except Exception as e:
-            print(f"DEBUG: Error during speech recognition: {e}")
-            if os.path.exists(temp_filename): os.remove(temp_filename)
+            print(f"Error in transcription pipeline: {e}")
+            span.set(outcome="error", error=str(e))
             return None
-
-    except Exception as e:
-        print(f"DEBUG: Error in transcription pipeline: {e}")
-        if 'temp_filename' in locals() and os.path.exists(temp_filename):
-            try: os.remove(temp_filename)
-            except: pass
-        return None
+        finally:
+            _record_timings(timings)